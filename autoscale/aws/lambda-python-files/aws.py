@@ -1114,8 +1114,8 @@ class CiscoEc2Instance(EC2Instance):
     """
         CiscoEc2Instance is child class of EC2Instance class, enabling interface to LB connections
     """
-    def __init__(self, instance_id):
-        super().__init__(instance_id)
+    def __init__(self, instance_id, group=None):
+        super().__init__(instance_id, group)
         self.lb = ElasticLoadBalancer()
         self.SUCCESS = 'SUCCESS'
         self.FAIL = 'FAIL'
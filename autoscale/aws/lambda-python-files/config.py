@@ -0,0 +1,200 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       config.py
+Purpose:    This python file has user input (config) of NGFWv AutoScale Lambda functions, parsed once per container
+            Secrets are decrypted only when a code path uses them & kept in memory across warm invocations
+"""
+
+import os
+import json
+import time
+import hashlib
+from jsonschema import validate
+import constant as const
+import utility as utl
+import store
+
+logger = utl.setup_logging()
+
+# Decrypted secrets by environment variable name, kept at module scope for warm invocations
+secret_cache = {}
+# Config objects kept at module scope, loaded on first use
+manager_config = None
+lifecycle_config = None
+custom_metric_config = None
+
+
+class Secret:
+    """
+        Secret class holds name of an environment variable having KMS encrypted value,
+        value is decrypted on first use, kept for SECRET_CACHE_TTL & decrypted again if ciphertext changes
+    """
+    def __init__(self, env_name):
+        self.env_name = env_name
+
+    def __repr__(self):
+        return "Secret(%s)" % self.env_name
+
+    def get(self):
+        """
+        Purpose:    To get decrypted value
+        Parameters:
+        Returns:    Decrypted value, ciphertext if it can't be decrypted
+        Raises:
+        """
+        ciphertext = os.environ.get(self.env_name, '')
+        fingerprint = hashlib.sha256(ciphertext.encode()).hexdigest()
+        cached = secret_cache.get(self.env_name)
+        if cached is not None:
+            if cached['fingerprint'] == fingerprint and cached['expires_at'] > time.time():
+                return cached['value']
+            if cached['fingerprint'] != fingerprint:
+                logger.info("Secret in %s is rotated, decrypting it again" % self.env_name)
+        try:
+            value = utl.get_decrypted_key(ciphertext)
+        except Exception as e:
+            logger.exception(e)
+            return ciphertext
+        secret_cache[self.env_name] = {
+            'fingerprint': fingerprint,
+            'value': value,
+            'expires_at': time.time() + const.SECRET_CACHE_TTL
+        }
+        return value
+
+    def invalidate(self):
+        """
+        Purpose:    To drop decrypted value, next use decrypts it again
+        Parameters:
+        Returns:
+        Raises:
+        """
+        secret_cache.pop(self.env_name, None)
+        return
+
+
+def reveal(value):
+    """
+    Purpose:    To get plain value of a config item, Secret is decrypted (or taken from cache)
+    Parameters: Secret object or value
+    Returns:    Value
+    Raises:
+    """
+    if isinstance(value, Secret):
+        return value.get()
+    return value
+
+
+class LambdaConfig(dict):
+    """
+        LambdaConfig class is user input of a Lambda function, items are read as before i.e. config['FmcIp']
+        Secret items are decrypted when read, get_secret() hands them over without decrypting
+    """
+    def __getitem__(self, key):
+        return reveal(dict.__getitem__(self, key))
+
+    def get_secret(self, key):
+        """
+        Purpose:    To get a secret item without decrypting it, for code paths which may not need it
+        Parameters: Key
+        Returns:    Secret object, or value if it is not encrypted
+        Raises:
+        """
+        return dict.__getitem__(self, key)
+
+
+def validate_cached(instance, schema):
+    """
+    Purpose:    To validate input against schema, successful validation of same input & schema is re-used by
+                containers of all Lambda functions for CONFIG_VALIDATION_TTL, so cold starts skip it
+    Parameters: Input, JSON schema
+    Returns:
+    Raises:     jsonschema.exceptions.ValidationError
+    """
+    fingerprint = hashlib.sha256(json.dumps([instance, schema], sort_keys=True).encode()).hexdigest()
+    key = 'config-validation:' + fingerprint
+    shared_store = store.get_shared_store()
+    try:
+        if shared_store.get(key) is not None:
+            logger.debug("Input validation is cached, skipping it")
+            return
+    except Exception as e:
+        logger.debug("Unable to read cached validation: " + str(e))
+    validate(instance, schema=schema)
+    try:
+        shared_store.put(key, int(time.time()), ttl=const.CONFIG_VALIDATION_TTL)
+    except Exception as e:
+        logger.debug("Unable to cache validation: " + str(e))
+    return
+
+
+def get_secret_items(items):
+    """
+    Purpose:    To get encrypted items of user input as Secret objects, if KMS key is given to Lambda function
+    Parameters: dict of user input key to environment variable name
+    Returns:    dict of user input key to Secret object, empty if passwords are in plain-text
+    Raises:
+    """
+    if os.environ.get('KMS_ENC') is None:
+        logger.debug("No KMS ARN found in os.env['KMS_ENC'], password should be in plain-text")
+        return {}
+    return {key: Secret(env_name) for key, env_name in items.items() if env_name in os.environ}
+
+
+def get_manager_config():
+    """
+    Purpose:    To get user input of AutoScale Manager, OS env & Configuration.json are parsed once per container
+    Parameters:
+    Returns:    LambdaConfig of OS env, JSON variables
+    Raises:
+    """
+    global manager_config
+    if manager_config is None:
+        env_var, json_var = utl.get_user_input_manager(decrypt=False, validator=validate_cached)
+        env_var = LambdaConfig(env_var)
+        env_var.update(get_secret_items({'FmcPassword': 'FMC_PASSWORD', 'NgfwPassword': 'FTD_PASSWORD'}))
+        manager_config = (env_var, json_var)
+    return manager_config
+
+
+def get_lifecycle_config():
+    """
+    Purpose:    To get user input of LifeCycle Lambda, parsed once per container
+    Parameters:
+    Returns:    LambdaConfig
+    Raises:
+    """
+    global lifecycle_config
+    if lifecycle_config is None:
+        lifecycle_config = LambdaConfig(utl.get_user_input_lifecycle_ftdv())
+    return lifecycle_config
+
+
+def get_custom_metric_config():
+    """
+    Purpose:    To get user input of Custom Metric Publisher, parsed once per container
+    Parameters:
+    Returns:    LambdaConfig
+    Raises:
+    """
+    global custom_metric_config
+    if custom_metric_config is None:
+        custom_metric_config = LambdaConfig(utl.get_user_input_custom_metric(decrypt=False))
+        custom_metric_config.update(get_secret_items({'FmcMetPassword': 'FMC_MET_PASSWORD'}))
+    return custom_metric_config
@@ -49,6 +49,98 @@ DEFAULT_PASSWORD = "FtDv_AuT0Scale"
 USE_PUBLIC_IP_FOR_SSH = False
 USE_PUBLIC_IP_FOR_FMC_CONN = True
 
+# FMC REST connection pool & timeouts (seconds)
+FMC_CONNECTION_POOL_SIZE = 10
+FMC_CONNECT_TIMEOUT = 10
+FMC_READ_TIMEOUT = 120
+# Items per page for FMC collection listing, FMC caps limit at 1000
+FMC_PAGE_SIZE = 1000
+# FMC REST rate limit per user is 120 requests/minute, client side limit is kept a little lower
+# Limit is shared among workers through shared store if FMC_RATE_LIMIT_SHARED is set
+FMC_RATE_LIMIT = 110
+FMC_RATE_LIMIT_BURST = 10
+FMC_RATE_LIMIT_SHARED = False
+# Retries of throttled(429/503) REST calls, with jittered exponential backoff unless Retry-After is given
+FMC_THROTTLE_RETRIES = 5
+FMC_BACKOFF_BASE = 2
+FMC_BACKOFF_MAX = 60
+# FMC circuit breaker, consecutive failed calls which open the circuit & seconds it stays open
+FMC_CIRCUIT_FAILURE_THRESHOLD = 5
+FMC_CIRCUIT_COOL_DOWN = 5*60
+# While circuit is open, manager stages are re-published after this wait without consuming a retry
+FMC_CIRCUIT_DEFER_WAIT = 60
+FMC_CIRCUIT_MAX_DEFERRALS = 30
+# Concurrent REST calls of AsyncFirepowerManagementCenter, must not exceed connection pool size
+FMC_ASYNC_CONCURRENCY = 4
+
+# FMC auth token broker (seconds), token is valid 30 minutes & can be refreshed 3 times
+FMC_TOKEN_MAX_AGE = 30*60
+FMC_TOKEN_MAX_REFRESH = 3
+# Leases end this long before token expiry, token is refreshed only after that
+FMC_TOKEN_REFRESH_MARGIN = 5*60
+# One worker refreshes the token, others wait for it up to FMC_TOKEN_WAIT_TIME
+FMC_TOKEN_LOCK_TTL = 30
+FMC_TOKEN_WAIT_TIME = 15
+
+# FMC task polling (seconds), interval starts at FMC_TASK_POLL_MIN & grows by FMC_TASK_POLL_BACKOFF times
+FMC_TASK_POLL_MIN = 5
+FMC_TASK_POLL_MAX = 30
+FMC_TASK_POLL_BACKOFF = 1.5
+
+# Coalescing windows (seconds), requests of a window are sent together by first requester, 0 disables it
+# Bulk device registration
+REGISTRATION_BATCH_WINDOW = 20
+# Multi-device policy deployment
+DEPLOYMENT_BATCH_WINDOW = 20
+DEPLOYMENT_POLL_INTERVAL = 15
+COALESCING_WINDOW_GRACE = 3
+COALESCING_WINDOW_TIMEOUT = 60
+COALESCING_WINDOW_MAX = 20
+# Members of a window, whose waits are delayed messages, check this long after leader is due to flush
+COALESCING_WINDOW_POLL = 5
+
+# FMC object catalog (name to id index) time to live in seconds
+FMC_CATALOG_TTL = 15*60
+# Device records change with every scale-out/in, hence a short time to live
+FMC_CATALOG_DEVICE_TTL = 60
+# Index older than this is re-fetched once, if a name is not found in it
+FMC_CATALOG_MISS_REFRESH = 30
+# Catalog is kept in shared store as chunks of at most this many bytes, DynamoDB item can't exceed 400 KB
+FMC_CATALOG_CHUNK_SIZE = 256*1024
+# Seconds a memory copy of catalog is used without checking its generation in shared store,
+# invalidation by other containers is seen this late
+FMC_CATALOG_GENERATION_CHECK = 10
+# Re-fetch of a single name uses server side filter, small page is enough for it
+FMC_FILTER_PAGE_SIZE = 25
+# Collections found not to support filter are re-checked after this long
+FMC_FILTER_SUPPORT_TTL = 24*60*60
+
+# FMC audit feed, audit records since last poll invalidate catalog entries changed outside this deployment
+# Catalog time to live stays FMC_CATALOG_TTL, it bounds staleness if a poll is missed
+FMC_AUDIT_FEED = True
+FMC_AUDIT_FEED_LOCK_TTL = 60
+# Successful FMC configuration validation is re-used this long while its inputs are unchanged, 0 disables it
+FMC_VALIDATION_CACHE_TTL = 60*60
+
+# Pool of FMCs, FMC_SERVER can list several FMCs separated by ',' each having same device group, policies & objects
+# Each device is placed on one FMC by policy 'least-devices' or 'least-deployments'(pending deployments)
+FMC_PLACEMENT_POLICY = 'least-devices'
+# Managed device limit of an FMC, as per FMC model or FMCv license
+FMC_MAX_MANAGED_DEVICES = 25
+# Placements are counted in FMC load till FMC lists them as devices, for at most this long
+FMC_PLACEMENT_PENDING_TTL = 15*60
+FMC_PLACEMENT_LOCK_TTL = 30
+
+# Shared store, DynamoDB table name is read from this environment variable
+# if it is not set, a local file in Lambda /tmp is used instead
+SHARED_STORE_TABLE_ENV = 'SHARED_STORE_TABLE'
+LOCAL_STORE_FILE = '/tmp/ngfwv_autoscale_store.json'
+
+# Decrypted secrets are kept in Lambda memory this long, a changed ciphertext is decrypted again at once
+SECRET_CACHE_TTL = 60*60
+# Successful validation of Lambda user input is re-used by cold starts this long, while input is unchanged
+CONFIG_VALIDATION_TTL = 24*60*60
+
 
 # LifeCycleLambda Constants
 # ------------------------------------------------------------------------------
@@ -69,10 +161,48 @@ FTD_POLL_TIME_IN_MIN_VM_READY = 10
 DISABLE_VM_READY_FUNC = False
 DISABLE_VM_REGISTER_FUNC = False
 DISABLE_VM_CONFIGURE_FUNC = False
+# Configure device by diff of desired & actual FMC configuration (fetched in one pass), instead of check per item
+RECONCILE_DEVICE_CONFIG = True
+# Configuration of first configured device is captured as a template & replayed on later devices of group
+DEVICE_TEMPLATE_CONFIG = True
+DEVICE_TEMPLATE_TTL = 24*60*60
 DISABLE_VM_DEPLOY_FUNC = False
 DISABLE_VM_DELETE_FUNC = False
 
 TO_FUN_RETRY_COUNT = [3, 5, 10, 5, 5]
+# Instances of a batch of messages(SNS fan-in SQS queue) handled concurrently, shares FMC connection pool
+MANAGER_BATCH_CONCURRENCY = 4
+# Stages of an instance are checkpointed as a workflow in shared store, retries resume from its state
+DURABLE_WORKFLOW = True
+# Lambda runs at most 15 minutes, a step not checkpointed this long after it was due is resumed by cron
+WORKFLOW_STALL_TIME = 20*60
+WORKFLOW_TTL = 7*24*60*60
+# Manager work on an instance is serialized by a lease, lease outlives Lambda timeout so it ends only on release
+INSTANCE_LEASE_TTL = 16*60
+# Message of a leased instance waits this long, then is re-published at most INSTANCE_LEASE_MAX_REQUEUES times
+INSTANCE_LEASE_WAIT = 60
+INSTANCE_LEASE_POLL = 2
+INSTANCE_LEASE_MAX_REQUEUES = 20
+# Messages are de-duplicated by instance, stage, counter & re-publish counts for this long
+MESSAGE_CLAIM_TTL = 24*60*60
+# Waits of manager stages are scheduled as delayed messages instead of sleeping in Lambda, each wake-up is a probe
+# AutoScale Manager SQS queue URL is read from this environment variable, without it delayed messages are kept
+# in shared store & published by cron run of AutoScale Manager
+DELAYED_PROBES = True
+MANAGER_QUEUE_ENV = 'AS_MANAGER_QUEUE'
+# SQS caps DelaySeconds at 15 minutes, longer delays are waited out in hops
+SQS_MAX_DELAY = 15*60
+# Message kept in shared store is dropped if no cron run delivers it this long after it is due
+SCHEDULED_MESSAGE_TTL = 24*60*60
+# Wait after device registration request, before configuration is started (CSCvs17405)
+REGISTRATION_SETTLE_DELAY = 60
+# vm_register probes waiting for registration batch window give up after REGISTRATION_PROBE_TIME_IN_MIN per attempt
+REGISTRATION_PROBE_TIME_IN_MIN = 5
+# vm_ready probes NGFWv SSH every FTD_SSH_PROBE_INTERVAL for FTD_POLL_TIME_IN_MIN_VM_READY per attempt
+FTD_SSH_PROBE_INTERVAL = 30
+# vm_deploy probes deployment every DEPLOY_PROBE_INTERVAL for DEPLOY_PROBE_TIME_IN_MIN per attempt
+DEPLOY_PROBE_INTERVAL = 15
+DEPLOY_PROBE_TIME_IN_MIN = 5
 
 # Configuration File Name
 JSON_LOCAL_FILENAME = 'Configuration.json'
@@ -99,3 +229,7 @@ MEMORY_UNIT = 'Percent'
 GROUP_AVG_MEMORY = 'GroupAvgMem'
 GROUP_MAX_MEMORY = 'GroupMaxMem'
 GROUP_MIN_MEMORY = 'GroupMinMem'
+# Devices per Health Monitoring API query
+FMC_METRICS_CHUNK_SIZE = 25
+# FMC client metrics, published in Embedded Metric Format via Lambda logs
+FMC_METRIC_NAME_SPACE = 'Cisco-NGFWv-AutoScale-FMC-Client'
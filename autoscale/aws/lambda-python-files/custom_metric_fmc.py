@@ -24,15 +24,18 @@ Input:      Sample test event
 
 import json
 from aws import CloudWatchMetrics, AutoScaleGroup, CloudWatchEvent
-from fmc import FirepowerManagementCenter
+from fmc import FirepowerManagementCenter, get_fmc_circuit
+from ftdv_fmc import with_call_stats
 import constant as const
 import utility as utl
+import config
 
 logger = utl.setup_logging()
 # Get User input
-user_input = utl.get_user_input_custom_metric()
+user_input = config.get_custom_metric_config()
 
 
+@with_call_stats
 def lambda_handler(event, context):
     """
     Purpose:    Lambda Function for Custom Metric Publish
@@ -103,8 +106,70 @@ def handle_cron_event(event):
     append_str = user_input['AutoScaleGrpName'] + '-'
     aws_instance_name_list = [append_str + suf for suf in instances_list]
 
-    # FMC class initialization
-    fmc = FirepowerManagementCenter(user_input['FmcServer'], user_input['FmcMetUserName'], user_input['FmcMetPassword'])
+    # Devices of group are spread over pool of FMCs, member lists of all FMCs make up the group
+    # counts of a partial group would be misleading, hence nothing is published if an FMC is not available
+    fmc_devices_list = []
+    query_device_dict = {}
+    for fmc_server in utl.get_fmc_server_list(user_input['FmcServer']):
+        if not get_fmc_circuit(fmc_server).allow():
+            logger.info("FMC %s circuit is open, skipping metric collection" % fmc_server)
+            return
+        fmc, device_grp_id = fmc_cls_init(fmc_server)
+        if fmc is None:
+            utl.put_line_in_log('Cron Handler Finished', 'thin')
+            return
+        members, member_ids = fmc.get_member_list_in_device_grp(device_grp_id)
+        fmc_devices_list.extend(members)
+        query_device_dict.update({name: (fmc, device_id) for name, device_id in zip(members, member_ids)})
+
+    intersection_list = utl.intersection(aws_instance_name_list, fmc_devices_list)
+    pair_of_metric_name_value = []
+
+    metric_name_value = {
+            "unit": const.DEVICE_NO_UNIT,
+            "metric_name": const.NO_DEV_IN_FMC_NOT_IN_AWS,
+            "value": len(fmc_devices_list) - len(aws_instance_name_list)
+        }
+    pair_of_metric_name_value.append(metric_name_value)
+
+    metric_name_value = {
+            "unit": const.DEVICE_NO_UNIT,
+            "metric_name": const.NO_DEV_IN_AWS_NOT_IN_FMC,
+            "value": len(aws_instance_name_list) - len(fmc_devices_list)
+        }
+    pair_of_metric_name_value.append(metric_name_value)
+
+    metric_name_value = {
+            "unit": const.DEVICE_NO_UNIT,
+            "metric_name": const.NO_DEV_IN_BOTH_FMC_AWS,
+            "value": len(intersection_list)
+        }
+    pair_of_metric_name_value.append(metric_name_value)
+    # Update list with memory metrics
+    pair_of_metric_name_value, ftdv_memory_metric_dict = get_memory_metric_pair(pair_of_metric_name_value,
+                                                                                intersection_list,
+                                                                                query_device_dict)
+    # Publish Metrics to CloudWatch
+    update_cloudwatch_metric(pair_of_metric_name_value)
+
+    logger.info("List of instance name in AWS AutoScale Group: {}".format(aws_instance_name_list))
+    logger.info("List of members in FMC device group: {}".format(fmc_devices_list))
+    logger.info("Memory Metric per FTDv: " + json.dumps(ftdv_memory_metric_dict, separators=(',', ': ')))
+    logger.info("Metrics published: " + json.dumps(pair_of_metric_name_value, separators=(',', ': ')))
+
+    utl.put_line_in_log('Cron Handler Finished', 'thin')
+    return
+
+
+def fmc_cls_init(fmc_server):
+    """
+    Purpose:    To instantiate FirepowerManagementCenter class & get id of device group in it
+    Parameters: FMC server of pool
+    Returns:    FirepowerManagementCenter object & device group id, None & None if FMC is not usable
+    Raises:
+    """
+    fmc = FirepowerManagementCenter(fmc_server, user_input['FmcMetUserName'],
+                                    user_input.get_secret('FmcMetPassword'))
     try:
         fmc.get_auth_token()
         device_grp_id = fmc.get_device_grp_id_by_name(user_input['fmcDeviceGroupName'])
@@ -120,46 +185,8 @@ def handle_cron_event(event):
         # Initialize CloudWatchEvent class
         # cw_event = CloudWatchEvent(user_input['cron_event_name'])
         # # cw_event.stop_cron_job()
-    else:
-        fmc_devices_list, device_id_list = fmc.get_member_list_in_device_grp(device_grp_id)
-        query_device_dict = dict(zip(fmc_devices_list, device_id_list))
-        intersection_list = utl.intersection(aws_instance_name_list, fmc_devices_list)
-        pair_of_metric_name_value = []
-
-        metric_name_value = {
-                "unit": const.DEVICE_NO_UNIT,
-                "metric_name": const.NO_DEV_IN_FMC_NOT_IN_AWS,
-                "value": len(fmc_devices_list) - len(aws_instance_name_list)
-            }
-        pair_of_metric_name_value.append(metric_name_value)
-
-        metric_name_value = {
-                "unit": const.DEVICE_NO_UNIT,
-                "metric_name": const.NO_DEV_IN_AWS_NOT_IN_FMC,
-                "value": len(aws_instance_name_list) - len(fmc_devices_list)
-            }
-        pair_of_metric_name_value.append(metric_name_value)
-
-        metric_name_value = {
-                "unit": const.DEVICE_NO_UNIT,
-                "metric_name": const.NO_DEV_IN_BOTH_FMC_AWS,
-                "value": len(intersection_list)
-            }
-        pair_of_metric_name_value.append(metric_name_value)
-        # Update list with memory metrics
-        pair_of_metric_name_value, ftdv_memory_metric_dict = get_memory_metric_pair(fmc, pair_of_metric_name_value,
-                                                                                    intersection_list,
-                                                                                    query_device_dict)
-        # Publish Metrics to CloudWatch
-        update_cloudwatch_metric(pair_of_metric_name_value)
-
-        logger.info("List of instance name in AWS AutoScale Group: {}".format(aws_instance_name_list))
-        logger.info("List of members in FMC device group: {}".format(fmc_devices_list))
-        logger.info("Memory Metric per FTDv: " + json.dumps(ftdv_memory_metric_dict, separators=(',', ': ')))
-        logger.info("Metrics published: " + json.dumps(pair_of_metric_name_value, separators=(',', ': ')))
-
-    utl.put_line_in_log('Cron Handler Finished', 'thin')
-    return
+        return None, None
+    return fmc, device_grp_id
 
 
 def handle_ec2_launch_event():
@@ -196,57 +223,49 @@ def update_cloudwatch_metric(pair_of_metric_name_value):
     return None
 
 
-def get_memory_metric_pair(fmc, pair_of_metric_name_value, intersection_list, query_device_dict):
+def get_memory_metric_pair(pair_of_metric_name_value, intersection_list, query_device_dict):
     """
-    Purpose:     To get Memory metric from FMC & update pair_of_metric_name_value
+    Purpose:     To get Memory metric from owner FMCs of devices & update pair_of_metric_name_value
     Parameters:
     Returns:
     Raises:
     """
     ftdv_memory_metric_dict = {}
 
-    count = 0
-    sum_memory, max_memory, min_memory = (0 for i in range(3))
-    for i in range(0, len(intersection_list)):
-        device_name = intersection_list[i]
-        device_id = query_device_dict[device_name]
-        response = fmc.get_memory_metrics_from_fmc(device_id)
-        if response is None:
+    # Metrics of all devices of an FMC are fetched in one (or few chunked) queries
+    device_ids_by_fmc = {}
+    for device_name in intersection_list:
+        fmc, device_id = query_device_dict[device_name]
+        device_ids_by_fmc.setdefault(fmc, []).append(device_id)
+    metrics = {}
+    for fmc, device_ids in device_ids_by_fmc.items():
+        metrics.update(fmc.get_memory_metrics_bulk(device_ids))
+    for device_name in intersection_list:
+        metric = metrics.get(query_device_dict[device_name][1])
+        if metric is None or len(metric['values']) == 0:
             logger.error("Unable to get metrics for instance: " + device_name)
-        try:
-            # metric_value = response["items"][0]["healthMonitorMetric"]["value"]
-            metric_value = float(json.loads(response["items"][0]["response"])["data"]["result"][0]["values"][-1][1])
-            ftdv_memory_metric_dict.update({device_name: metric_value})
-            if i == 0:
-                max_memory = metric_value
-                min_memory = metric_value
-            else:
-                if metric_value > max_memory:
-                    max_memory = metric_value
-                if metric_value < min_memory:
-                    min_memory = metric_value
-            sum_memory += metric_value
-        except Exception as e:
-            logger.error("{}".format(e))
-        count += 1
+            continue
+        # Latest value of last one minute
+        ftdv_memory_metric_dict.update({device_name: metric['values'][-1]})
 
     if len(ftdv_memory_metric_dict) > 0:
+        memory_values = list(ftdv_memory_metric_dict.values())
         metric_name_value = {
             "unit": const.MEMORY_UNIT,
             "metric_name": const.GROUP_AVG_MEMORY,
-            "value": sum_memory / count
+            "value": sum(memory_values) / len(memory_values)
         }
         pair_of_metric_name_value.append(metric_name_value)
         metric_name_value = {
             "unit": const.MEMORY_UNIT,
             "metric_name": const.GROUP_MAX_MEMORY,
-            "value": max_memory
+            "value": max(memory_values)
         }
         pair_of_metric_name_value.append(metric_name_value)
         metric_name_value = {
             "unit": const.MEMORY_UNIT,
             "metric_name": const.GROUP_MIN_MEMORY,
-            "value": min_memory
+            "value": min(memory_values)
         }
         pair_of_metric_name_value.append(metric_name_value)
 
@@ -20,16 +20,628 @@ Name:       fmc.py
 Purpose:    This is contains FMC related REST methods
 """
 
+import re
 import time
+import asyncio
+import threading
 import requests
 import logging
 import json
+import hashlib
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+import constant as const
 import utility as utl
-from requests.packages.urllib3.exceptions import InsecureRequestWarning
-requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+import store
+import config
+import ftdv_fmc
+from ftdv_fmc import get_session as get_fmc_session, poll_intervals, parse_health_metrics, TaskTracker
 
 logger = utl.setup_logging()
 
+# AWS adapter of shared FMC client package, its settings are taken from constant.py
+ftdv_fmc.settings.CONNECTION_POOL_SIZE = const.FMC_CONNECTION_POOL_SIZE
+ftdv_fmc.settings.CONNECT_TIMEOUT = const.FMC_CONNECT_TIMEOUT
+ftdv_fmc.settings.READ_TIMEOUT = const.FMC_READ_TIMEOUT
+ftdv_fmc.settings.RATE_LIMIT = const.FMC_RATE_LIMIT
+ftdv_fmc.settings.RATE_LIMIT_BURST = const.FMC_RATE_LIMIT_BURST
+ftdv_fmc.settings.THROTTLE_RETRIES = const.FMC_THROTTLE_RETRIES
+ftdv_fmc.settings.BACKOFF_BASE = const.FMC_BACKOFF_BASE
+ftdv_fmc.settings.BACKOFF_MAX = const.FMC_BACKOFF_MAX
+ftdv_fmc.settings.PAGE_SIZE = const.FMC_PAGE_SIZE
+ftdv_fmc.settings.TASK_POLL_MIN = const.FMC_TASK_POLL_MIN
+ftdv_fmc.settings.TASK_POLL_MAX = const.FMC_TASK_POLL_MAX
+ftdv_fmc.settings.TASK_POLL_BACKOFF = const.FMC_TASK_POLL_BACKOFF
+ftdv_fmc.settings.CIRCUIT_FAILURE_THRESHOLD = const.FMC_CIRCUIT_FAILURE_THRESHOLD
+ftdv_fmc.settings.CIRCUIT_COOL_DOWN = const.FMC_CIRCUIT_COOL_DOWN
+# Circuit state is shared by all Lambda functions of this deployment
+ftdv_fmc.settings.CIRCUIT_STORE = store.get_shared_store
+# Throttling metrics go to CloudWatch as EMF log records
+ftdv_fmc.settings.METRIC_PUBLISHER = utl.put_emf_metric
+ftdv_fmc.settings.CALL_STATS_PUBLISHER = utl.put_emf_call_stats
+if const.FMC_RATE_LIMIT_SHARED:
+    ftdv_fmc.settings.RATE_COUNTER = lambda key, ttl: store.get_shared_store().incr(key, ttl=ttl)
+
+
+def get_fmc_circuit(fmc_server):
+    """
+    Purpose:    To get circuit breaker of an FMC, its state is shared by all workers
+    Parameters: FMC server (IP or hostname)
+    Returns:    ftdv_fmc.CircuitBreaker object
+    Raises:
+    """
+    return ftdv_fmc.get_circuit_breaker('https://' + fmc_server)
+
+
+# Global domain config path, FMC collections indexed by ObjectCatalog are relative to it
+fmc_domain_path = "/api/fmc_config/v1/domain/e276abec-e0f2-11e3-8169-6d9ed49b625f"
+catalog_collections = {
+    'devicegrouprecords': '/devicegroups/devicegrouprecords',
+    'securityzones': '/object/securityzones',
+    'networkaddresses': '/object/networkaddresses',
+    'networkgroups': '/object/networkgroups',
+    'protocolportobjects': '/object/protocolportobjects',
+    'devicerecords': '/devices/devicerecords',
+    'accesspolicies': '/policy/accesspolicies',
+    'ftdnatpolicies': '/policy/ftdnatpolicies'
+}
+# Paths whose create/update/delete changes an indexed collection
+catalog_write_paths = {
+    '/object/hosts': 'networkaddresses',
+    '/object/networks': 'networkaddresses',
+    '/object/ranges': 'networkaddresses'
+}
+catalog_write_paths.update({path: collection for collection, path in catalog_collections.items()})
+
+# Audit records of changes, made outside this deployment, are mapped to indexed collections
+# by REST path in record, else by these keywords of FMC UI subsystem/message
+fmc_audit_path = "/api/fmc_platform/v1/domain/e276abec-e0f2-11e3-8169-6d9ed49b625f/audit/auditrecords"
+audit_change_words = ['create', 'add', 'modif', 'edit', 'update', 'save', 'delete', 'remov', 'register']
+audit_keyword_collections = [
+    ('security zone', ['securityzones']),
+    ('network', ['networkaddresses', 'networkgroups']),
+    ('host', ['networkaddresses']),
+    ('range', ['networkaddresses']),
+    ('port', ['protocolportobjects']),
+    ('device group', ['devicegrouprecords']),
+    ('device management', ['devicerecords', 'devicegrouprecords']),
+    ('interface', ['devicerecords']),
+    ('routing', ['devicerecords']),
+    ('access control', ['accesspolicies']),
+    ('access policy', ['accesspolicies']),
+    ('nat', ['ftdnatpolicies']),
+    ('assignment', ['policyassignments'])
+]
+# Paths & keywords of changes not indexed by catalog, but relevant to cached FMC configuration validation
+audit_write_paths = {'/assignment/policyassignments': 'policyassignments'}
+audit_write_paths.update(catalog_write_paths)
+# Changes of these collections make captured device templates stale
+device_template_collections = ['securityzones', 'networkaddresses', 'networkgroups', 'devicerecords']
+# Changes of these collections make cached FMC configuration validation stale
+validation_collections = ['devicegrouprecords', 'accesspolicies', 'ftdnatpolicies', 'securityzones',
+                          'networkaddresses', 'policyassignments']
+
+# Server side filters of collections, used to look up a single name without fetching whole collection
+# FMC matches these filters partially (contains), hence results are matched exactly on client side
+catalog_filters = {
+    'devicegrouprecords': 'name',
+    'securityzones': 'name',
+    'networkaddresses': 'nameOrValue',
+    'networkgroups': 'nameOrValue',
+    'protocolportobjects': 'nameOrValue',
+    'devicerecords': 'name',
+    'accesspolicies': 'name',
+    'ftdnatpolicies': 'name'
+}
+# Object catalogs per FMC server, kept at module scope so that warm Lambda invocations re-use the indexes
+fmc_catalog_pool = {}
+
+
+class ObjectCatalog:
+    """
+        ObjectCatalog class keeps name to id index of FMC collections, built by one bulk fetch per collection
+        Indexes are kept in memory & in shared store, so all functions of a deployment can share them
+        Memory copy is used only while its generation matches the one in shared store,
+        generation is checked at most once per FMC_CATALOG_GENERATION_CHECK, so that memory hits do no store read
+    """
+    def __init__(self, server):
+        self.server = server
+        self.store = store.get_shared_store()
+        self.indexes = {}
+        # Per collection locks, so that parallel lookups wait for one bulk fetch instead of doing their own
+        self.locks = {}
+        # Per collection filter support, detected on first filtered lookup
+        self.filter_support = {}
+
+    def __store_key(self, collection):
+        return 'catalog:' + self.server + ':' + collection
+
+    @staticmethod
+    def __ttl(collection):
+        if collection == 'devicerecords':
+            return const.FMC_CATALOG_DEVICE_TTL
+        return const.FMC_CATALOG_TTL
+
+    def __generation_key(self, collection):
+        return 'catalog-generation:' + self.server + ':' + collection
+
+    def __generation(self, collection, default):
+        # Generation is bumped on every invalidation, a copy of other generation is stale
+        try:
+            return self.store.get(self.__generation_key(collection))
+        except Exception as e:
+            logger.debug("Unable to read %s catalog generation from shared store: %s" % (collection, str(e)))
+            return default
+
+    def __load(self, collection):
+        # Index is kept as a header & chunks, any missing chunk makes whole index absent
+        try:
+            header = self.store.get(self.__store_key(collection))
+            if header is None:
+                return None
+            items = {}
+            for chunk_number in range(header['chunks']):
+                chunk = self.store.get(self.__store_key(collection) + ':' + header['part'] + ':' + str(chunk_number))
+                if chunk is None:
+                    return None
+                items.update(chunk)
+            return {'fetched': header['fetched'], 'generation': header['generation'], 'items': items}
+        except Exception as e:
+            logger.error("Unable to read %s catalog from shared store: %s" % (collection, str(e)))
+            return None
+
+    @staticmethod
+    def __chunks(items):
+        # Splits index so that no store item exceeds FMC_CATALOG_CHUNK_SIZE bytes
+        chunks = [{}]
+        size = 0
+        for name, entry in items.items():
+            entry_size = len(json.dumps({name: entry}, separators=(',', ':')))
+            if chunks[-1] and size + entry_size > const.FMC_CATALOG_CHUNK_SIZE:
+                chunks.append({})
+                size = 0
+            chunks[-1][name] = entry
+            size += entry_size
+        return chunks
+
+    def __save(self, collection, index):
+        # Chunks of each save get own keys, so that concurrent saves don't mix chunks of different fetches
+        ttl = self.__ttl(collection)
+        part = hashlib.sha1((self.server + collection + repr(time.time())).encode()).hexdigest()[:12]
+        try:
+            chunks = self.__chunks(index['items'])
+            for chunk_number, chunk in enumerate(chunks):
+                self.store.put(self.__store_key(collection) + ':' + part + ':' + str(chunk_number), chunk, ttl=ttl)
+            self.store.put(self.__store_key(collection), {
+                'fetched': index['fetched'],
+                'generation': index['generation'],
+                'part': part,
+                'chunks': len(chunks)
+            }, ttl=ttl)
+        except Exception as e:
+            logger.error("Unable to write %s catalog to shared store: %s" % (collection, str(e)))
+
+    def __filter_supported(self, collection):
+        if collection not in catalog_filters:
+            return False
+        supported = self.filter_support.get(collection)
+        if supported is None:
+            try:
+                supported = self.store.get('catalog-filter:' + self.server + ':' + collection)
+            except Exception as e:
+                logger.debug("Unable to read %s filter support from shared store: %s" % (collection, str(e)))
+            supported = supported is not False
+            self.filter_support[collection] = supported
+        return supported
+
+    def __set_filter_unsupported(self, collection):
+        logger.info("Server side filter of %s is not supported, falling back to full fetch" % collection)
+        self.filter_support[collection] = False
+        try:
+            self.store.put('catalog-filter:' + self.server + ':' + collection, False,
+                           ttl=const.FMC_FILTER_SUPPORT_TTL)
+        except Exception as e:
+            logger.debug("Unable to write %s filter support to shared store: %s" % (collection, str(e)))
+
+    def __search(self, fmc, collection, name, item_type):
+        # Returns (searched, Object Id), searched is False if filtered lookup could not be done
+        if not self.__filter_supported(collection):
+            return False, None
+        key = catalog_filters[collection]
+        obj_id = None
+        try:
+            for item in fmc.get_collection_items(collection, filter=key + ':' + name):
+                # A filter ignored by FMC lists unrelated items, the result then can't be trusted
+                if name.lower() not in (item['name'] + ' ' + str(item.get('value', ''))).lower():
+                    self.__set_filter_unsupported(collection)
+                    return False, None
+                if obj_id is None and item['name'] == name and item_type in (None, item['type']):
+                    obj_id = str(item['id'])
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code in (400, 404, 422):
+                self.__set_filter_unsupported(collection)
+            else:
+                logger.debug("Filtered lookup of %s failed: %s" % (collection, str(e)))
+            return False, None
+        return True, obj_id
+
+    def get_index(self, fmc, collection, refresh=False):
+        """
+        Purpose:    To get name to id index of a collection, bulk fetched from FMC if absent or expired
+        Parameters: FirepowerManagementCenter object, Collection name, Force re-fetch
+        Returns:    dict {name: {type: id}}
+        Raises:
+        """
+        with self.locks.setdefault(collection, threading.Lock()):
+            now = time.time()
+            index = self.indexes.get(collection)
+            if not refresh and index is not None and index['fetched'] + self.__ttl(collection) >= now and \
+                    index['checked'] + const.FMC_CATALOG_GENERATION_CHECK >= now:
+                return index['items']
+            # Store unreachable: memory copy is trusted within its time to live
+            generation = self.__generation(collection, index['generation'] if index is not None else None)
+            if not refresh:
+                if index is None or index['fetched'] + self.__ttl(collection) < now or \
+                        index['generation'] != generation:
+                    index = self.__load(collection)
+                if index is not None and index['fetched'] + self.__ttl(collection) >= now and \
+                        index['generation'] == generation:
+                    index['checked'] = now
+                    self.indexes[collection] = index
+                    return index['items']
+            items = {}
+            for item in fmc.get_collection_items(collection):
+                # First match wins, same as linear scan of the listing
+                items.setdefault(item['name'], {}).setdefault(item['type'], str(item['id']))
+            index = {'fetched': now, 'generation': generation, 'checked': now, 'items': items}
+            self.indexes[collection] = index
+            self.__save(collection, index)
+            logger.debug("Catalog of %s re-fetched with %d names" % (collection, len(items)))
+            return items
+
+    def lookup(self, fmc, collection, name, item_type=None, refresh=False):
+        """
+        Purpose:    To get id of an object by its name & type
+                    On re-fetch, only the name is fetched using server side filter if collection supports it
+        Parameters: FirepowerManagementCenter object, Collection name, Object name, Object type, Force re-fetch
+        Returns:    Object Id, None
+        Raises:
+        """
+        if refresh:
+            searched, obj_id = self.__search(fmc, collection, name, item_type)
+            if searched:
+                return obj_id
+        entry = self.get_index(fmc, collection, refresh).get(name, {})
+        if item_type is None and entry:
+            return next(iter(entry.values()))
+        if item_type in entry:
+            return entry[item_type]
+        # Object might have been created after index was fetched, look up again unless index is fresh
+        if not refresh and self.indexes[collection]['fetched'] + const.FMC_CATALOG_MISS_REFRESH < time.time():
+            return self.lookup(fmc, collection, name, item_type, refresh=True)
+        return None
+
+    def invalidate(self, collection):
+        """
+        Purpose:    To drop index of a collection from memory & shared store
+                    Generation is bumped, so that other containers drop their memory copy as well
+        Parameters: Collection name
+        Returns:
+        Raises:
+        """
+        logger.debug("Invalidating catalog of " + collection)
+        self.indexes.pop(collection, None)
+        try:
+            self.store.put(self.__generation_key(collection), repr(time.time()))
+            self.store.delete(self.__store_key(collection))
+        except Exception as e:
+            logger.error("Unable to delete %s catalog from shared store: %s" % (collection, str(e)))
+
+    def invalidate_by_url(self, url):
+        """
+        Purpose:    To invalidate collection changed by a create/update/delete REST call
+        Parameters: REST url
+        Returns:
+        Raises:
+        """
+        prefix = self.server + fmc_domain_path
+        path = url.split('?')[0]
+        if not path.startswith(prefix):
+            return
+        path = path[len(prefix):].rstrip('/')
+        for write_path, collection in catalog_write_paths.items():
+            # Only the collection itself or its direct members, not sub-resources like device interfaces
+            if path == write_path or (path.startswith(write_path + '/') and '/' not in path[len(write_path) + 1:]):
+                self.invalidate(collection)
+
+
+def audit_record_collections(record):
+    """
+    Purpose:    To map an audit record to indexed collections it changed
+    Parameters: Audit record
+    Returns:    set of collection names, empty if record is not a change of an indexed collection
+    Raises:
+    """
+    text = (str(record.get('subsystem', '')) + ' ' + str(record.get('message', ''))).lower()
+    match = re.search(r'/api/fmc_config/v1/domain/[^/\s]+(/[^\s?]*)', text)
+    if match is not None:
+        if re.search(r'\b(post|put|delete)\b', text) is None:
+            return set()
+        path = match.group(1).rstrip('/')
+        return {collection for write_path, collection in audit_write_paths.items()
+                if path == write_path or path.startswith(write_path + '/')}
+    if not any(word in text for word in audit_change_words):
+        return set()
+    collections = set()
+    for keyword, names in audit_keyword_collections:
+        if re.search(r'\b' + keyword + r's?\b', text) is not None:
+            collections.update(names)
+    return collections
+
+
+class AuditFeed:
+    """
+        AuditFeed class tails FMC audit records from a high-water mark kept in shared store
+        & invalidates object catalog & device templates of what changed, each poll fetches only the delta
+    """
+    def __init__(self, server, catalog):
+        self.server = server
+        self.catalog = catalog
+        self.store = store.get_shared_store()
+        self.key = 'audit-feed:' + server
+        self.lock_key = self.key + ':lock'
+
+    def __records(self, fmc, since):
+        try:
+            for record in fmc.iter_collection(fmc_audit_path, filter='starttime:' + str(int(since))):
+                yield record
+            return
+        except requests.exceptions.HTTPError as e:
+            if e.response is None or e.response.status_code not in (400, 404, 422):
+                raise
+            logger.debug("Audit records filter not supported, reading latest records instead")
+        # Latest record comes first, records older than high-water mark end the delta
+        for record in fmc.iter_collection(fmc_audit_path):
+            if record.get('time', 0) < since:
+                return
+            yield record
+
+    def poll(self, fmc):
+        """
+        Purpose:    To read audit records since high-water mark & invalidate caches of changed collections
+                    On first poll nothing is known of earlier changes, hence all collections are invalidated
+        Parameters: FirepowerManagementCenter object
+        Returns:    set of invalidated collection names
+        Raises:
+        """
+        try:
+            if not self.store.add(self.lock_key, int(time.time()), ttl=const.FMC_AUDIT_FEED_LOCK_TTL):
+                logger.debug("Audit feed is being polled by another worker")
+                return set()
+            hwm = self.store.get(self.key)
+        except Exception as e:
+            logger.error("Unable to read audit feed high-water mark: " + str(e))
+            return set()
+        try:
+            if hwm is None:
+                changed = set(catalog_collections)
+                latest = time.time()
+            else:
+                changed = set()
+                latest = hwm
+                for record in self.__records(fmc, hwm):
+                    latest = max(latest, record.get('time', 0))
+                    changed.update(audit_record_collections(record))
+            for collection in changed & set(catalog_collections):
+                self.catalog.invalidate(collection)
+            if set(device_template_collections) & changed:
+                self.store.put('device-template-generation:' + self.server, int(time.time()))
+            if set(validation_collections) & changed:
+                self.store.delete('fmc-validation:' + self.server)
+            self.store.put(self.key, latest)
+            if changed:
+                logger.info("Audit feed invalidated: " + ', '.join(sorted(changed)))
+            return changed
+        except Exception as e:
+            logger.error("Unable to poll audit feed: " + str(e))
+            return set()
+        finally:
+            try:
+                self.store.delete(self.lock_key)
+            except Exception as e:
+                logger.debug("Unable to unlock audit feed: " + str(e))
+
+
+def interface_matches(item, nic, ifname, zone_id, mtu, ip=None):
+    """
+    Purpose:    To compare a physical interface (expanded) with its desired configuration
+    Parameters: Physical interface item, Nic, Interface name, Zone Id, MTU, Ip (STATIC) or None (DHCP)
+    Returns:    True if configured as desired
+    Raises:
+    """
+    if item.get('name') != nic or item.get('ifname') != ifname:
+        return False
+    if item.get('securityZone', {}).get('id') != zone_id or str(item.get('MTU')) != str(mtu):
+        return False
+    ipv4 = item.get('ipv4', {})
+    if ip is not None:
+        return ipv4.get('static', {}).get('address') == ip
+    return 'dhcp' in ipv4
+
+
+def route_matches(route, interface_name, network, gateway):
+    """
+    Purpose:    To compare a static route (expanded) with desired route
+    Parameters: Static route item, Interface name, Network object name, Gateway object name or Ip
+    Returns:    True if route is same
+    Raises:
+    """
+    if route.get('interfaceName') != interface_name:
+        return False
+    if network not in [item.get('name') for item in route.get('selectedNetworks', [])]:
+        return False
+    gw = route.get('gateway', {})
+    return gw.get('object', {}).get('name') == gateway or gw.get('literal', {}).get('value') == gateway
+
+
+def vtep_matches(policy, nic_id):
+    """
+    Purpose:    To check if a VTEP policy (expanded) has NVE enabled on the Nic
+    Parameters: VTEP policy item, Nic Id
+    Returns:    True if enabled
+    Raises:
+    """
+    if str(policy.get('nveEnable')).lower() != 'true':
+        return False
+    return nic_id in [entry.get('sourceInterface', {}).get('id') for entry in policy.get('vtepEntries', [])]
+
+
+def vni_matches(vni, zone_id):
+    """
+    Purpose:    To check if a VNI interface (expanded) is the one added by add_vni
+    Parameters: VNI interface item, Zone Id
+    Returns:    True if same
+    Raises:
+    """
+    return str(vni.get('vniId')) == '1' and vni.get('securityZone', {}).get('id') == zone_id
+
+
+def get_fmc_catalog(server):
+    """
+    Purpose:    To get object catalog for given FMC
+    Parameters: FMC server url
+    Returns:    ObjectCatalog object
+    Raises:
+    """
+    catalog = fmc_catalog_pool.get(server)
+    if catalog is None:
+        catalog = ObjectCatalog(server)
+        fmc_catalog_pool[server] = catalog
+    return catalog
+
+
+class TokenBroker:
+    """
+        TokenBroker class shares one FMC auth token among all workers through shared store
+        Token is refreshed via refreshtoken API before expiry & handed out as leases which end before refresh
+    """
+    def __init__(self, server, username, password, session, timeout):
+        self.server = server
+        self.username = username
+        self.password = password
+        self.session = session
+        self.timeout = timeout
+        self.store = store.get_shared_store()
+        self.key = 'token:' + server + ':' + username
+        self.lock_key = self.key + ':lock'
+
+    def __generate(self):
+        auth_url = self.server + "/api/fmc_platform/v1/auth/generatetoken"
+        r = ftdv_fmc.send_request(self.session, 'POST', auth_url, {'Content-Type': 'application/json'}, self.timeout,
+                                  auth=requests.auth.HTTPBasicAuth(self.username, config.reveal(self.password)))
+        r.close()
+        if r.headers.get('X-auth-access-token') is None:
+            raise Exception("auth_token not found in generatetoken response, status_code: " + str(r.status_code))
+        logger.info("Generated a new FMC auth token")
+        return {
+            'access_token': r.headers['X-auth-access-token'],
+            'refresh_token': r.headers.get('X-auth-refresh-token'),
+            'domain_uuid': r.headers.get('domain_uuid'),
+            'expires_at': time.time() + const.FMC_TOKEN_MAX_AGE,
+            'refresh_count': 0
+        }
+
+    def __refresh(self, token):
+        auth_url = self.server + "/api/fmc_platform/v1/auth/refreshtoken"
+        headers = {
+            'Content-Type': 'application/json',
+            'X-auth-access-token': token['access_token'],
+            'X-auth-refresh-token': token['refresh_token']
+        }
+        r = ftdv_fmc.send_request(self.session, 'POST', auth_url, headers, self.timeout)
+        r.close()
+        if r.headers.get('X-auth-access-token') is None:
+            raise Exception("auth_token not found in refreshtoken response, status_code: " + str(r.status_code))
+        logger.info("Refreshed FMC auth token, refresh count: " + str(token['refresh_count'] + 1))
+        return {
+            'access_token': r.headers['X-auth-access-token'],
+            'refresh_token': r.headers.get('X-auth-refresh-token'),
+            'domain_uuid': r.headers.get('domain_uuid', token['domain_uuid']),
+            'expires_at': time.time() + const.FMC_TOKEN_MAX_AGE,
+            'refresh_count': token['refresh_count'] + 1
+        }
+
+    def __renew(self, token):
+        # Refresh is cheaper & keeps FMC concurrent token count down, generate only if refresh is not possible
+        if token is not None and token['refresh_token'] is not None and time.time() < token['expires_at'] \
+                and token['refresh_count'] < const.FMC_TOKEN_MAX_REFRESH:
+            try:
+                return self.__refresh(token)
+            except Exception as e:
+                logger.error("Unable to refresh FMC auth token, generating a new one: " + str(e))
+        return self.__generate()
+
+    def __load(self):
+        try:
+            return self.store.get(self.key)
+        except Exception as e:
+            logger.error("Unable to read FMC auth token from shared store: " + str(e))
+            return None
+
+    @staticmethod
+    def __leasable(token):
+        return token is not None and time.time() < token['expires_at'] - const.FMC_TOKEN_REFRESH_MARGIN
+
+    @staticmethod
+    def __lease(token):
+        return {
+            'access_token': token['access_token'],
+            'domain_uuid': token['domain_uuid'],
+            'expires_at': token['expires_at'] - const.FMC_TOKEN_REFRESH_MARGIN
+        }
+
+    def acquire_lease(self):
+        """
+        Purpose:    To get a lease on shared FMC auth token, token is refreshed/generated if needed
+        Parameters:
+        Returns:    dict {access_token, domain_uuid, expires_at}, lease must not be used after expires_at
+        Raises:     Error in generating auth token
+        """
+        token = self.__load()
+        if self.__leasable(token):
+            return self.__lease(token)
+        try:
+            locked = self.store.add(self.lock_key, int(time.time()), ttl=const.FMC_TOKEN_LOCK_TTL)
+        except Exception as e:
+            logger.error("Unable to lock FMC auth token in shared store: " + str(e))
+            locked = True
+        if locked:
+            try:
+                # Another worker might have renewed it in meantime
+                token = self.__load()
+                if not self.__leasable(token):
+                    token = self.__renew(token)
+                    self.store.put(self.key, token, ttl=token['expires_at'] - time.time())
+            except Exception as e:
+                if not self.__leasable(token):
+                    raise
+                logger.error("Unable to write FMC auth token to shared store: " + str(e))
+            finally:
+                try:
+                    self.store.delete(self.lock_key)
+                except Exception as e:
+                    logger.error("Unable to unlock FMC auth token in shared store: " + str(e))
+            return self.__lease(token)
+        # Another worker is renewing the token, wait for it
+        wait_until = time.time() + const.FMC_TOKEN_WAIT_TIME
+        while time.time() < wait_until:
+            time.sleep(1)
+            token = self.__load()
+            if self.__leasable(token):
+                return self.__lease(token)
+        logger.info("Shared FMC auth token not renewed in time, using a private token")
+        return self.__lease(self.__generate())
+
 
 class FirepowerManagementCenter:
     """
@@ -42,8 +654,33 @@ class FirepowerManagementCenter:
         self.headers = []
         self.domain_uuid = ""
         self.authTokenTimestamp = 0
-        self.authTokenMaxAge = 15*60  # seconds - 30 minutes is the max without using refresh
+        self.authTokenMaxAge = 15*60  # seconds - updated to lease duration once token is acquired
         self.accessPolicyName = accesspolicy
+        self.session = get_fmc_session(self.server)
+        self.timeout = (const.FMC_CONNECT_TIMEOUT, const.FMC_READ_TIMEOUT)
+        self.token_broker = TokenBroker(self.server, username, password, self.session, self.timeout)
+        self.catalog = get_fmc_catalog(self.server)
+        self.read_cache = ftdv_fmc.ReadCache()
+
+    def send_request(self, method, url, **kwargs):
+        """
+        Purpose:    To send a REST request within client side rate limit
+                    throttled(429/503) requests are retried after Retry-After or jittered exponential backoff
+        Parameters: HTTP method, url, keyword arguments of requests.Session.request
+        Returns:    Response of last attempt
+        Raises:     requests exceptions of connection errors
+        """
+        return ftdv_fmc.send_request(self.session, method, url, self.headers, self.timeout, **kwargs)
+
+    def read_scope(self):
+        """
+        Purpose:    Context manager of an operation scope, within it GET responses are memoized
+                    writes drop memoized responses of the changed collection
+        Parameters:
+        Returns:    Context manager
+        Raises:
+        """
+        return self.read_cache.scope()
 
     def rest_get(self, url):
         """
@@ -51,16 +688,19 @@ class FirepowerManagementCenter:
         Parameters: url
         Returns:    r.text is the text response (r.json() is a python dict version of the json response)
                     r.status_code = 2xx on success
-        Raises:
+        Raises:     requests ConnectionError(CircuitOpenError while circuit is open), Timeout
         """
         # if the token is too old then get another
         if time.time() > self.authTokenMaxAge + self.authTokenTimestamp:
             logging.debug("Getting a new authToken")
             self.get_auth_token()
+        r = None
+        unreachable = False
         try:
             # REST call with SSL verification turned off:
             logging.debug("Request: " + url)
-            r = requests.get(url, headers=self.headers, verify=False)
+            # Identical in-flight GETs share one request, memoized response is used within a read scope
+            r = self.read_cache.get(url, partial(self.send_request, 'GET', url))
             # REST call with SSL verification turned on:
             # r = requests.get(url, headers=headers, verify='/path/to/ssl_certificate')
             status_code = r.status_code
@@ -75,11 +715,16 @@ class FirepowerManagementCenter:
             else:
                 r.raise_for_status()
                 raise Exception("Error occurred in Get -->"+resp)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            # FMC is unreachable or its circuit is open(CircuitOpenError), caller gets the error
+            unreachable = True
+            raise
         except requests.exceptions.HTTPError as err:
             raise Exception("Error in connection --> "+str(err))
         finally:
             if r: r.close()
-            return r
+            if not unreachable:
+                return r
 
     def rest_post(self, url, post_data):
         """
@@ -88,16 +733,19 @@ class FirepowerManagementCenter:
         Returns:    This function will return 'r' which is the response from the post:
                     r.text is the text response (r.json() is a python dict version of the json response)
                     r.status_code = 2xx on success
-        Raises:     Error occurred in post
+        Raises:     Error occurred in post,
+                    requests ConnectionError(CircuitOpenError while circuit is open), Timeout
         """
         if time.time() > self.authTokenMaxAge + self.authTokenTimestamp:
             logging.debug("Getting a new authToken")
             self.get_auth_token()
+        r = None
+        unreachable = False
         try:
             # REST call with SSL verification turned off:
             logging.debug("Request: " + url)
             logging.debug("Post_data " + str(post_data))
-            r = requests.post(url, data=json.dumps(post_data), headers=self.headers, verify=False)
+            r = self.send_request('POST', url, data=json.dumps(post_data))
             # REST call with SSL verification turned on:
             # r = requests.post(url,data=json.dumps(post_data), headers=self.headers, verify='/path/to/ssl_certificate')
             status_code = r.status_code
@@ -112,11 +760,19 @@ class FirepowerManagementCenter:
             else:
                 r.raise_for_status()
                 raise Exception("Error occurred in POST --> "+resp)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            # FMC is unreachable or its circuit is open(CircuitOpenError), caller gets the error
+            unreachable = True
+            raise
         except requests.exceptions.HTTPError as err:
             raise Exception("Error in connection --> "+str(err))
         finally:
+            # Changed collection is dropped from catalog & read cache, even if the call failed midway
+            self.catalog.invalidate_by_url(url)
+            self.read_cache.invalidate(url)
             if r: r.close()
-            return r
+            if not unreachable:
+                return r
 
     def rest_put(self, url, put_data):
         """
@@ -125,16 +781,18 @@ class FirepowerManagementCenter:
         Returns:    This function will return 'r' which is the response from the put:
                     r.text is the text response (r.json() is a python dict version of the json response)
                     r.status_code = 2xx on success
-        Raises:
+        Raises:     requests ConnectionError(CircuitOpenError while circuit is open), Timeout
         """
         if time.time() > self.authTokenMaxAge + self.authTokenTimestamp:
             logging.debug("Getting a new authToken")
             self.get_auth_token()
+        r = None
+        unreachable = False
         try:
             # REST call with SSL verification turned off:
             logging.info("Request: " + url)
             logging.info("Put_data: " + str(put_data))
-            r = requests.put(url, data=json.dumps(put_data), headers=self.headers, verify=False)
+            r = self.send_request('PUT', url, data=json.dumps(put_data))
             # REST call with SSL verification turned on:
             # r = requests.put(url, data=json.dumps(put_data), headers=headers, verify='/path/to/ssl_certificate')
             status_code = r.status_code
@@ -146,11 +804,19 @@ class FirepowerManagementCenter:
             else:
                 r.raise_for_status()
                 raise Exception("Error occurred in put -->" + resp)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            # FMC is unreachable or its circuit is open(CircuitOpenError), caller gets the error
+            unreachable = True
+            raise
         except requests.exceptions.HTTPError as err:
             raise Exception("Error in connection --> "+str(err))
         finally:
+            # Changed collection is dropped from catalog & read cache, even if the call failed midway
+            self.catalog.invalidate_by_url(url)
+            self.read_cache.invalidate(url)
             if r: r.close()
-            return r
+            if not unreachable:
+                return r
 
     def rest_delete(self, url):
         """
@@ -159,16 +825,18 @@ class FirepowerManagementCenter:
         Returns:    This function will return 'r' which is the response to the request:
                     r.text is the text response (r.json() is a python dict version of the json response)
                     r.status_code = 2xx on success
-        Raises:
+        Raises:     requests ConnectionError(CircuitOpenError while circuit is open), Timeout
         """
         if time.time() > self.authTokenMaxAge + self.authTokenTimestamp:
             logging.debug("Getting a new authToken")
             self.get_auth_token()
 
+        r = None
+        unreachable = False
         try:
             # REST call with SSL verification turned off:
             logging.debug("Request: " + url)
-            r = requests.delete(url, headers=self.headers, verify=False)
+            r = self.send_request('DELETE', url)
             # REST call with SSL verification turned on:
             # r = requests.delete(url, headers=headers, verify='/path/to/ssl_certificate')
             status_code = r.status_code
@@ -183,50 +851,67 @@ class FirepowerManagementCenter:
             else:
                 r.raise_for_status()
                 raise Exception("Error occurred in Delete -->"+resp)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            # FMC is unreachable or its circuit is open(CircuitOpenError), caller gets the error
+            unreachable = True
+            raise
         except requests.exceptions.HTTPError as err:
             raise Exception("Error in connection --> "+str(err))
         finally:
+            # Changed collection is dropped from catalog & read cache, even if the call failed midway
+            self.catalog.invalidate_by_url(url)
+            self.read_cache.invalidate(url)
             if r: r.close()
-            return r
+            if not unreachable:
+                return r
 
     def get_auth_token(self):
         """
-        Purpose:    get a new REST authentication token
+        Purpose:    get a lease on shared REST authentication token from token broker
                     update the 'headers' variable
-                    set a timestamp for the header (tokens expire)
+                    set a timestamp & max age for the header (lease expires before token)
         Parameters:
         Returns:
         Raises:
         """
-        self.headers = {'Content-Type': 'application/json'}
-        api_auth_path = "/api/fmc_platform/v1/auth/generatetoken"
-        auth_url = self.server + api_auth_path
+        headers = {'Content-Type': 'application/json'}
+        # Headers are replaced at once, as parallel calls of AsyncFirepowerManagementCenter may be using them
+        self.headers = headers
         try:
-            # 2 ways of making a REST call are provided:
-            # One with "SSL verification turned off" and the other with "SSL verification turned on".
-            # The one with "SSL verification turned off" is commented out. If you like to use that then
-            # uncomment the line where verify=False and comment the line with =verify='/path/to/ssl_certificate'
-            # REST call with SSL verification turned off:
-            r = requests.post(auth_url, headers=self.headers,
-                              auth=requests.auth.HTTPBasicAuth(self.username, self.password), verify=False)
-            # REST call with SSL verification turned on: Download SSL certificates
-            # from your FMC first and provide its path for verification.
-            # r = requests.post(auth_url, headers=self.headers,
-            #                   auth=requests.auth.HTTPBasicAuth(username,password), verify='/path/to/ssl_certificate')
-            auth_headers = r.headers
-            auth_token = auth_headers.get('X-auth-access-token', default=None)
-            self.domain_uuid = auth_headers.get('domain_uuid', default=None)
-            self.headers['X-auth-access-token'] = auth_token
+            lease = self.token_broker.acquire_lease()
+            self.domain_uuid = lease['domain_uuid']
+            headers = dict(headers)
+            headers['X-auth-access-token'] = lease['access_token']
+            self.headers = headers
             self.authTokenTimestamp = int(time.time())
-            # logging.debug("Acquired AuthToken: " + auth_token)
+            self.authTokenMaxAge = int(lease['expires_at'] - self.authTokenTimestamp)
             # logging.debug("domain_uuid: " + domain_uuid)
-            if auth_token is None:
-                logging.debug("auth_token not found. Exiting...")
-                # raise Exception("Error occurred in get auth token ")
         except Exception as err:
             logger.error("Error in generating auth token --> " + str(err))
         return
 
+    def iter_collection(self, path, page_size=const.FMC_PAGE_SIZE, expanded=False, filter=None):
+        """
+        Purpose:    Generator over items of a FMC collection, fetched page by page following paging.next links
+                    Only one page is held in memory, caller can stop iterating at first match
+        Parameters: API path of collection, Items per page, Expanded items, FMC filter expression
+        Returns:    Items of collection
+        Raises:     requests.exceptions.HTTPError, on failed page fetch
+        """
+        return ftdv_fmc.iter_collection(self, path, page_size, expanded, filter)
+
+    def get_collection_items(self, collection, filter=None):
+        """
+        Purpose:    To fetch items of a collection indexed by object catalog
+        Parameters: Collection name, FMC filter expression
+        Returns:    Items of collection
+        Raises:     Error occurred in collection fetch
+        """
+        if filter is not None:
+            return self.iter_collection(fmc_domain_path + catalog_collections[collection],
+                                        page_size=const.FMC_FILTER_PAGE_SIZE, filter=filter)
+        return self.iter_collection(fmc_domain_path + catalog_collections[collection])
+
     def get_device_grp_id_by_name(self, name):
         """
         Purpose:    To get device group id by passing name of the group
@@ -234,14 +919,7 @@ class FirepowerManagementCenter:
         Returns:    Group Id or None
         Raises:
         """
-        api_path = "/api/fmc_config/v1/domain/e276abec-e0f2-11e3-8169-6d9ed49b625f/devicegroups/devicegrouprecords"
-        url = self.server + api_path + '?offset=0&limit=9000'
-        r = self.rest_get(url)
-        if 'items' in r.json():
-            for item in r.json()['items']:
-                if item['name'] == name:
-                    return str(item['id'])
-        return None
+        return self.catalog.lookup(self, 'devicegrouprecords', name)
 
     def get_member_list_in_device_grp(self, grp_id):
         """
@@ -269,14 +947,7 @@ class FirepowerManagementCenter:
         Returns:    Zone ID, None
         Raises:
         """
-        api_path = "/api/fmc_config/v1/domain/e276abec-e0f2-11e3-8169-6d9ed49b625f/object/securityzones"
-        url = self.server + api_path + '?offset=0&limit=9000'
-        r = self.rest_get(url)
-        if 'items' in r.json():
-            for item in r.json()['items']:
-                if item['name'] == name:
-                    return str(item['id'])
-        return None
+        return self.catalog.lookup(self, 'securityzones', name)
 
     def get_network_host_objectids(self):
         """
@@ -285,17 +956,13 @@ class FirepowerManagementCenter:
         Returns:    Network & Host Object Name & Ids
         Raises:
         """
-        api_path = "/api/fmc_config/v1/domain/e276abec-e0f2-11e3-8169-6d9ed49b625f/object/networkaddresses"
-        url = self.server + api_path + '?offset=0&limit=10000'
         network_obj = {}
         host_obj = {}
-        group_obj = {}
-        r = self.rest_get(url)
-        for item in r.json()['items']:
-            if item['type'] == 'Network':
-                network_obj[item['name']] = str(item['id'])
-            elif item['type'] == 'Host':
-                host_obj[item['name']] = str(item['id'])
+        for name, entry in self.catalog.get_index(self, 'networkaddresses').items():
+            if 'Network' in entry:
+                network_obj[name] = entry['Network']
+            if 'Host' in entry:
+                host_obj[name] = entry['Host']
 
         return network_obj, host_obj
     
@@ -307,12 +974,9 @@ class FirepowerManagementCenter:
         Returns: Group Object Name & Ids
         Raises:
         """
-        api_path = "/api/fmc_config/v1/domain/e276abec-e0f2-11e3-8169-6d9ed49b625f/object/networkgroups"
-        url = self.server + api_path + '?offset=0&limit=10000'
         group_obj = {}
-        r = self.rest_get(url)
-        for item in r.json()['items']:
-            group_obj[item['name']] = str(item['id'])
+        for name, entry in self.catalog.get_index(self, 'networkgroups').items():
+            group_obj[name] = next(iter(entry.values()))
       
         return group_obj
     
@@ -323,15 +987,8 @@ class FirepowerManagementCenter:
         Returns: Group Object Name & Ids
         Raises:
         """
-        api_path = "/api/fmc_config/v1/domain/e276abec-e0f2-11e3-8169-6d9ed49b625f/object/networkgroups"
-        url = self.server + api_path + '?offset=0&limit=10000'
-        group_obj = {}
-        r = self.rest_get(url)
-        for item in r.json()['items']:
-            group_obj[item['name']] = str(item['id'])
-            if item['name'] == name:
-                return str(item['id'])
-        return ''
+        obj_id = self.catalog.lookup(self, 'networkgroups', name)
+        return obj_id if obj_id is not None else ''
 
 
     # Get network objects (all network and host objects)
@@ -342,14 +999,9 @@ class FirepowerManagementCenter:
         Returns:    Object Id
         Raises:
         """
-        api_path = "/api/fmc_config/v1/domain/e276abec-e0f2-11e3-8169-6d9ed49b625f/object/networkaddresses"
-        url = self.server + api_path + '?offset=0&limit=10000'
-        r = self.rest_get(url)
-        for item in r.json()['items']:
-            if item['type'] == 'Network' and item['name'] == name:
-                return str(item['id'])
+        obj_id = self.catalog.lookup(self, 'networkaddresses', name, 'Network')
         # raise Exception('network object with name ' + name + ' was not found')
-        return ''
+        return obj_id if obj_id is not None else ''
 
     def get_port_objectid_by_name(self, name):
         """
@@ -358,14 +1010,9 @@ class FirepowerManagementCenter:
         Returns:    Object Id
         Raises:
         """
-        api_path = "/api/fmc_config/v1/domain/e276abec-e0f2-11e3-8169-6d9ed49b625f/object/protocolportobjects"
-        url = self.server + api_path + '?offset=0&limit=10000'
-        r = self.rest_get(url)
-        for item in r.json()['items']:
-            if item['type'] == 'ProtocolPortObject' and item['name'] == name:
-                return str(item['id'])
+        obj_id = self.catalog.lookup(self, 'protocolportobjects', name, 'ProtocolPortObject')
         # raise Exception('network port with name ' + name + ' was not found')
-        return ''
+        return obj_id if obj_id is not None else ''
 
     def get_host_objectid_by_name(self, name):
         """
@@ -374,31 +1021,21 @@ class FirepowerManagementCenter:
         Returns:    Object Id
         Raises:
         """
-        api_path = "/api/fmc_config/v1/domain/e276abec-e0f2-11e3-8169-6d9ed49b625f/object/hosts"
-        url = self.server + api_path + '?offset=0&limit=10000'
-        r = self.rest_get(url)
-        for item in r.json()['items']:
-            if item['type'] == 'Host' and item['name'] == name:
-                return str(item['id'])
+        # Host objects are part of networkaddresses collection, hence share its index
+        obj_id = self.catalog.lookup(self, 'networkaddresses', name, 'Host')
         # raise Exception('host object with name ' + name + ' was not found')
-        return ''
+        return obj_id if obj_id is not None else ''
 
-    def get_device_id_by_name(self, name):
+    def get_device_id_by_name(self, name, refresh=False):
         """
         Purpose:    Get Device Id by its name
-        Parameters: Device Name
+        Parameters: Device Name, Bypass catalog & re-fetch device records
         Returns:    Device Id
         Raises:
         """
-        api_path = "/api/fmc_config/v1/domain/e276abec-e0f2-11e3-8169-6d9ed49b625f/devices/devicerecords"
-        url = self.server + api_path + '?offset=0&limit=10000'
-        r = self.rest_get(url)
-        if 'items' in r.json():
-            for item in r.json()['items']:
-                if item['name'] == name:
-                    return str(item['id'])
+        dev_id = self.catalog.lookup(self, 'devicerecords', name, refresh=refresh)
         # or return empty string
-        return ''
+        return dev_id if dev_id is not None else ''
 
     def get_access_policy_id_by_name(self, name):
         """
@@ -407,15 +1044,7 @@ class FirepowerManagementCenter:
         Returns:    Access Policy Id, None
         Raises:
         """
-        api_path = "/api/fmc_config/v1/domain/e276abec-e0f2-11e3-8169-6d9ed49b625f/policy/accesspolicies"
-        url = self.server + api_path + '?offset=0&limit=10000'
-        r = self.rest_get(url)
-        # Search for policy by name
-        if 'items' in r.json():
-            for item in r.json()['items']:
-                if item['name'] == name:
-                    return str(item['id'])
-        return None
+        return self.catalog.lookup(self, 'accesspolicies', name)
 
     def get_nic_id_by_name(self, device_id, nic_name):
         """
@@ -424,16 +1053,21 @@ class FirepowerManagementCenter:
         Returns:    Nic Id, None
         Raises:
         """
-        api_path = "/api/fmc_config/v1/domain/e276abec-e0f2-11e3-8169-6d9ed49b625f/devices/devicerecords/" + \
-                   device_id + "/physicalinterfaces"
-        url = self.server + api_path
-        r = self.rest_get(url)
-        if 'items' in r.json():
-            for item in r.json()['items']:
-                if item['name'] == nic_name:
-                    return str(item['id'])
+        api_path = fmc_domain_path + "/devices/devicerecords/" + device_id + "/physicalinterfaces"
+        for item in self.iter_collection(api_path):
+            if item['name'] == nic_name:
+                return str(item['id'])
         return None
 
+    def poll_audit_feed(self):
+        """
+        Purpose:    To invalidate caches of FMC objects changed since last poll, as per audit records
+        Parameters:
+        Returns:    set of invalidated collection names
+        Raises:
+        """
+        return AuditFeed(self.server, self.catalog).poll(self)
+
     def get_time_stamp(self):
         """
         Purpose:    Get time stamp
@@ -441,10 +1075,9 @@ class FirepowerManagementCenter:
         Returns:    Audit time stamp
         Raises:
         """
-        api_path = "/api/fmc_platform/v1/domain/e276abec-e0f2-11e3-8169-6d9ed49b625f/audit/auditrecords"
-        url = self.server + api_path
-        r = self.rest_get(url)
-        return r.json()['items'][0]['time']*1000
+        # Latest record comes first, no need to fetch further
+        item = next(self.iter_collection(fmc_audit_path, page_size=1))
+        return item['time']*1000
 
     def get_deployable_devices(self):
         """
@@ -453,15 +1086,12 @@ class FirepowerManagementCenter:
         Returns:    List of devices, pending to be deployed
         Raises:
         """
-        api_path = "/api/fmc_config/v1/domain/e276abec-e0f2-11e3-8169-6d9ed49b625f/deployment/deployabledevices"
-        url = self.server + api_path
-        r = self.rest_get(url)
-        logging.debug("deployable devices:" + str(r.json()))
+        api_path = fmc_domain_path + "/deployment/deployabledevices"
         device_list = []
-        if 'items' in r.json():
-            for item in r.json()['items']:
-                if item['type'] == 'DeployableDevice':
-                    device_list.append(item['name'])
+        for item in self.iter_collection(api_path):
+            if item['type'] == 'DeployableDevice':
+                device_list.append(item['name'])
+        logging.debug("deployable devices:" + str(device_list))
         return device_list
 
     def get_nic_status(self, device_id, nic, nic_id, ifname, zone_id, ip=None):
@@ -511,33 +1141,63 @@ class FirepowerManagementCenter:
         Returns:    CONFIGURED, UN-CONFIGURED
         Raises:
         """
-        api_path = "/api/fmc_config/v1/domain/e276abec-e0f2-11e3-8169-6d9ed49b625f/devices/devicerecords/" + \
-                   device_id + "/routing/ipv4staticroutes"
-        url = self.server + api_path + '?offset=0&limit=10000'
-        r = self.rest_get(url)
-
-        if 'items' in r.json():
-            for key1 in r.json()['items']:
-                id = key1['id']
-                url = self.server + api_path + '/' + id
-                r = self.rest_get(url)
-                if r.json()['interfaceName'] == interface_name:
-                    for key2 in r.json()['selectedNetworks']:
-                        if key2['name'] == _object_name:
-                            try:
-                                element = dict.copy(r.json()['gateway']['object'])
-                                if element['name'] == gate_way:
-                                    return "CONFIGURED"
-                            except:
-                                pass
-                            try:
-                                element = dict.copy(r.json()['gateway']['literal'])
-                                if element['value'] == gate_way:
-                                    return "CONFIGURED"
-                            except:
-                                pass
+        api_path = fmc_domain_path + "/devices/devicerecords/" + device_id + "/routing/ipv4staticroutes"
+        # Expanded listing carries route details, so no GET per route is needed
+        for route in self.iter_collection(api_path, expanded=True):
+            if route_matches(route, interface_name, _object_name, gate_way):
+                return "CONFIGURED"
         return "UN-CONFIGURED"
 
+    def list_collection(self, path, expanded=False):
+        """
+        Purpose:    To fetch all items of a collection in a list
+        Parameters: API path of collection, Expanded items
+        Returns:    list of items
+        Raises:     requests.exceptions.HTTPError, on failed page fetch
+        """
+        return list(self.iter_collection(path, expanded=expanded))
+
+    def get_device_state(self, device_id, geneve=False):
+        """
+        Purpose:    To fetch configuration of a device in one pass, collections are fetched concurrently
+        Parameters: Device Id, Fetch VTEP policy & VNI interfaces too
+        Returns:    dict {'interfaces': [], 'routes': [], 'vtep': [], 'vni': []} of expanded items
+        Raises:     requests.exceptions.HTTPError, on failed fetch
+        """
+        api_path = fmc_domain_path + "/devices/devicerecords/" + device_id
+        paths = {
+            'interfaces': api_path + "/physicalinterfaces",
+            'routes': api_path + "/routing/ipv4staticroutes"
+        }
+        if geneve:
+            paths['vtep'] = api_path + "/vteppolicies"
+            paths['vni'] = api_path + "/vniinterfaces"
+        afmc = AsyncFirepowerManagementCenter(self)
+        results = afmc.run(*[afmc.list_collection(path, True) for path in paths.values()])
+        state = {'interfaces': [], 'routes': [], 'vtep': [], 'vni': []}
+        state.update(zip(paths.keys(), results))
+        return state
+
+    def put_physical_interface(self, device_id, nic_id, put_data):
+        """
+        Purpose:    To configure an Nic interface with a prepared payload
+        Parameters: Device Id, Nic Id, Payload
+        Returns:    REST put response
+        Raises:
+        """
+        url = self.server + fmc_domain_path + "/devices/devicerecords/" + device_id + "/physicalinterfaces/" + nic_id
+        return self.rest_put(url, put_data)
+
+    def post_static_route(self, device_id, post_data):
+        """
+        Purpose:    To create static route on device with a prepared payload
+        Parameters: Device Id, Payload
+        Returns:    REST post response
+        Raises:
+        """
+        url = self.server + fmc_domain_path + "/devices/devicerecords/" + device_id + "/routing/ipv4staticroutes"
+        return self.rest_post(url, post_data)
+
     def configure_nic_dhcp(self, device_id, nic_id, nic, nic_name, mgmt_only, mode, zone_id, mtu):
         """
         Purpose:    Configure an Nic interface as DHCP
@@ -704,6 +1364,19 @@ class FirepowerManagementCenter:
         logger.info("Registering: "+name)
         api_path = "/api/fmc_config/v1/domain/e276abec-e0f2-11e3-8169-6d9ed49b625f/devices/devicerecords"
         url = self.server + api_path
+        post_data = self.get_device_post_data(name, mgmt_ip, policy_id, reg_id, nat_id, license_caps,
+                                              performance_tier, device_grp_id)
+        r = self.rest_post(url, post_data)
+        return r
+
+    @staticmethod
+    def get_device_post_data(name, mgmt_ip, policy_id, reg_id, nat_id, license_caps, performance_tier, device_grp_id):
+        """
+        Purpose:    To get devicerecords post data of a device
+        Parameters: Name of device, Mgmt ip, Access Policy Id, Registration & NAT id, Licenses Caps, Group Id
+        Returns:    dict
+        Raises:
+        """
         post_data = {
             "name": name,
             "hostName": mgmt_ip,
@@ -721,9 +1394,29 @@ class FirepowerManagementCenter:
                 "type": "DeviceGroup"
             }
         }
+        return post_data
 
-        r = self.rest_post(url, post_data)
-        return r
+    def register_devices_bulk(self, post_data_list):
+        """
+        Purpose:    Register multiple devices to FMC in one bulk request
+        Parameters: List of devicerecords post data
+        Returns:    Task Id, None
+        Raises:
+        """
+        logger.info("Bulk registering: " + str([post_data['name'] for post_data in post_data_list]))
+        api_path = fmc_domain_path + "/devices/devicerecords"
+        url = self.server + api_path + '?bulk=true'
+        r = self.rest_post(url, post_data_list)
+        if not 201 <= r.status_code <= 202:
+            return None
+        resp = r.json()
+        # Depending on FMC version, bulk response is one task object or list of device objects with same task
+        if isinstance(resp, list):
+            resp = resp[0] if len(resp) > 0 else {}
+        try:
+            return resp['metadata']['task']['id']
+        except KeyError:
+            return None
 
     def deregister_device(self, name):
         """
@@ -747,10 +1440,29 @@ class FirepowerManagementCenter:
         Raises:
         """
         logger.info("Deploy called for: " + device_name)
+        task_id, device_names = self.start_deployment_multi([device_name])
+        return task_id
+
+    def start_deployment_multi(self, device_names):
+        """
+        Purpose:    Deploys policy changes on multiple devices in one deployment request
+        Parameters: List of device names
+        Returns:    Task Id ('' if not started), list of device names in the request
+        Raises:
+        """
         device_list = self.get_deployable_devices()
         logging.debug("Device List = " + str(device_list))
-        if device_name in device_list:
-            logging.debug("deploying on device: " + device_name)
+        device_ids = []
+        for name in [name for name in device_names if name in device_list]:
+            # Device registered after device records were cataloged is looked up again
+            device_id = self.get_device_id_by_name(name) or self.get_device_id_by_name(name, refresh=True)
+            if device_id == '':
+                logger.info("Device %s not found in FMC, dropping it from deployment request" % name)
+                continue
+            device_ids.append((name, device_id))
+        device_names = [name for name, device_id in device_ids]
+        if len(device_names) > 0:
+            logging.debug("deploying on devices: " + str(device_names))
             api_path = "/api/fmc_config/v1/domain/e276abec-e0f2-11e3-8169-6d9ed49b625f/deployment/deploymentrequests"
             url = self.server + api_path
             post_data = {
@@ -758,13 +1470,13 @@ class FirepowerManagementCenter:
                 "version": str(self.get_time_stamp()),
                 "forceDeploy": True,
                 "ignoreWarning": True,
-                "deviceList": [self.get_device_id_by_name(device_name)]
+                "deviceList": [device_id for name, device_id in device_ids]
             }
             r = self.rest_post(url, post_data)
             if 'type' in r.json():
                 if r.json()['type'] == 'DeploymentRequest':
-                    return r.json()['metadata']['task']['id']
-        return ''
+                    return r.json()['metadata']['task']['id'], device_names
+        return '', device_names
 
     def check_reg_status_from_fmc(self, vm_name):
         """
@@ -774,7 +1486,8 @@ class FirepowerManagementCenter:
         Raises:
         """
         try:
-            device_id = self.get_device_id_by_name(vm_name)
+            # Registration state is being polled, hence catalog is bypassed
+            device_id = self.get_device_id_by_name(vm_name, refresh=True)
         except Exception as e:
             logger.debug(str(e))
         else:
@@ -783,6 +1496,55 @@ class FirepowerManagementCenter:
             else:
                 return "FAILED"
 
+    def get_task_status(self, task_id):
+        """
+        Purpose:    To get status of a FMC task
+        Parameters: Task Id
+        Returns:    SUCCESS, FAILED, PENDING
+        Raises:
+        """
+        api_path = "/api/fmc_config/v1/domain/e276abec-e0f2-11e3-8169-6d9ed49b625f/job/taskstatuses/"
+        url = self.server + api_path + task_id
+        r = self.rest_get(url)
+        if not 200 <= r.status_code <= 300:
+            return 'PENDING'
+        task = r.json()
+        logger.debug("Task %s status: %s, message: %s" % (task_id, task.get('status'), task.get('message')))
+        return ftdv_fmc.get_task_state(task)
+
+    def get_task_statuses(self, task_ids):
+        """
+        Purpose:    To get status of many FMC tasks concurrently
+        Parameters: List of task Ids
+        Returns:    list of SUCCESS/FAILED/PENDING (or exception raised), in order of task Ids
+        Raises:
+        """
+        afmc = AsyncFirepowerManagementCenter(self)
+        return afmc.run(*[afmc.get_task_status(task_id) for task_id in task_ids], return_exceptions=True)
+
+    def wait_deploy_status(self, vm_name, task_id=None, minutes=5):
+        """
+        Purpose:    To wait for policy deployment on device, deployment task is tracked first &
+                    deployable devices list is polled only to confirm completion
+        Parameters: Device name, Deployment task Id, Minutes
+        Returns:    DEPLOYED, NOT-DEPLOYED
+        Raises:
+        """
+        deadline = time.time() + minutes * 60
+        if task_id:
+            if TaskTracker(self).wait([task_id], minutes)[task_id] == 'FAILED':
+                logger.info("Deployment task %s failed for %s" % (task_id, vm_name))
+                return 'NOT-DEPLOYED'
+        intervals = poll_intervals(max(0, deadline - time.time()))
+        while True:
+            status = self.check_deploy_status(vm_name)
+            if status == 'DEPLOYED':
+                return status
+            wait = next(intervals, None)
+            if wait is None:
+                return status
+            time.sleep(wait)
+
     def check_deploy_status(self, vm_name):
         """
         Purpose:    Checks if any deployment pending for device
@@ -828,25 +1590,74 @@ class FirepowerManagementCenter:
             # url = self.server + api_path + device_id + api_suffix
 
             # New Health Monitoring API
-            api_path = f'/api/fmc_config/v1/domain/{self.domain_uuid}/health/metrics'
-            # Values are fetched from last one minute at interval of 10 sec (step).
-            end_time = int(time.time())
-            start_time = end_time - 60
-            step_size = 10
-            regex_filter = "used_percentage_system_and_swap"
-            api_suffix = \
-                f'?offset=0&limit=100&filter=deviceUUIDs%3A{device_id}%3Bmetric%3Amem%3B' + \
-                f"startTime%3A{start_time}%3BendTime%3A{end_time}%3Bstep%3A{step_size}%3B" + \
-                f"regexFilter%3A{regex_filter}&expanded=true"
-            url = self.server + api_path + api_suffix
-
-            r = self.rest_get(url)
+            r = self.rest_get(self.get_memory_metrics_url([device_id]))
             resp = r.text
             return json.loads(resp)
         except Exception as e:
             logger.error("Error {}".format(e))
             return None
 
+    def get_memory_metrics_url(self, device_ids):
+        """
+        Purpose:    To get Health Monitoring API url of memory metric of devices
+        Parameters: List of device ids
+        Returns:    url
+        Raises:
+        """
+        # domain_uuid comes with auth token
+        if time.time() > self.authTokenMaxAge + self.authTokenTimestamp:
+            self.get_auth_token()
+        api_path = f'/api/fmc_config/v1/domain/{self.domain_uuid}/health/metrics'
+        # Values are fetched from last one minute at interval of 10 sec (step).
+        end_time = int(time.time())
+        start_time = end_time - 60
+        step_size = 10
+        regex_filter = "used_percentage_system_and_swap"
+        api_suffix = \
+            f'?offset=0&limit=100&filter=deviceUUIDs%3A{"%2C".join(device_ids)}%3Bmetric%3Amem%3B' + \
+            f"startTime%3A{start_time}%3BendTime%3A{end_time}%3Bstep%3A{step_size}%3B" + \
+            f"regexFilter%3A{regex_filter}&expanded=true"
+        return self.server + api_path + api_suffix
+
+    def get_memory_metrics_chunk(self, device_ids):
+        """
+        Purpose:    To fetch memory metric of many devices in one Health Monitoring API query
+        Parameters: List of device ids
+        Returns:    dict {device id: {'timestamps': [], 'values': []}}, devices without data are left out
+        Raises:     Error occurred in metrics fetch
+        """
+        r = self.rest_get(self.get_memory_metrics_url(device_ids))
+        if not 200 <= r.status_code <= 300:
+            raise Exception("Error occurred in Get --> " + r.text)
+        return parse_health_metrics(r.json(), device_ids)
+
+    def get_memory_metrics_bulk(self, device_ids):
+        """
+        Purpose:    To fetch memory metric of all devices, in chunks of FMC_METRICS_CHUNK_SIZE devices per query
+        Parameters: List of device ids
+        Returns:    dict {device id: {'timestamps': [], 'values': []}}, devices without data are left out
+        Raises:
+        """
+        size = const.FMC_METRICS_CHUNK_SIZE
+        chunks = [device_ids[i:i + size] for i in range(0, len(device_ids), size)]
+        if len(chunks) > 1:
+            afmc = AsyncFirepowerManagementCenter(self)
+            results = afmc.run(*[afmc.get_memory_metrics_chunk(chunk) for chunk in chunks], return_exceptions=True)
+        else:
+            results = []
+            for chunk in chunks:
+                try:
+                    results.append(self.get_memory_metrics_chunk(chunk))
+                except Exception as e:
+                    results.append(e)
+        metrics = {}
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, Exception):
+                logger.error("Unable to get metrics for devices %s: %s" % (chunk, str(result)))
+                continue
+            metrics.update(result)
+        return metrics
+
     def get_policy_assign_targets(self, pol_id):
         """
         Purpose:    Get targets by its policy id
@@ -885,14 +1696,274 @@ class FirepowerManagementCenter:
         Returns:    Policy Id
 
         """
-        api_path = "/api/fmc_config/v1/domain/e276abec-e0f2-11e3-8169-6d9ed49b625f/policy/ftdnatpolicies"
-        url = self.server + api_path + '?offset=0&limit=10000'
-        r = self.rest_get(url)
-        for item in r.json()['items']:
-            if item['name'] == pol_name:
-                return str(item['id'])
+        return self.catalog.lookup(self, 'ftdnatpolicies', pol_name)
+
+
+class CoalescingWindow:
+    """
+        CoalescingWindow class collects requests of a time window through shared store,
+        first requester of the window (leader) flushes all of them together after window ends & publishes result
+        Window joined by an earlier invocation is re-opened by its slot
+    """
+    def __init__(self, name, server, window, timeout, slot=None):
+        self.store = store.get_shared_store()
+        self.slot = int(time.time() // window) if slot is None else int(slot)
+        self.window_end = (self.slot + 1) * window
+        self.prefix = name + ':' + server + ':' + str(self.slot) + ':'
+        self.timeout = timeout
+        self.ttl = window + timeout
+
+    def __join(self, member, payload):
+        # Members take consecutive slots, so that leader can read them back without listing the store
+        for slot in range(0, const.COALESCING_WINDOW_MAX):
+            if self.store.add(self.prefix + 'member:' + str(slot), {'name': member, 'payload': payload},
+                              ttl=self.ttl):
+                return slot
+        return None
+
+    def __get_members(self):
+        members = []
+        for slot in range(0, const.COALESCING_WINDOW_MAX):
+            member = self.store.get(self.prefix + 'member:' + str(slot))
+            if member is None:
+                break
+            members.append(member)
+        return members
+
+    def __flush(self, member, flush):
+        result = {'members': []}
+        try:
+            result = flush(self.__get_members())
+        except Exception as e:
+            logger.exception(e)
+        self.publish('result', result)
+        logger.info("Coalescing window %s result: %s" % (self.prefix, json.dumps(result, separators=(',', ':'))))
+        return result if member in result['members'] else None
+
+    def publish(self, key, value):
+        """
+        Purpose:    To publish a value to all members of window
+        Parameters: Key, Value(json serializable)
+        Returns:
+        Raises:
+        """
+        self.store.put(self.prefix + key, value, ttl=self.ttl)
+
+    def read(self, key):
+        """
+        Purpose:    To read a value published to members of window
+        Parameters: Key
+        Returns:    Value, None
+        Raises:
+        """
+        return self.store.get(self.prefix + key)
+
+    def submit(self, member, payload, flush):
+        """
+        Purpose:    To submit a request in current window & wait for its flush by leader
+        Parameters: Member name, Payload(json serializable),
+                    flush function, called by leader with list of {name, payload} & returns dict with 'members' list
+        Returns:    (Flush result, True if caller is the leader), result is None if member is not part of it
+        Raises:
+        """
+        slot = self.__join(member, payload)
+        if slot is None:
+            logger.info("Coalescing window %s is full" % self.prefix)
+            return None, False
+        if slot == 0:
+            # Leader waits till window ends, so that other members can join
+            time.sleep(max(0, self.window_end + const.COALESCING_WINDOW_GRACE - time.time()))
+            return self.__flush(member, flush), True
+        deadline = self.window_end + self.timeout
+        while time.time() < deadline:
+            result = self.read('result')
+            if result is not None:
+                # Member joined after leader read the window, or flush failed
+                return (result if member in result['members'] else None), False
+            time.sleep(2)
+        logger.info("No result from leader of coalescing window %s" % self.prefix)
+        return None, False
+
+    def submit_async(self, member, payload, flush, member_slot=None):
+        """
+        Purpose:    To submit a request in window without waiting for it, caller calls again after returned delay
+                    with returned window, leader flushes on its first call after window ends
+        Parameters: Member name, Payload(json serializable), flush function (as of submit),
+                    Member slot of returned window, None on first call
+        Returns:    (Flush result, dict of window 'slot', 'member' slot & 'delay' seconds to call again)
+                    result is None if member is not part of it, or if delay is not 0
+        Raises:
+        """
+        window = {'slot': self.slot, 'member': member_slot, 'delay': 0}
+        if member_slot is None:
+            window['member'] = self.__join(member, payload)
+            if window['member'] is None:
+                logger.info("Coalescing window %s is full" % self.prefix)
+                return None, window
+        result = self.read('result')
+        if result is not None:
+            # Flushed already, i.e. re-delivered call of leader or member joined after leader read the window
+            return (result if member in result['members'] else None), window
+        flush_at = self.window_end + const.COALESCING_WINDOW_GRACE
+        if window['member'] == 0:
+            if time.time() >= flush_at:
+                return self.__flush(member, flush), window
+        elif time.time() >= self.window_end + self.timeout:
+            logger.info("No result from leader of coalescing window %s" % self.prefix)
+            return None, window
+        else:
+            flush_at += const.COALESCING_WINDOW_POLL
+        window['delay'] = int(max(0, flush_at - time.time())) + 1
+        return None, window
+
+
+class DeploymentCoalescer:
+    """
+        DeploymentCoalescer class merges devices becoming deployable within a window into one DeploymentRequest,
+        leader tracks the deployment for all of them & each device gets a completion callback
+    """
+    def __init__(self, fmc, slot=None):
+        self.fmc = fmc
+        self.window = CoalescingWindow('deployment', fmc.server, const.DEPLOYMENT_BATCH_WINDOW,
+                                       const.COALESCING_WINDOW_TIMEOUT, slot)
+
+    def __flush(self, members):
+        task_id, device_names = self.fmc.start_deployment_multi([m['name'] for m in members])
+        if task_id == '':
+            return {'task_id': task_id, 'members': []}
+        return {'task_id': task_id, 'members': device_names}
+
+    def __track(self, device_names, task_id, minutes):
+        # Deployment task is tracked first, then one deployable devices poll serves all devices of request
+        # progress is published for other members in every poll
+        pending = list(device_names)
+        progress = {name: 'NOT-DEPLOYED' for name in device_names}
+        tracker = TaskTracker(self.fmc)
+        tracker.add([task_id])
+        intervals = poll_intervals(minutes * 60)
+        while True:
+            if tracker.poll():
+                self.window.publish('progress', {'updated': time.time(), 'devices': progress})
+            elif tracker.states[task_id] == 'FAILED':
+                logger.info("Deployment task %s failed" % task_id)
+                break
+            else:
+                deployable = self.fmc.get_deployable_devices()
+                pending = [name for name in pending if name in deployable]
+                progress = {name: ('NOT-DEPLOYED' if name in pending else 'DEPLOYED') for name in device_names}
+                self.window.publish('progress', {'updated': time.time(), 'devices': progress})
+                if not pending:
+                    break
+            wait = next(intervals, None)
+            if wait is None:
+                break
+            time.sleep(wait)
+        self.window.publish('progress', {'updated': time.time(), 'final': True, 'devices': progress})
+        return progress
+
+    def __wait(self, device_name, minutes):
+        started = time.time()
+        deadline = started + minutes * 60
+        while time.time() < deadline:
+            progress = self.window.read('progress')
+            if progress is not None:
+                if progress['devices'].get(device_name) == 'DEPLOYED':
+                    return 'DEPLOYED'
+                if progress.get('final'):
+                    return 'NOT-DEPLOYED'
+            last_update = progress['updated'] if progress is not None else started
+            if last_update + 3 * const.DEPLOYMENT_POLL_INTERVAL < time.time():
+                # Leader is not tracking anymore, check on own
+                if self.fmc.check_deploy_status(device_name) == 'DEPLOYED':
+                    return 'DEPLOYED'
+            time.sleep(const.DEPLOYMENT_POLL_INTERVAL)
+        return 'NOT-DEPLOYED'
+
+    def deploy(self, device_name, on_complete=None, minutes=5):
+        """
+        Purpose:    To deploy policies on device with other devices of same window & wait for completion
+        Parameters: Device name, Callback called with (device name, SUCCESS/FAILED), Minutes to wait
+        Returns:    SUCCESS, FAILED
+        Raises:
+        """
+        result, leader = self.window.submit(device_name, None, self.__flush)
+        if result is None:
+            logger.info("Device %s not part of coalesced deployment, deploying individually" % device_name)
+            status = self.fmc.check_deploy_status(device_name)
+            if status != 'DEPLOYED':
+                task_id = self.fmc.start_deployment(device_name)
+                status = self.fmc.wait_deploy_status(device_name, task_id, minutes)
+        elif leader:
+            status = self.__track(result['members'], result['task_id'], minutes)[device_name]
         else:
+            status = self.__wait(device_name, minutes)
+        status = 'SUCCESS' if status == 'DEPLOYED' else 'FAILED'
+        logger.info("Deployment on %s completed with %s" % (device_name, status))
+        if on_complete is not None:
+            on_complete(device_name, status)
+        return status
+
+    def start(self, device_name, member_slot=None):
+        """
+        Purpose:    To start deployment of policies on device with other devices of same window, without waiting
+                    Caller calls again after returned delay, then tracks returned deployment task on its own
+        Parameters: Device name, Member slot of window returned by earlier call
+        Returns:    (Deployment task Id, None till window is flushed or if device is deployed individually,
+                    dict of window as of CoalescingWindow.submit_async)
+        Raises:
+        """
+        result, window = self.window.submit_async(device_name, None, self.__flush, member_slot)
+        if window['delay'] > 0:
+            return None, window
+        if result is None:
+            logger.info("Device %s not part of coalesced deployment, deploying individually" % device_name)
+            return self.fmc.start_deployment(device_name), window
+        return result['task_id'], window
+
+
+class RegistrationBatch:
+    """
+        RegistrationBatch class collects device registrations of a window through CoalescingWindow,
+        leader submits all of them in one bulk devicerecords request
+    """
+    def __init__(self, fmc, slot=None):
+        self.fmc = fmc
+        self.window = CoalescingWindow('registration', fmc.server, const.REGISTRATION_BATCH_WINDOW,
+                                       const.COALESCING_WINDOW_TIMEOUT, slot)
+
+    def __flush(self, members):
+        result = {'task_id': None, 'members': []}
+        # Single device is registered individually, works on FMC versions without bulk API as well
+        if len(members) > 1:
+            result['task_id'] = self.fmc.register_devices_bulk([m['payload'] for m in members])
+            if result['task_id'] is not None:
+                result['members'] = [m['name'] for m in members]
+        return result
+
+    def submit(self, vm_name, post_data):
+        """
+        Purpose:    To submit a device registration in current batch window & wait for bulk request
+        Parameters: Device name, devicerecords post data
+        Returns:    Task Id of bulk registration, None if device has to be registered individually
+        Raises:
+        """
+        result, leader = self.window.submit(vm_name, post_data, self.__flush)
+        if result is None:
             return None
+        return result['task_id']
+
+    def submit_async(self, vm_name, post_data, member_slot=None):
+        """
+        Purpose:    To submit a device registration in batch window without waiting for bulk request
+        Parameters: Device name, devicerecords post data, Member slot of window returned by earlier call
+        Returns:    (Task Id of bulk registration, None if device has to be registered individually,
+                    dict of window as of CoalescingWindow.submit_async)
+        Raises:
+        """
+        result, window = self.window.submit_async(vm_name, post_data, self.__flush, member_slot)
+        if result is None:
+            return None, window
+        return result['task_id'], window
 
 
 class DerivedFMC(FirepowerManagementCenter):
@@ -993,13 +2064,45 @@ class DerivedFMC(FirepowerManagementCenter):
 
         return
 
+    def __validation_fingerprint(self, is_geneve_support):
+        # Names given by user & ids they resolve to, recreated objects get new ids
+        inputs = [self.d_grp_name, self.a_policy_name, self.nat_policy_name, self.seczone_name,
+                  self.network_obj_name, self.host_obj_name, is_geneve_support, self.d_grp_id, self.a_policy_id,
+                  self.nat_policy_id, self.seczone_obj_pair, self.network_obj_pair, self.host_obj_pair]
+        return hashlib.sha1(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
     def check_fmc_configuration(self, is_geneve_support):
         """
         Purpose:    To inspect if Derived FMC class has all required variables
+                    CONFIGURED result is cached with fingerprint of its inputs for FMC_VALIDATION_CACHE_TTL,
+                    audit feed drops it on change of validated collections or policy assignments
         Parameters:
         Returns:    self.configuration_status
         Raises:
         """
+        if self.reachable == 'AVAILABLE' and const.FMC_VALIDATION_CACHE_TTL > 0:
+            key = 'fmc-validation:' + self.server
+            fingerprint = self.__validation_fingerprint(is_geneve_support)
+            shared_store = store.get_shared_store()
+            try:
+                cached = shared_store.get(key)
+            except Exception as e:
+                logger.debug("Unable to read cached FMC configuration validation: " + str(e))
+                cached = None
+            if cached is not None and cached == fingerprint:
+                logger.debug("FMC configuration validation unchanged, using cached result")
+                self.configuration_status = 'CONFIGURED'
+                self.configuration.update({'fmc_configuration_status': self.configuration_status})
+                return self.configuration_status
+            if self.__check_fmc_configuration(is_geneve_support) == 'CONFIGURED':
+                try:
+                    shared_store.put(key, fingerprint, ttl=const.FMC_VALIDATION_CACHE_TTL)
+                except Exception as e:
+                    logger.debug("Unable to cache FMC configuration validation: " + str(e))
+            return self.configuration_status
+        return self.__check_fmc_configuration(is_geneve_support)
+
+    def __check_fmc_configuration(self, is_geneve_support):
         self.configuration_status = 'UN-CONFIGURED'
 
         if self.reachable == 'AVAILABLE':
@@ -1059,6 +2162,96 @@ class DerivedFMC(FirepowerManagementCenter):
             logger.exception(e)
             return None
 
+    def register_ftdv_batched(self, vm_name, mgmt_ip, reg_id, nat_id, license_caps, performance_tier):
+        """
+        Purpose:    Register the device to FMC in one bulk request with other devices of same scale-out burst
+        Parameters: Device Name, Mgmgt Ip, Registration & NAT id, Licenses cap
+        Returns:    Task id, None
+        Raises:
+        """
+        try:
+            post_data = self.get_device_post_data(vm_name, mgmt_ip, self.a_policy_id, reg_id, nat_id, license_caps,
+                                                  performance_tier, self.d_grp_id)
+            task_id = RegistrationBatch(self).submit(vm_name, post_data)
+            if task_id is not None:
+                logger.info("NGWFv: " + vm_name + " bulk registration started and task ID is: " + task_id)
+                return task_id
+        except Exception as e:
+            logger.exception(e)
+        logger.info("NGWFv: " + vm_name + " not registered in bulk, registering individually")
+        return self.register_ftdv(vm_name, mgmt_ip, reg_id, nat_id, license_caps, performance_tier)
+
+    def register_ftdv_coalesced(self, vm_name, mgmt_ip, reg_id, nat_id, license_caps, performance_tier,
+                                window=None):
+        """
+        Purpose:    Register the device to FMC in one bulk request with other devices of same window,
+                    without waiting for window to end, caller calls again after delay of returned window
+        Parameters: Device Name, Mgmgt Ip, Registration & NAT id, Licenses cap,
+                    dict of window returned by earlier call, None on first call
+        Returns:    (Task id, None, dict of window as of CoalescingWindow.submit_async)
+        Raises:
+        """
+        window = window or {'slot': None, 'member': None}
+        try:
+            post_data = self.get_device_post_data(vm_name, mgmt_ip, self.a_policy_id, reg_id, nat_id, license_caps,
+                                                  performance_tier, self.d_grp_id)
+            task_id, window = RegistrationBatch(self, window['slot']).submit_async(vm_name, post_data,
+                                                                                 window['member'])
+            if window['delay'] > 0:
+                return None, window
+            if task_id is not None:
+                logger.info("NGWFv: " + vm_name + " bulk registration started and task ID is: " + task_id)
+                return task_id, window
+        except Exception as e:
+            logger.exception(e)
+            window = {'slot': window['slot'], 'member': window['member'], 'delay': 0}
+        logger.info("NGWFv: " + vm_name + " not registered in bulk, registering individually")
+        return self.register_ftdv(vm_name, mgmt_ip, reg_id, nat_id, license_caps, performance_tier), window
+
+    def deploy_coalesced(self, vm_name, on_complete=None, minutes=5):
+        """
+        Purpose:    Deploy policies on the device in one deployment request with other devices of same window
+        Parameters: Device Name, Completion callback(device name, SUCCESS/FAILED), Minutes to wait
+        Returns:    SUCCESS, FAILED
+        Raises:
+        """
+        return DeploymentCoalescer(self).deploy(vm_name, on_complete, minutes)
+
+    def start_deployment_coalesced(self, vm_name, window=None):
+        """
+        Purpose:    Start deployment of policies on the device with other devices of same window,
+                    without waiting for window to end, caller calls again after delay of returned window
+        Parameters: Device Name, dict of window returned by earlier call, None on first call
+        Returns:    (Deployment task Id, None, dict of window as of CoalescingWindow.submit_async)
+        Raises:
+        """
+        window = window or {'slot': None, 'member': None}
+        return DeploymentCoalescer(self, window['slot']).start(vm_name, window['member'])
+
+    def get_gateway(self, gateway):
+        """
+        Purpose:    To get gateway of static route, host object of gateway if there is one
+        Parameters: Gateway Ip
+        Returns:    dict of gateway object or IP literal
+        Raises:
+        """
+        gateway_id = self.get_host_objectid_by_name(gateway)
+        # Gateway can be an object or IP literal
+        if gateway_id != '':
+            return {
+                "object": {
+                    "type": "Host",
+                    "id": gateway_id,
+                    "name": gateway
+                }
+            }
+        return {
+            "literal": {
+                "type": "Host",
+                "value": gateway
+            }
+        }
+
     def conf_static_rt(self, device_id, int_name, rt_type, net_name, gateway, metric):
         """
         Purpose:    To configure gateway if required for static_route
@@ -1077,26 +2270,247 @@ class DerivedFMC(FirepowerManagementCenter):
             logger.info(net_name + " is present in Group Object")
             net_id = self.group_objects[net_name]
 
-        gateway_id = self.get_host_objectid_by_name(gateway)
-        # Gateway can be an object or IP literal
-        if gateway_id != '':
-            gate_way = {
-                "object": {
-                    "type": "Host",
-                    "id": gateway_id,
-                    "name": gateway
-                }
-            }
-        else:
-            gate_way = {
-                "literal": {
-                    "type": "Host",
-                    "value": gateway
-                }
-            }
+        gate_way = self.get_gateway(gateway)
         try:
             r = self.create_static_route(device_id, int_name, rt_type, net_name, net_id, gate_way, metric)
             return r
         except Exception as e:
             logger.exception(e)
             return None
+
+
+class FmcPool:
+    """
+        FmcPool class places devices of AutoScale group on one FMC of a pool & records owner FMC of each device
+        FMCs below managed device limit & with closed circuit are candidates, least loaded one is picked
+        as per placement policy, consistent hash of instance id is used when loads are not known
+    """
+    def __init__(self, servers, username, password, policy=const.FMC_PLACEMENT_POLICY):
+        self.servers = servers
+        self.username = username
+        self.password = password
+        self.policy = policy
+        self.store = store.get_shared_store()
+        self.key = 'fmc-placements:' + ','.join(servers)
+        self.lock_key = self.key + ':lock'
+        # FirepowerManagementCenter objects by server, to get loads of FMCs
+        self.clients = {}
+
+    @staticmethod
+    def __owner_key(instance_id):
+        return 'fmc-owner:' + instance_id
+
+    @staticmethod
+    def __hash_score(server, instance_id):
+        return hashlib.sha1((server + ':' + instance_id).encode()).hexdigest()
+
+    def hash_owner(self, instance_id, servers=None):
+        """
+        Purpose:    To get FMC of an instance by consistent(rendezvous) hash, adding or removing an FMC
+                    moves only the instances of that FMC
+        Parameters: Instance id, Candidate FMC servers(default all)
+        Returns:    FMC server
+        Raises:
+        """
+        servers = servers or self.servers
+        return max(servers, key=lambda server: self.__hash_score(server, instance_id))
+
+    def owner_of(self, instance_id):
+        """
+        Purpose:    To get recorded owner FMC of an instance
+        Parameters: Instance id
+        Returns:    FMC server or None
+        Raises:
+        """
+        if len(self.servers) == 1:
+            return self.servers[0]
+        try:
+            return self.store.get(self.__owner_key(instance_id))
+        except Exception as e:
+            logger.error("Unable to read owner FMC of %s: %s" % (instance_id, str(e)))
+            return None
+
+    def __client(self, server):
+        # Client of each FMC is kept across placements, token lease is taken again only when it has expired
+        fmc = self.clients.get(server)
+        if fmc is None:
+            fmc = FirepowerManagementCenter(server, self.username, self.password)
+            self.clients[server] = fmc
+        if time.time() > fmc.authTokenMaxAge + fmc.authTokenTimestamp:
+            fmc.get_auth_token()
+        return fmc
+
+    def __load(self, server):
+        fmc = self.__client(server)
+        if 'X-auth-access-token' not in fmc.headers:
+            return None
+        devices = len(fmc.catalog.get_index(fmc, 'devicerecords'))
+        if self.policy == 'least-deployments':
+            return devices, len(fmc.get_deployable_devices())
+        return devices, devices
+
+    def __recent_placements(self):
+        try:
+            placements = self.store.get(self.key) or {}
+        except Exception as e:
+            logger.error("Unable to read recent FMC placements: " + str(e))
+            return {}
+        # Placements older than pending ttl are expected to be FMC device records by now
+        now = time.time()
+        return {instance_id: p for instance_id, p in placements.items()
+                if p['time'] + const.FMC_PLACEMENT_PENDING_TTL >= now}
+
+    def __choose(self, instance_id, placements):
+        candidates = []
+        for server in self.servers:
+            if not get_fmc_circuit(server).allow():
+                logger.info("FMC %s circuit is open, not a placement candidate" % server)
+                continue
+            try:
+                load = self.__load(server)
+            except Exception as e:
+                logger.error("Unable to get load of FMC %s: %s" % (server, str(e)))
+                continue
+            if load is None:
+                continue
+            devices, load = load
+            pending = len([p for p in placements.values() if p['server'] == server])
+            if devices + pending >= const.FMC_MAX_MANAGED_DEVICES:
+                logger.info("FMC %s is at managed device limit" % server)
+                continue
+            candidates.append((load + pending, self.__hash_score(server, instance_id), server))
+        if len(candidates) > 0:
+            # Ties are broken by hash, so that equally loaded FMCs share a burst of placements
+            return min(candidates)[2]
+        healthy = [server for server in self.servers if get_fmc_circuit(server).allow()]
+        logger.info("Loads of FMCs not known, placing %s by consistent hash" % instance_id)
+        return self.hash_owner(instance_id, healthy)
+
+    def place(self, instance_id):
+        """
+        Purpose:    To get owner FMC of an instance, instance is placed on an FMC if it has none recorded
+                    Placements are serialized by a lock, recent placements count in load of FMCs
+                    till FMC lists them as device records
+        Parameters: Instance id
+        Returns:    FMC server
+        Raises:
+        """
+        owner = self.owner_of(instance_id)
+        if owner is not None:
+            return owner
+        try:
+            locked = self.store.add(self.lock_key, int(time.time()), ttl=const.FMC_PLACEMENT_LOCK_TTL)
+            wait_until = time.time() + const.FMC_PLACEMENT_LOCK_TTL
+            while not locked and time.time() < wait_until:
+                time.sleep(1)
+                locked = self.store.add(self.lock_key, int(time.time()), ttl=const.FMC_PLACEMENT_LOCK_TTL)
+        except Exception as e:
+            logger.error("Unable to lock FMC placements: " + str(e))
+            return self.hash_owner(instance_id)
+        try:
+            # Another worker might have placed it in meantime
+            owner = self.owner_of(instance_id)
+            if owner is not None:
+                return owner
+            placements = self.__recent_placements()
+            owner = self.__choose(instance_id, placements)
+            placements[instance_id] = {'server': owner, 'time': int(time.time())}
+            self.store.put(self.key, placements, ttl=const.FMC_PLACEMENT_PENDING_TTL)
+            self.store.put(self.__owner_key(instance_id), owner)
+            logger.info("Instance %s is placed on FMC %s" % (instance_id, owner))
+            return owner
+        except Exception as e:
+            logger.error("Unable to record FMC placement of %s: %s" % (instance_id, str(e)))
+            return self.hash_owner(instance_id)
+        finally:
+            if locked:
+                try:
+                    self.store.delete(self.lock_key)
+                except Exception as e:
+                    logger.debug("Unable to unlock FMC placements: " + str(e))
+
+    def forget(self, instance_id):
+        """
+        Purpose:    To drop owner FMC record of a deleted instance
+        Parameters: Instance id
+        Returns:
+        Raises:
+        """
+        if len(self.servers) == 1:
+            return
+        try:
+            self.store.delete(self.__owner_key(instance_id))
+        except Exception as e:
+            logger.error("Unable to drop owner FMC of %s: %s" % (instance_id, str(e)))
+        return
+
+
+class AsyncFirepowerManagementCenter:
+    """
+        AsyncFirepowerManagementCenter class exposes methods of a FirepowerManagementCenter object as coroutines
+        Blocking REST calls run on a thread pool, share pooled session & auth token & are bounded by a semaphore
+    """
+    def __init__(self, fmc, concurrency=const.FMC_ASYNC_CONCURRENCY):
+        self.fmc = fmc
+        self.concurrency = concurrency
+        self.semaphore = None
+        self.executor = None
+
+    def __getattr__(self, name):
+        method = getattr(self.fmc, name)
+        if not callable(method):
+            return method
+
+        async def coroutine(*args, **kwargs):
+            return await self.call(method, *args, **kwargs)
+        return coroutine
+
+    async def call(self, function, *args, **kwargs):
+        """
+        Purpose:    To run a blocking function as coroutine, within concurrency limit
+        Parameters: Function & its arguments
+        Returns:    Return value of function
+        Raises:     Exception raised by function
+        """
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            # Worker thread joins read scope of calling thread, if it has one open
+            return await loop.run_in_executor(self.executor, partial(self.__run_in_scope, threading.get_ident(),
+                                                                     function, *args, **kwargs))
+
+    def __run_in_scope(self, thread_id, function, *args, **kwargs):
+        with self.fmc.read_cache.join(thread_id):
+            return function(*args, **kwargs)
+
+    def run(self, *coroutines, return_exceptions=False):
+        """
+        Purpose:    Sync wrapper, to run coroutines concurrently & wait for all of them
+        Parameters: Coroutines, Return exceptions as results instead of raising the first one
+        Returns:    list of results, in order of coroutines
+        Raises:     First exception raised, if return_exceptions is False
+        """
+        # Token is taken before fan-out, so that parallel calls do not all go for a new one
+        if time.time() > self.fmc.authTokenMaxAge + self.fmc.authTokenTimestamp:
+            self.fmc.get_auth_token()
+
+        async def gather():
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+            return await asyncio.gather(*coroutines, return_exceptions=return_exceptions)
+
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            return asyncio.run(gather())
+        finally:
+            self.executor.shutdown(wait=False)
+
+    def get_ids_by_name(self, method_name, names):
+        """
+        Purpose:    To resolve many names concurrently with a get_*_by_name method
+        Parameters: Method name, List of names
+        Returns:    dict {name: id}
+        Raises:
+        """
+        method = getattr(self, method_name)
+        ids = self.run(*[method(name) for name in names])
+        return dict(zip(names, ids))
+
@@ -23,10 +23,12 @@ Purpose:    This python file has Lambda handler for function LifeCycleLambda
 import time
 from aws import *
 import constant as const
+import scheduler
+import config
 
 logger = utl.setup_logging()
 # Get User input
-user_input = utl.get_user_input_lifecycle_ftdv()
+user_input = config.get_lifecycle_config()
 
 
 # LifeCycle Hook Handler
@@ -85,8 +87,17 @@ def lambda_handler(event, context):
             state = ec2_instance.get_instance_state()
             if state != 'terminated' or state is not None:
                 if deregister_instance(ec2_instance) == 'SUCCESS':
-                    time.sleep(int(user_input['LB_DEREGISTRATION_DELAY']))
-                    life_cycle_action = 'SUCCESS'
+                    if const.DELAYED_PROBES:
+                        # AutoScale Manager completes lifecycle action once de-registration delay is over
+                        if schedule_lifecycle_action(instance_id, lifecycle_hookname):
+                            life_cycle_action = 'SCHEDULED'
+                        else:
+                            logger.warning("Unable to schedule lifecycle action completion, completing it now "
+                                           "without waiting for de-registration delay")
+                            life_cycle_action = 'SUCCESS'
+                    else:
+                        time.sleep(int(user_input['LB_DEREGISTRATION_DELAY']))
+                        life_cycle_action = 'SUCCESS'
                 else:
                     life_cycle_action = 'FAIL'
             else:
@@ -98,13 +109,27 @@ def lambda_handler(event, context):
 
         if life_cycle_action == 'SUCCESS':
             ec2_instance.asg.complete_lifecycle_action_success(lifecycle_hookname, instance_id)
-        else:
+        elif life_cycle_action != 'SCHEDULED':
             ec2_instance.asg.complete_lifecycle_action_failure(lifecycle_hookname, instance_id)
 
     utl.put_line_in_log('LifeCycle Lambda Handler finished', 'thick')
     return
 
 
+def schedule_lifecycle_action(instance_id, lifecycle_hookname):
+    """
+    Purpose:    To schedule completion of lifecycle action after de-registration delay, instead of waiting here
+    Parameters: Instance Id, Lifecycle hook name
+    Returns:    True if scheduled, else False
+    Raises:
+    """
+    message_subject = 'Event: ' + user_input['AutoScaleGrpName'] + ' ' + 'lifecycle complete' + ' ' + instance_id
+    msg_body = utl.sns_msg_body_configure_ftdv_topic('lifecycle_complete', 'FIRST', instance_id, '1')
+    msg_body['hook_name'] = lifecycle_hookname
+    return scheduler.get_scheduler(user_input['CONFIGURE_ASAV_TOPIC_ARN']).schedule(
+        message_subject, msg_body, int(user_input['LB_DEREGISTRATION_DELAY']))
+
+
 def create_interface_and_attach(ec2_instance):
     """
     Purpose:    This creates, attaches interfaces to FTDv
@@ -33,19 +33,31 @@ Input:      A sample SNS test Event
 
 import json
 import time
+import threading
 from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 import utility as utl
 from ngfw import ManagedDevice
-from fmc import DerivedFMC
+from fmc import DerivedFMC, FmcPool, get_fmc_circuit
+from ftdv_fmc import with_call_stats
+from workflow import InstanceWorkflow, InstanceLease, workflow_steps, WORKFLOW_DONE
+import scheduler
+import config
 from aws import SimpleNotificationService, EC2Instance, ElasticLoadBalancer, AutoScaleGroup, CloudWatchEvent
 import constant as const
 
 
 logger = utl.setup_logging()
 # Get User input
-e_var, j_var = utl.get_user_input_manager()
+e_var, j_var = config.get_manager_config()
+# Devices are spread over pool of FMCs, each device is managed by its owner FMC
+fmc_pool = FmcPool(utl.get_fmc_server_list(e_var['FmcIp']), e_var['FmcUserName'], e_var.get_secret('FmcPassword'))
+# DerivedFMC objects shared by messages of a batch, by FMC server, None when no batch is being handled
+batch_fmc = None
+batch_fmc_lock = threading.Lock()
 
 
+@with_call_stats
 def lambda_handler(event, context):
     """
     Purpose:    Main Lambda functions of Autoscale Manager
@@ -61,22 +73,16 @@ def lambda_handler(event, context):
         utl.put_line_in_log('Autoscale manager Lambda Handler finished', 'thick')
         return
 
-    # SNS Event
+    # SNS Event, delivered directly or as records of SNS fan-in SQS queue, a batch can have several
     try:
-        if event["Records"][0]["EventSource"] == "aws:sns":
-            sns_data = event["Records"][0]["Sns"]
+        sns_records = get_sns_records(event)
     except Exception as e:
         logger.debug(str(e))
-        pass
-    else:
-        try:
-            handle_sns_event(sns_data)
-            utl.put_line_in_log('AutoScale Manager Lambda Handler finished', 'thick')
-            return
-        except Exception as e:
-            logger.exception(e)
-            utl.put_line_in_log('AutoScale Manager Lambda Handler finished', 'thick')
-            return
+        sns_records = []
+    if len(sns_records) > 0:
+        batch_response = handle_sns_batch(sns_records)
+        utl.put_line_in_log('AutoScale Manager Lambda Handler finished', 'thick')
+        return batch_response
 
     logger.info("Received an event but not a SNS notification event")
 
@@ -141,6 +147,81 @@ def lambda_handler(event, context):
     return
 
 
+def get_sns_records(event):
+    """
+    Purpose:    To get SNS messages of Lambda event, delivered directly by SNS or via SNS fan-in SQS queue
+    Parameters: Lambda event
+    Returns:    list of (SQS message id or None, SNS data)
+    Raises:
+    """
+    sns_records = []
+    for record in event.get("Records", []):
+        if record.get("EventSource") == "aws:sns":
+            sns_records.append((None, record["Sns"]))
+        elif record.get("eventSource") == "aws:sqs":
+            try:
+                body = json.loads(record["body"])
+            except ValueError:
+                body = None
+            # Without raw message delivery, SQS body is SNS notification having message in it
+            if isinstance(body, dict) and body.get("Type") == "Notification":
+                sns_records.append((record["messageId"], body))
+            else:
+                sns_records.append((record["messageId"], {"Message": record["body"]}))
+    return sns_records
+
+
+def handle_sns_batch(sns_records):
+    """
+    Purpose:    To handle a batch of SNS messages in one invocation
+                Messages of an instance are handled in order, different instances progress concurrently
+                FMC auth token & object ids are shared by all messages of batch
+    Parameters: list of (SQS message id or None, SNS data)
+    Returns:    SQS partial batch response, None if messages are delivered directly by SNS
+    Raises:
+    """
+    global batch_fmc
+    records_by_instance = {}
+    for record_id, sns_data in sns_records:
+        try:
+            instance_id = json.loads(sns_data['Message'])['instance_id']
+        except Exception as e:
+            logger.debug(str(e))
+            instance_id = None
+        records_by_instance.setdefault(instance_id, []).append((record_id, sns_data))
+    logger.info("Handling %d messages of %d instances" % (len(sns_records), len(records_by_instance)))
+
+    batch_item_failures = []
+
+    def handle_instance_records(records):
+        for _record_id, _sns_data in records:
+            try:
+                handle_sns_event(_sns_data)
+            except Exception as err:
+                logger.exception(err)
+                if _record_id is not None:
+                    batch_item_failures.append({"itemIdentifier": _record_id})
+
+    batch_fmc = {}
+    try:
+        if len(records_by_instance) == 1:
+            handle_instance_records(sns_records)
+        else:
+            # Client of default boto3 session is created before threads, so credentials & models are loaded once
+            SimpleNotificationService()
+            with ThreadPoolExecutor(max_workers=min(const.MANAGER_BATCH_CONCURRENCY,
+                                                    len(records_by_instance))) as executor:
+                list(executor.map(handle_instance_records, records_by_instance.values()))
+    finally:
+        batch_fmc = None
+
+    if sns_records[0][0] is None:
+        return None
+    if len(batch_item_failures) > 0:
+        logger.info("Messages failed in batch: " + str(len(batch_item_failures)))
+    return {"batchItemFailures": batch_item_failures}
+
+
 def handle_sns_event(sns_data):
     """
     Purpose:    Handler for SNS event
@@ -167,12 +248,83 @@ def handle_sns_event(sns_data):
         utl.put_line_in_log('SNS Handler Finished', 'thin')
         return
 
-    # AutoScaleGroup
-    aws_grp = aws_asg_cls_init()
+    # Delay longer than queue allows is waited out in hops
+    remaining = scheduler.get_remaining_delay(_m_attr)
+    if remaining > 0:
+        message_subject = 'Event: ' + e_var['AutoScaleGrpName'] + ' ' + 'instance ' + _m_attr['to_function'] + \
+                          ' scheduled ' + _m_attr['instance_id']
+        scheduler.get_scheduler(e_var['AutoScaleManagerTopic']).schedule(message_subject, _m_attr, remaining)
+        utl.put_line_in_log('SNS Handler Finished', 'thin')
+        return
+
+    if _m_attr['to_function'] == 'lifecycle_complete':
+        # Scheduled by LifeCycle Lambda, once de-registration delay of terminating instance is over
+        AutoScaleGroup(e_var['AutoScaleGrpName']).complete_lifecycle_action_success(_m_attr['hook_name'],
+                                                                                  _m_attr['instance_id'])
+        utl.put_line_in_log('SNS Handler Finished', 'thin')
+        return
+
+    # One worker at a time works on an instance, message of a leased instance waits or is re-published
+    lease = InstanceLease(_m_attr['instance_id'])
+    if not lease.acquire(const.INSTANCE_LEASE_WAIT):
+        requeue_sns_event(sns, _m_attr)
+        utl.put_line_in_log('SNS Handler Finished', 'thin')
+        return
+    try:
+        # SNS & SQS deliver at least once, a message is handled only on its first delivery
+        message_key = get_sns_message_key(_m_attr)
+        if not lease.claim(message_key):
+            logger.info("Dropping duplicate %s message of %s" % (_m_attr['to_function'], _m_attr['instance_id']))
+            utl.put_line_in_log('SNS Handler Finished', 'thin')
+            return
+        try:
+            handle_sns_stage(sns, _m_attr)
+        except Exception:
+            # Failed message is re-delivered by SQS
+            lease.unclaim(message_key)
+            raise
+    finally:
+        lease.release()
+    return
+
+
+def handle_sns_stage(sns, _m_attr):
+    """
+    Purpose:    To run stage of SNS message on an instance, while holding lease on instance
+    Parameters: SimpleNotificationService object, SNS message
+    Returns:
+    Raises:
+    """
+    # Workflow of instance holds its step, attempts & context cached by earlier stages
+    workflow = None
+    if const.DURABLE_WORKFLOW:
+        workflow = InstanceWorkflow(_m_attr['instance_id'])
+        if not resume_workflow(workflow, _m_attr):
+            utl.put_line_in_log('SNS Handler Finished', 'thin')
+            return
+
+    # Stages of an instance go to its owner FMC, instance without a recorded owner is placed now
+    if _m_attr['to_function'] == 'vm_delete':
+        fmc_server = fmc_pool.owner_of(_m_attr['instance_id']) or fmc_pool.hash_owner(_m_attr['instance_id'])
+    else:
+        fmc_server = fmc_pool.place(_m_attr['instance_id'])
+
+    # While FMC is unreachable or overloaded, stage is deferred without consuming a retry
+    circuit = get_fmc_circuit(fmc_server)
+    if not circuit.allow() and defer_sns_event(_m_attr, circuit, workflow):
+        utl.put_line_in_log('SNS Handler Finished', 'thin')
+        return
+
     # Initialize DerivedFMC
-    fmc = fmc_cls_init()
-    # FTD class initialization
-    ftd = ftd_cls_init(_m_attr['instance_id'], fmc)
+    fmc = fmc_cls_init(fmc_server)
+    if not circuit.healthy() and defer_sns_event(_m_attr, circuit, workflow):
+        utl.put_line_in_log('SNS Handler Finished', 'thin')
+        return
+    # FTD class initialization, deletion re-discovers device as cached ids may be stale by then
+    if workflow is not None and _m_attr['to_function'] != 'vm_delete':
+        ftd = ftd_cls_init(_m_attr['instance_id'], fmc, workflow.get_context())
+    else:
+        ftd = ftd_cls_init(_m_attr['instance_id'], fmc)
 
     try:
         if int(_m_attr['counter']) <= 0 and _m_attr['to_function'] != 'vm_delete':
@@ -191,12 +343,14 @@ def handle_sns_event(sns_data):
                 sns.publish_to_topic(e_var['USER_NOTIFY_TOPIC_ARN'], message_subject, msg_body)
             # -------------
             if not const.DISABLE_VM_DELETE_FUNC:
+                checkpoint_workflow(workflow, ftd, 'vm_delete')
                 message_subject = 'Event: ' + e_var['AutoScaleGrpName'] + ' ' + 'instance delete' + ' ' + \
                                   _m_attr['instance_id']
                 msg_body = utl.sns_msg_body_configure_ftdv_topic('vm_delete', 'FIRST',
                                                                  _m_attr['instance_id'])
                 sns.publish_to_topic(e_var['AutoScaleManagerTopic'], message_subject, msg_body)
             else:
+                checkpoint_workflow(workflow, ftd, WORKFLOW_DONE)
                 logger.info(" vm_delete function is disabled! Check constant.py")
             utl.put_line_in_log('SNS Handler Finished', 'thin')
             return
@@ -215,6 +369,7 @@ def handle_sns_event(sns_data):
                                                               _m_attr['instance_id'], details_of_the_device)
                 sns.publish_to_topic(e_var['USER_NOTIFY_TOPIC_ARN'], message_subject, msg_body)
             # -------------
+            checkpoint_workflow(workflow, ftd, WORKFLOW_DONE)
             utl.put_line_in_log('SNS Handler Finished', 'thin')
             return
     except KeyError as e:
@@ -226,6 +381,8 @@ def handle_sns_event(sns_data):
             (_m_attr['to_function'] == 'vm_register' and int(_m_attr['counter']) == const.TO_FUN_RETRY_COUNT[1]) or \
             (_m_attr['to_function'] == 'vm_configure' and int(_m_attr['counter']) == const.TO_FUN_RETRY_COUNT[2]) or \
             (_m_attr['to_function'] == 'vm_deploy' and int(_m_attr['counter']) == const.TO_FUN_RETRY_COUNT[3]):
+        # AutoScaleGroup
+        aws_grp = aws_asg_cls_init()
         logger.info("Fmc validation: " + fmc_configuration_validation(fmc, aws_grp))
         if fmc.configuration_status == 'UN-CONFIGURED':
             # Email to user
@@ -240,6 +397,7 @@ def handle_sns_event(sns_data):
                 sns.publish_to_topic(e_var['USER_NOTIFY_TOPIC_ARN'], message_subject, msg_body)
             # -------------
             if not const.DISABLE_VM_DELETE_FUNC:
+                checkpoint_workflow(workflow, ftd, 'vm_delete')
                 logger.info("Terminating instance")
                 message_subject = 'Event: ' + e_var['AutoScaleGrpName'] + ' ' + 'instance delete' + ' ' + \
                                   _m_attr['instance_id']
@@ -247,6 +405,7 @@ def handle_sns_event(sns_data):
                                                                  _m_attr['instance_id'])
                 sns.publish_to_topic(e_var['AutoScaleManagerTopic'], message_subject, msg_body)
             else:
+                checkpoint_workflow(workflow, ftd, WORKFLOW_DONE)
                 logger.info("Need to terminate the instance, but vm_delete function is disabled, check constant.py")
             return
 
@@ -259,6 +418,7 @@ def handle_sns_event(sns_data):
     else:
         logger.error("Device in %s state, can't be handled by %s function"
                      % (instance_state, _m_attr['to_function']))
+        checkpoint_workflow(workflow, ftd, WORKFLOW_DONE)
         utl.put_line_in_log('SNS Handler Finished', 'thin')
         return
 
@@ -271,20 +431,26 @@ def handle_sns_event(sns_data):
             return
         ftd.create_instance_tags('Name', ftd.vm_name)  # To put Name tag on instance
         if _m_attr['category'] == 'FIRST':
-            if execute_vm_ready_first(ftd) == 'SUCCESS':
+            if execute_vm_ready_first(ftd, const.DELAYED_PROBES) == 'SUCCESS':
                 ftd.create_instance_tags('NGFWvConnectionStatus', 'AVAILABLE')
                 logger.info("SSH to NGFWv with instance_id is successful, Next action: Registration")
                 if not const.DISABLE_VM_REGISTER_FUNC:
+                    checkpoint_workflow(workflow, ftd, 'vm_register')
                     message_subject = 'Event: ' + e_var['AutoScaleGrpName'] + ' ' + 'instance register' + ' ' + \
                                       _m_attr['instance_id']
                     msg_body = utl.sns_msg_body_configure_ftdv_topic('vm_register',  'FIRST',
                                                                      _m_attr['instance_id'])
                     sns.publish_to_topic(e_var['AutoScaleManagerTopic'], message_subject, msg_body)
                 else:
+                    checkpoint_workflow(workflow, ftd, WORKFLOW_DONE)
                     logger.info(" vm_register function is disabled! Check constant.py")
+            elif const.DELAYED_PROBES and probe_sns_event(_m_attr, workflow, const.FTD_SSH_PROBE_INTERVAL,
+                                                          const.FTD_POLL_TIME_IN_MIN_VM_READY):
+                logger.info("SSH to NGFWv with instance_id: %s is not available yet" % _m_attr['instance_id'])
             else:
                 logger.warn("SSH to NGFWv with instance_id: %s is un-successful, Retrying..." %
                             _m_attr['instance_id'])
+                checkpoint_workflow(workflow, ftd)
                 message_subject = 'Event: ' + e_var['AutoScaleGrpName'] + ' ' + 'instance poll' + ' ' + \
                                   _m_attr['instance_id']
                 msg_body = utl.sns_msg_body_configure_ftdv_topic('vm_ready', 'FIRST',
@@ -294,19 +460,32 @@ def handle_sns_event(sns_data):
 
     elif _m_attr['to_function'] == 'vm_register':
         if _m_attr['category'] == 'FIRST':
-            if execute_vm_register_first(ftd) == 'SUCCESS':
+            # Batch window is waited out by probes, window joined by first probe is carried in message
+            window = _m_attr.get('reg_window', {}) if const.DELAYED_PROBES else None
+            register_status = execute_vm_register_first(ftd, window)
+            if register_status == 'PENDING' and probe_sns_event(_m_attr, workflow, ftd.reg_window['delay'],
+                                                                const.REGISTRATION_PROBE_TIME_IN_MIN,
+                                                                {'reg_window': ftd.reg_window}):
+                logger.info("Registration of %s waits for batch window" % _m_attr['instance_id'])
+            elif register_status in ['SUCCESS', 'REQUESTED']:
                 ftd.create_instance_tags('NGFWvRegistrationStatus', 'DONE')
                 logger.info("Instance is registered to FMC, Next action: Configuration")
                 if not const.DISABLE_VM_CONFIGURE_FUNC:
+                    # FMC needs a while after registration request, before device can be configured (CSCvs17405)
+                    delay = const.REGISTRATION_SETTLE_DELAY if register_status == 'REQUESTED' else 0
+                    checkpoint_workflow(workflow, ftd, 'vm_configure', delay)
                     message_subject = 'Event: ' + e_var['AutoScaleGrpName'] + ' ' + 'instance configure' + ' ' + \
                                       _m_attr['instance_id']
                     msg_body = utl.sns_msg_body_configure_ftdv_topic('vm_configure',  'FIRST',
                                                                      _m_attr['instance_id'])
-                    sns.publish_to_topic(e_var['AutoScaleManagerTopic'], message_subject, msg_body)
+                    scheduler.get_scheduler(e_var['AutoScaleManagerTopic']).schedule(message_subject, msg_body,
+                                                                                     delay)
                 else:
+                    checkpoint_workflow(workflow, ftd, WORKFLOW_DONE)
                     logger.info(" vm_configure function is disabled! Check constant.py")
             else:
                 logger.warn("Registration failed! trying again in next cycle...")
+                checkpoint_workflow(workflow, ftd)
                 message_subject = 'Event: ' + e_var['AutoScaleGrpName'] + ' ' + 'instance register' + ' ' + \
                                   _m_attr['instance_id']
                 msg_body = utl.sns_msg_body_configure_ftdv_topic('vm_register', 'FIRST',
@@ -316,19 +495,25 @@ def handle_sns_event(sns_data):
 
     elif _m_attr['to_function'] == 'vm_configure':
         if _m_attr['category'] == 'FIRST':
-            if execute_vm_configure_first(ftd) == 'SUCCESS':
+            # Object & device lookups repeated during configuration are served once per invocation
+            with fmc.read_scope():
+                configure_status = execute_vm_configure_first(ftd)
+            if configure_status == 'SUCCESS':
                 ftd.create_instance_tags('NGFWvConfigurationStatus', 'DONE')
                 logger.info("Instance is configured in FMC, Next action: Deployment")
                 if not const.DISABLE_VM_DEPLOY_FUNC:
+                    checkpoint_workflow(workflow, ftd, 'vm_deploy')
                     message_subject = 'Event: ' + e_var['AutoScaleGrpName'] + ' ' + 'instance deploy' + ' ' + \
                                       _m_attr['instance_id']
                     msg_body = utl.sns_msg_body_configure_ftdv_topic('vm_deploy',  'FIRST',
                                                                      _m_attr['instance_id'])
                     sns.publish_to_topic(e_var['AutoScaleManagerTopic'], message_subject, msg_body)
                 else:
+                    checkpoint_workflow(workflow, ftd, WORKFLOW_DONE)
                     logger.info(" vm_deploy function is disabled! Check constant.py")
             else:
                 logger.warn("Configuration failed! trying again in next cycle...")
+                checkpoint_workflow(workflow, ftd)
                 message_subject = 'Event: ' + e_var['AutoScaleGrpName'] + ' ' + 'instance configure' + ' ' + \
                                   _m_attr['instance_id']
                 msg_body = utl.sns_msg_body_configure_ftdv_topic('vm_configure', 'FIRST',
@@ -338,9 +523,21 @@ def handle_sns_event(sns_data):
 
     elif _m_attr['to_function'] == 'vm_deploy':
         if _m_attr['category'] == 'FIRST':
-            if execute_vm_deploy_first(ftd, fmc) == 'SUCCESS':
+            if const.DELAYED_PROBES:
+                deploy_status, task_id, window = execute_vm_deploy_probe(ftd, fmc, _m_attr.get('deploy_task', ''),
+                                                                         _m_attr.get('deploy_window'))
+            else:
+                deploy_status, task_id, window = execute_vm_deploy_first(ftd, fmc), '', None
+            # Probe waiting for deployment window is due once window is flushed
+            interval = window['delay'] if window is not None and window['delay'] > 0 else const.DEPLOY_PROBE_INTERVAL
+            if deploy_status == 'PENDING' and probe_sns_event(_m_attr, workflow, interval,
+                                                               const.DEPLOY_PROBE_TIME_IN_MIN,
+                                                               {'deploy_task': task_id, 'deploy_window': window}):
+                logger.info("Deployment on %s is in progress" % _m_attr['instance_id'])
+            elif deploy_status == 'SUCCESS':
                 ftd.create_instance_tags('NGFWvConfigDeployStatus', 'DONE')
                 logger.info("Configuration is deployed, health status in TG needs to be checked")
+                checkpoint_workflow(workflow, ftd, WORKFLOW_DONE)
                 details_of_the_device = json.dumps(ftd.get_instance_tags())
                 logger.info(details_of_the_device)
                 if e_var['USER_NOTIFY_TOPIC_ARN'] is not None:
@@ -353,7 +550,10 @@ def handle_sns_event(sns_data):
                     sns.publish_to_topic(e_var['USER_NOTIFY_TOPIC_ARN'], message_subject, msg_body)
                     # -------------
             else:
+                if deploy_status == 'PENDING':
+                    ftd.create_instance_tags('NGFWvConfigDeployStatus', 'FAIL')
                 logger.warn("Deployment failed! trying again in next cycle...")
+                checkpoint_workflow(workflow, ftd)
                 message_subject = 'Event: ' + e_var['AutoScaleGrpName'] + ' ' + 'instance deploy' + ' ' + \
                                   _m_attr['instance_id']
                 msg_body = utl.sns_msg_body_configure_ftdv_topic('vm_deploy', 'FIRST',
@@ -364,9 +564,13 @@ def handle_sns_event(sns_data):
     elif _m_attr['to_function'] == 'vm_delete':
         if _m_attr['category'] == 'FIRST':
             if execute_vm_delete_first(ftd, fmc) == 'SUCCESS':
+                fmc_pool.forget(_m_attr['instance_id'])
+                if workflow is not None:
+                    workflow.finish()
                 logger.info("Instance has been deleted")
             else:
                 logger.critical("Unable to delete instance")
+                checkpoint_workflow(workflow, ftd)
                 message_subject = 'Event: ' + e_var['AutoScaleGrpName'] + ' ' + 'instance delete' + ' ' + \
                                   _m_attr['instance_id']
                 msg_body = utl.sns_msg_body_configure_ftdv_topic('vm_delete', 'FIRST',
@@ -400,28 +604,53 @@ def handle_ec2_launch_event(instance_id):
         else:
             logger.info("CloudWatch Rule: " + cw_event.name + " is already ENABLED")
 
-        # Initialize DerivedFMC & AutoScaleGroup
-        fmc = fmc_cls_init()
-        # FTD class initialization
-        instance = ftd_cls_init(instance_id, fmc)
-
-        instance_state = instance.get_instance_state()
-        interfaces_ip = instance.get_instance_interfaces_ip()
-        if interfaces_ip is None:
-            logger.warn("Unable to get IPs of the instance" + instance_id)
-            message_subject = 'Event: ' + e_var['AutoScaleGrpName'] + ' ' + 'instance poll' + ' ' + instance_id
-            msg_body = utl.sns_msg_body_configure_ftdv_topic('vm_ready', 'FIRST', instance_id)
-            sns.publish_to_topic(e_var['AutoScaleManagerTopic'], message_subject, msg_body)
+        # Repeated or late launch notification of an instance being worked on does not restart its stages
+        lease = InstanceLease(instance_id)
+        if not lease.acquire():
+            logger.info("Instance %s is already being worked on, ignoring launch notification" % instance_id)
             utl.put_line_in_log('EC2 Launch Handler finished', 'thin')
             return
+        try:
+            workflow = None
+            if const.DURABLE_WORKFLOW:
+                workflow = InstanceWorkflow(instance_id)
+                if not workflow.create('vm_ready'):
+                    logger.info("Instance %s already has a workflow at %s, ignoring launch notification" %
+                                (instance_id, workflow.get_step()))
+                    utl.put_line_in_log('EC2 Launch Handler finished', 'thin')
+                    return
 
-        if instance_state == 'running' or instance_state == 'pending':
-            logger.info("Instance %s is in state: %s" % (instance_id, instance_state))
-            message_subject = 'Event: ' + e_var['AutoScaleGrpName'] + ' ' + 'instance poll' + ' ' + instance_id
-            msg_body = utl.sns_msg_body_configure_ftdv_topic('vm_ready', 'FIRST', instance_id)
-            sns.publish_to_topic(e_var['AutoScaleManagerTopic'], message_subject, msg_body)
-        else:
-            logger.warn("Instance %s is in state: %s" % (instance_id, instance_state))
+            # Instance is placed on an FMC of pool, its later stages go to same FMC
+            fmc_server = fmc_pool.place(instance_id)
+            # Initialize DerivedFMC & AutoScaleGroup
+            fmc = fmc_cls_init(fmc_server)
+            # FTD class initialization
+            instance = ftd_cls_init(instance_id, fmc)
+            instance.create_instance_tags('NGFWvFmcServer', fmc_server)
+            if workflow is not None:
+                # What is discovered here is cached for vm_ready & later steps
+                workflow.update_context(instance.get_context())
+                workflow.save()
+
+            instance_state = instance.get_instance_state()
+            interfaces_ip = instance.get_instance_interfaces_ip()
+            if interfaces_ip is None:
+                logger.warn("Unable to get IPs of the instance" + instance_id)
+                message_subject = 'Event: ' + e_var['AutoScaleGrpName'] + ' ' + 'instance poll' + ' ' + instance_id
+                msg_body = utl.sns_msg_body_configure_ftdv_topic('vm_ready', 'FIRST', instance_id)
+                sns.publish_to_topic(e_var['AutoScaleManagerTopic'], message_subject, msg_body)
+                utl.put_line_in_log('EC2 Launch Handler finished', 'thin')
+                return
+
+            if instance_state == 'running' or instance_state == 'pending':
+                logger.info("Instance %s is in state: %s" % (instance_id, instance_state))
+                message_subject = 'Event: ' + e_var['AutoScaleGrpName'] + ' ' + 'instance poll' + ' ' + instance_id
+                msg_body = utl.sns_msg_body_configure_ftdv_topic('vm_ready', 'FIRST', instance_id)
+                sns.publish_to_topic(e_var['AutoScaleManagerTopic'], message_subject, msg_body)
+            else:
+                logger.warn("Instance %s is in state: %s" % (instance_id, instance_state))
+        finally:
+            lease.release()
 
         if e_var['USER_NOTIFY_TOPIC_ARN'] is not None:
             # Email to user
@@ -496,6 +725,22 @@ def handle_cron_event(event):
     data = {
         "autoscale_group": e_var['AutoScaleGrpName']
     }
+    manager_scheduler = scheduler.get_scheduler(e_var['AutoScaleManagerTopic'])
+    if isinstance(manager_scheduler, scheduler.StoreScheduler):
+        # Without AutoScale Manager queue, delayed messages are published by cron run once due
+        try:
+            delivered = manager_scheduler.deliver_due_messages(instances_list, workflow_steps + ['lifecycle_complete'])
+            if delivered > 0:
+                data.update({"delivered_messages": delivered})
+        except Exception as e:
+            logger.exception(e)
+    if const.DURABLE_WORKFLOW:
+        try:
+            resumed = resume_stalled_workflows(instances_list)
+            if resumed != []:
+                data.update({"resumed_workflows": resumed})
+        except Exception as e:
+            logger.exception(e)
     if const.DISABLE_HEALTH_DOCTOR is True:
         logger.info("Health Doctor running is disabled, check constant.py")
         return
@@ -519,16 +764,29 @@ def handle_cron_event(event):
     try:
         # AutoScaleGroup
         aws_grp = aws_asg_cls_init()
-        # Initialize DerivedFMC & AutoScaleGroup
-        fmc = fmc_cls_init()
-        status = fmc_configuration_validation(fmc, aws_grp)
-        logger.info("Fmc validation status: " + status)
-        if status == 'FAIL':
-            inform_user = True
+        validation = {}
+        for fmc_server in fmc_pool.servers:
+            if not get_fmc_circuit(fmc_server).allow():
+                logger.info("FMC %s circuit is open, skipping FMC configuration validation" % fmc_server)
+                continue
+            # Initialize DerivedFMC
+            fmc = fmc_cls_init(fmc_server)
+            status = fmc_configuration_validation(fmc, aws_grp)
+            logger.info("Fmc %s validation status: %s" % (fmc_server, status))
+            validation[fmc_server] = fmc.configuration
+            if status == 'FAIL':
+                inform_user = True
+                # Group status is of first failing FMC of pool
+                break
+        if len(validation) == 0:
+            raise ValueError("FMC circuit is open, skipping FMC configuration validation")
     except Exception as e:
         logger.exception(e)
     else:
-        data.update({"fmc_config_validation": fmc.configuration})
+        if len(fmc_pool.servers) == 1:
+            data.update({"fmc_config_validation": fmc.configuration})
+        else:
+            data.update({"fmc_config_validation": validation})
 
     if inform_user:
         # SNS class initialization
@@ -543,15 +801,177 @@ def handle_cron_event(event):
     return
 
 
+def resume_workflow(workflow, _m_attr):
+    """
+    Purpose:    To resume workflow of instance at step of SNS message, retry counter is taken from workflow
+                Message of a step which workflow is not at (duplicate or superseded) is stale
+    Parameters: InstanceWorkflow object, SNS message
+    Returns:    True if step of message is due, False if message is stale
+    Raises:
+    """
+    to_function = _m_attr['to_function']
+    if workflow.load() is None or (to_function == 'vm_delete' and workflow.get_step() != 'vm_delete'):
+        # Messages published before workflow existed & deletion, which can interrupt any step, start a workflow
+        attempt = const.TO_FUN_RETRY_COUNT[workflow_steps.index(to_function)] - int(_m_attr['counter'])
+        workflow.start(to_function, workflow.get_context(), max(attempt, 0))
+        workflow.save()
+    elif workflow.get_step() != to_function:
+        logger.info("Dropping stale %s message of %s, its workflow is at %s" % (to_function, _m_attr['instance_id'],
+                                                                               workflow.get_step()))
+        return False
+    _m_attr['counter'] = str(workflow.retries_left())
+    return True
+
+
+def checkpoint_workflow(workflow, ftd, step=None, delay=0):
+    """
+    Purpose:    To checkpoint workflow of instance before message of its next step is published
+    Parameters: InstanceWorkflow object or None, ManagedDevice object, Next step(None to retry current step),
+                Seconds after which message is delivered
+    Returns:
+    Raises:
+    """
+    if workflow is None:
+        return
+    workflow.update_context(ftd.get_context())
+    if step is None:
+        workflow.retry(delay)
+    elif step == WORKFLOW_DONE:
+        workflow.complete()
+    else:
+        workflow.advance(step, delay)
+    workflow.save()
+    return
+
+
+def resume_stalled_workflows(instances_list):
+    """
+    Purpose:    To re-publish due step of workflows, whose SNS message or Lambda run is lost
+    Parameters: Instance ids of AutoScale group
+    Returns:    list of resumed instance ids
+    Raises:
+    """
+    sns = SimpleNotificationService()
+    resumed = []
+    for instance_id in instances_list:
+        workflow = InstanceWorkflow(instance_id)
+        if workflow.load() is None or not workflow.is_stalled():
+            continue
+        step = workflow.get_step()
+        logger.info("Workflow of %s is stalled at %s, resuming it" % (instance_id, step))
+        # Due time is moved, so that it is not resumed again before this message is handled
+        workflow.reschedule()
+        workflow.save()
+        message_subject = 'Event: ' + e_var['AutoScaleGrpName'] + ' ' + 'instance ' + step + ' resumed ' + instance_id
+        msg_body = utl.sns_msg_body_configure_ftdv_topic(step, 'FIRST', instance_id, str(workflow.retries_left()))
+        # Resume time keeps this message from being taken as duplicate of the lost one
+        msg_body['resumed'] = str(int(time.time()))
+        sns.publish_to_topic(e_var['AutoScaleManagerTopic'], message_subject, msg_body)
+        resumed.append(instance_id)
+    return resumed
+
+
+def defer_sns_event(_m_attr, circuit, workflow=None):
+    """
+    Purpose:    To schedule SNS message of a stage with same retry counter, after FMC circuit is waited out
+    Parameters: SNS message, FMC circuit breaker, InstanceWorkflow object
+    Returns:    True if deferred, False if stage is already deferred FMC_CIRCUIT_MAX_DEFERRALS times or
+                message could not be scheduled
+    Raises:
+    """
+    deferred = int(_m_attr.get('deferred', '0'))
+    if deferred >= const.FMC_CIRCUIT_MAX_DEFERRALS:
+        logger.info("FMC is still unavailable after %d deferrals, continuing %s" % (deferred, _m_attr['to_function']))
+        return False
+    # Delivering after a wait keeps deferred stages from spinning on SNS while circuit is open
+    wait = min(circuit.retry_in() or const.FMC_CIRCUIT_DEFER_WAIT, const.FMC_CIRCUIT_DEFER_WAIT)
+    logger.info("FMC is unavailable, deferring %s of %s by %d seconds" % (_m_attr['to_function'],
+                                                                        _m_attr['instance_id'], wait))
+    if workflow is not None:
+        # Deferred step is not stalled
+        workflow.reschedule(wait)
+        workflow.save()
+    msg_body = dict(_m_attr)
+    msg_body['deferred'] = str(deferred + 1)
+    message_subject = 'Event: ' + e_var['AutoScaleGrpName'] + ' ' + 'instance ' + _m_attr['to_function'] + \
+                      ' deferred ' + _m_attr['instance_id']
+    # Scheduler delivers it later, Lambda does not sleep through the wait
+    return scheduler.get_scheduler(e_var['AutoScaleManagerTopic']).schedule(message_subject, msg_body, wait)
+
+
+def probe_sns_event(_m_attr, workflow, interval, minutes, state=None):
+    """
+    Purpose:    To schedule next probe of a stage waiting on NGFWv or FMC, without consuming a retry
+                Probes of an attempt go on for given minutes, counted from its first probe
+    Parameters: SNS message, InstanceWorkflow object or None, Seconds between probes, Minutes,
+                dict carried to next probe
+    Returns:    True if probe is scheduled, False if probing time of attempt is over
+    Raises:
+    """
+    probe_since = int(_m_attr.get('probe_since', time.time()))
+    if time.time() + interval > probe_since + minutes * 60:
+        logger.info("%s of %s is not done after probing %d minutes" % (_m_attr['to_function'],
+                                                                       _m_attr['instance_id'], minutes))
+        return False
+    if workflow is not None:
+        # Probing step is not stalled
+        workflow.reschedule(interval)
+        workflow.save()
+    msg_body = dict(_m_attr)
+    msg_body.update(state or {})
+    msg_body['probe_since'] = str(probe_since)
+    msg_body['probe'] = str(int(_m_attr.get('probe', '0')) + 1)
+    message_subject = 'Event: ' + e_var['AutoScaleGrpName'] + ' ' + 'instance ' + _m_attr['to_function'] + \
+                      ' probe ' + _m_attr['instance_id']
+    return scheduler.get_scheduler(e_var['AutoScaleManagerTopic']).schedule(message_subject, msg_body, interval)
+
+
+def requeue_sns_event(sns, _m_attr):
+    """
+    Purpose:    To re-publish SNS message of an instance, which stays leased by another worker
+    Parameters: SimpleNotificationService object, SNS message
+    Returns:    True if re-published, False if message is already re-published INSTANCE_LEASE_MAX_REQUEUES times
+    Raises:
+    """
+    requeued = int(_m_attr.get('requeued', '0'))
+    if requeued >= const.INSTANCE_LEASE_MAX_REQUEUES:
+        logger.error("Instance %s is still leased after %d re-publishes, dropping %s" %
+                     (_m_attr['instance_id'], requeued, _m_attr['to_function']))
+        return False
+    logger.info("Instance %s is leased by another worker, re-publishing %s" % (_m_attr['instance_id'],
+                                                                             _m_attr['to_function']))
+    msg_body = dict(_m_attr)
+    msg_body['requeued'] = str(requeued + 1)
+    message_subject = 'Event: ' + e_var['AutoScaleGrpName'] + ' ' + 'instance ' + _m_attr['to_function'] + \
+                      ' requeued ' + _m_attr['instance_id']
+    sns.publish_to_topic(e_var['AutoScaleManagerTopic'], message_subject, msg_body)
+    return True
+
+
+def get_sns_message_key(_m_attr):
+    """
+    Purpose:    To get idempotency key of SNS message, i.e. stage, attempt & number of deferrals, resumes or probes
+                Re-publish of a message on lease wait is same message, hence not part of key
+    Parameters: SNS message
+    Returns:    Key
+    Raises:
+    """
+    return ':'.join([_m_attr['to_function'], _m_attr.get('category', ''), _m_attr['counter'],
+                     _m_attr.get('deferred', '0'), _m_attr.get('resumed', '0'), _m_attr.get('probe', '0')])
+
+
 # ----------------------------------------------------------------------------------------------------------------------
-def execute_vm_ready_first(ftd):
+def execute_vm_ready_first(ftd, probe=False):
     """
     Purpose:    This polls NGFW instance for it's SSH accessibility
-    Parameters: ManagedDevice object
+    Parameters: ManagedDevice object, True to check only once (next probe is scheduled by caller)
     Returns:    SUCCESS, FAIL
     Raises:
     """
-    poll_ftdv = ftd.poll_ftdv_ssh(const.FTD_POLL_TIME_IN_MIN_VM_READY)  # 10 minutes polling
+    if probe:
+        poll_ftdv = ftd.check_ftdv_ssh_status()
+    else:
+        poll_ftdv = ftd.poll_ftdv_ssh(const.FTD_POLL_TIME_IN_MIN_VM_READY)  # 10 minutes polling
     if poll_ftdv == "SUCCESS":
         request_response = ftd.configure_hostname()
         if request_response != 'COMMAND_RAN':
@@ -560,27 +980,38 @@ def execute_vm_ready_first(ftd):
     return 'FAIL'
 
 
-def execute_vm_register_first(ftd):
+def execute_vm_register_first(ftd, window=None):
     """
     Purpose:    This registers the device to FMC
-    Parameters: ManagedDevice object
-    Returns:    SUCCESS, FAIL
+    Parameters: ManagedDevice object, dict of batch window joined by earlier probe, {} to join it without waiting,
+                None to wait for it
+    Returns:    SUCCESS, FAIL, REQUESTED(registration request is sent, configuration has to wait, CSCvs17405),
+                PENDING(batch window is not flushed yet, probe again after delay of ftd.reg_window)
     Raises:
     """
-    ftd.create_instance_tags('NGFWvRegistrationStatus', 'ONGOING')
+    if not window:
+        ftd.create_instance_tags('NGFWvRegistrationStatus', 'ONGOING')
     try:
         # device_grp_id = fmc.get_device_grp_id_by_name(e_var['fmcDeviceGroupName'])
         # if device_grp_id is None:
         #     raise ValueError("Unable to find Device Group in FMC: %s " % e_var['fmcDeviceGroupName'])
         # else:
         #     logger.debug("Device Group: %s " % device_grp_id)
-        reg_status = ftd.check_ftdv_reg_status()  # Check Device Registration state
+        if window:
+            # Device was found pending by probe which joined the window
+            reg_status = 'PENDING'
+        else:
+            reg_status = ftd.check_ftdv_reg_status()  # Check Device Registration state
         if reg_status == "COMPLETED":
             logger.info("Device is in registration successful ")
             return 'SUCCESS'
         elif reg_status == "PENDING":
             logger.info("Device is in registration pending status ")
-            task_status = ftd.send_registration_request()  # Can return FAIL or SUCCESS
+            task_status = ftd.send_registration_request(window)  # Can return FAIL, SUCCESS or PENDING
+            if task_status == 'PENDING':
+                return 'PENDING'
+            if task_status == 'SUCCESS' and const.DELAYED_PROBES:
+                return 'REQUESTED'
             time.sleep(1 * 60)  # Related to CSCvs17405
             if task_status == 'SUCCESS':
                 return 'SUCCESS'
@@ -591,7 +1022,11 @@ def execute_vm_register_first(ftd):
                 reg_status = ftd.check_ftdv_reg_status()
                 if reg_status == 'PENDING':
                     logger.info("Device is in registration pending status ")
-                    task_status = ftd.send_registration_request()  # Can return FAIL or SUCCESS
+                    task_status = ftd.send_registration_request(window)  # Can return FAIL, SUCCESS or PENDING
+                    if task_status == 'PENDING':
+                        return 'PENDING'
+                    if task_status == 'SUCCESS' and const.DELAYED_PROBES:
+                        return 'REQUESTED'
                     time.sleep(1 * 60)  # Related to CSCvs17405
                     if task_status == 'SUCCESS':
                         return 'SUCCESS'
@@ -620,6 +1055,19 @@ def execute_vm_configure_first(ftd):
         ftd.update_device_configuration()
     if ftd.device_id != '':
         try:
+            geneve = e_var['GENEVE_SUPPORT'] == 'enable'
+            if const.DEVICE_TEMPLATE_CONFIG:
+                # Devices of group differ only in Nic Ids, Ips & Gateways, template of first device is replayed
+                if ftd.configure_from_template(geneve) == 'SUCCESS':
+                    return 'SUCCESS'
+            if const.RECONCILE_DEVICE_CONFIG:
+                # One fetch of device configuration & writes of only what differs
+                config_status = ftd.reconcile_configuration(geneve)
+                if config_status != 'SUCCESS':
+                    raise ValueError("Configuration reconciliation failed")
+                if const.DEVICE_TEMPLATE_CONFIG:
+                    ftd.capture_device_template(geneve)
+                return 'SUCCESS'
             nic_status = ftd.check_and_configure_interface()
             if nic_status != 'SUCCESS':
                 raise ValueError("Interface configuration failed")
@@ -632,6 +1080,8 @@ def execute_vm_configure_first(ftd):
             routes_status = ftd.check_and_configure_routes()
             if routes_status != 'SUCCESS':
                 raise ValueError("Route configuration failed")
+            if const.DEVICE_TEMPLATE_CONFIG:
+                ftd.capture_device_template(geneve)
             return 'SUCCESS'
         except ValueError as e:
             logger.info("Exception occurred {}".format(repr(e)))
@@ -650,11 +1100,17 @@ def execute_vm_deploy_first(ftd, fmc):
     """
     ftd.create_instance_tags('NGFWvConfigDeployStatus', 'ONGOING')
     try:
-        deploy_status = fmc.check_deploy_status(ftd.vm_name)
-        if deploy_status != 'DEPLOYED':
-            if fmc.start_deployment(ftd.vm_name) is None:
-                raise ValueError("Configuration deployment REST post failing")
-        deploy_status = ftd.ftdv_deploy_polling(5)
+        if const.DEPLOYMENT_BATCH_WINDOW > 0:
+            # Devices becoming deployable together are deployed in one request
+            deploy_status = fmc.deploy_coalesced(ftd.vm_name, ftd.on_deploy_complete, 5)
+        else:
+            deploy_status = fmc.check_deploy_status(ftd.vm_name)
+            task_id = None
+            if deploy_status != 'DEPLOYED':
+                task_id = fmc.start_deployment(ftd.vm_name)
+                if task_id is None:
+                    raise ValueError("Configuration deployment REST post failing")
+            deploy_status = ftd.ftdv_deploy_polling(5, task_id)
         if deploy_status != "SUCCESS":
             raise ValueError("Configuration deployment failed")
         logger.info("Configuration is deployed, health status in TG needs to be checked")
@@ -667,6 +1123,42 @@ def execute_vm_deploy_first(ftd, fmc):
     return 'FAIL'
 
 
+def execute_vm_deploy_probe(ftd, fmc, task_id='', window=None):
+    """
+    Purpose:    This starts policy deployment on the device, or checks once on deployment started earlier
+                Devices becoming deployable together join a deployment window, flushed by probe of its leader
+    Parameters: ManagedDevice object, DerivedFMC Object, Deployment task Id & window of earlier probe
+    Returns:    (SUCCESS, FAIL or PENDING, Deployment task Id, dict of deployment window or None)
+                Probe waiting for window to be flushed is due after delay of window
+    Raises:
+    """
+    if task_id == '' and window is None:
+        ftd.create_instance_tags('NGFWvConfigDeployStatus', 'ONGOING')
+    try:
+        if task_id != '' and fmc.get_task_status(task_id) == 'FAILED':
+            raise ValueError("Deployment task %s failed" % task_id)
+        if fmc.check_deploy_status(ftd.vm_name) == 'DEPLOYED':
+            logger.info("Configuration is deployed, health status in TG needs to be checked")
+            ftd.on_deploy_complete(ftd.vm_name, 'SUCCESS')
+            return 'SUCCESS', task_id, window
+        if task_id == '':
+            if const.DEPLOYMENT_BATCH_WINDOW > 0:
+                task_id, window = fmc.start_deployment_coalesced(ftd.vm_name, window)
+                if window['delay'] > 0:
+                    return 'PENDING', '', window
+            else:
+                task_id = fmc.start_deployment(ftd.vm_name)
+            if not task_id:
+                raise ValueError("Configuration deployment REST post failing")
+        return 'PENDING', task_id, window
+    except ValueError as e:
+        logger.info("Exception occurred {}".format(repr(e)))
+    except Exception as e:
+        logger.exception(e)
+    ftd.create_instance_tags('NGFWvConfigDeployStatus', 'FAIL')
+    return 'FAIL', task_id, window
+
+
 def execute_vm_delete_first(ftd, fmc):
     """
     Purpose:    This deletes the instance from Autoscale Group, de-registers from FMC
@@ -749,7 +1241,10 @@ def execute_instance_tg_health_doctor():
                     logger.info('%s, %s, %d days %d hours alive' %
                                 (unhealthy_instance_id, instance['LaunchTime'].strftime('%Y-%m-%d %H:%M:%S'),
                                  days, hours))
-                    if days > const.UNHEALTHY_DAYS_THRESHOLD or hours > const.UNHEALTHY_HOURS_THRESHOLD:
+                    if InstanceLease(unhealthy_instance_id).is_held():
+                        # Instance being worked on by manager is not healthy yet
+                        logger.info(unhealthy_instance_id + " is being worked on by manager, not removing it")
+                    elif days > const.UNHEALTHY_DAYS_THRESHOLD or hours > const.UNHEALTHY_HOURS_THRESHOLD:
                         killable_ftd_instance.append(unhealthy_instance_id)
                 else:
                     logger.info(unhealthy_instance_id + " is not part of " + str(e_var['AutoScaleGrpName']))
@@ -798,18 +1293,51 @@ def aws_asg_cls_init():
     return aws_grp
 
 
-def fmc_cls_init():
+def fmc_cls_init(fmc_server):
     """
-    Purpose:    To instantiate DerivedFMC class
-    Parameters:
+    Purpose:    To get DerivedFMC object of an FMC, while a batch is handled it is shared by its messages
+    Parameters: FMC server of pool
+    Returns:    Object
+    Raises:
+    """
+    if batch_fmc is not None:
+        # Messages of a batch share one DerivedFMC per FMC server
+        with batch_fmc_lock:
+            fmc = batch_fmc.get(fmc_server)
+            if fmc is None or fmc.reachable != 'AVAILABLE':
+                fmc = fmc_cls_new(fmc_server)
+                batch_fmc[fmc_server] = fmc
+        return fmc
+    return fmc_cls_new(fmc_server)
+
+
+def fmc_cls_new(fmc_server):
+    """
+    Purpose:    To instantiate DerivedFMC class & update it with user provided names & their ids
+    Parameters: FMC server of pool
     Returns:    Object
     Raises:
     """
     # FMC class initialization
-    fmc = DerivedFMC(e_var['FmcIp'], e_var['FmcUserName'], e_var['FmcPassword'], j_var['fmcAccessPolicyName'])
+    # Password is decrypted only if FMC auth token has to be generated
+    fmc = DerivedFMC(fmc_server, e_var['FmcUserName'], e_var.get_secret('FmcPassword'), j_var['fmcAccessPolicyName'])
     # Gets Auth token & updates self.reachable variable
     fmc.reach_fmc_()
     if fmc.reachable == 'AVAILABLE':
+        if const.FMC_AUDIT_FEED:
+            fmc.poll_audit_feed()
+        fmc_cls_configure(fmc)
+    return fmc
+
+
+def fmc_cls_configure(fmc):
+    """
+    Purpose:    To update DerivedFMC object with user provided names & their ids from FMC
+    Parameters: DerivedFMC object
+    Returns:
+    Raises:
+    """
+    with fmc.read_scope():
         l_seczone_name = [j_var['fmcInsideZone'], j_var['fmcOutsideZone']]
         l_network_obj_name = []
         
@@ -818,34 +1346,42 @@ def fmc_cls_init():
         if e_var['GENEVE_SUPPORT'] == "disable":
             l_host_obj_name = [j_var['MetadataServerObjectName']]
             fmc.update_fmc_config_user_input(e_var['fmcDeviceGroupName'], j_var['fmcAccessPolicyName'],
-                                         l_seczone_name, l_network_obj_name, l_host_obj_name, j_var['fmcNatPolicyName'])
+                                             l_seczone_name, l_network_obj_name, l_host_obj_name,
+                                             j_var['fmcNatPolicyName'])
         else:
             fmc.update_fmc_config_user_input(e_var['fmcDeviceGroupName'], j_var['fmcAccessPolicyName'],
-                                         l_seczone_name, l_network_obj_name)
+                                             l_seczone_name, l_network_obj_name)
         # Updates DerivedFMC object with appropriate ids from FMC
         fmc.set_fmc_configuration()
-    return fmc
+    return
 
 
-def ftd_cls_init(instance_id, fmc):
+def ftd_cls_init(instance_id, fmc, context=None):
     """
     Purpose:    To instantiate ManagedDevice class
-    Parameters: instance id, DerivedFMC object
+    Parameters: instance id, DerivedFMC object, Context cached by workflow of instance
     Returns:    ManagedDevice Object
     Raises:
     """
+    # Group, IPs & device ids cached by workflow save describe calls & FMC lookups
+    context = context or {}
     # Managed FTD class initialization
-    ftd = ManagedDevice(instance_id, fmc)
+    ftd = ManagedDevice(instance_id, fmc, context.get('asg'))
 
-    ftd.public_ip = ftd.get_public_ip()
-    ftd.private_ip = ftd.get_private_ip()
+    if 'private_ip' in context:
+        ftd.public_ip = context['public_ip']
+        ftd.private_ip = context['private_ip']
+    else:
+        ftd.public_ip = ftd.get_public_ip()
+        ftd.private_ip = ftd.get_private_ip()
 
     ftd.port = const.FTDV_SSH_PORT
     ftd.username = e_var['NgfwUserName']
-    ftd.password = e_var['NgfwPassword']
+    # Password is decrypted only if SSH to NGFWv is needed
+    ftd.password = e_var.get_secret('NgfwPassword')
     ftd.performance_tier = e_var['fmcPerformanceLicenseTier']
     ftd.defaultPassword = const.DEFAULT_PASSWORD
-    ftd.fmc_ip = j_var['fmcIpforDeviceReg']
+    ftd.fmc_ip = get_fmc_ip_for_device_reg(fmc)
     ftd.reg_id = j_var['RegistrationId']
     ftd.nat_id = j_var['NatId']
 
@@ -859,11 +1395,26 @@ def ftd_cls_init(instance_id, fmc):
     ftd.out_nic_name = j_var['fmcOutsideNicName']
 
     # Updating device configuration
-    ftd.update_device_configuration()
+    if not ftd.restore_context(context):
+        ftd.update_device_configuration()
 
     return ftd
 
 
+def get_fmc_ip_for_device_reg(fmc):
+    """
+    Purpose:    To get IP by which device registers with its owner FMC
+                for pool of FMCs, fmcIpforDeviceReg lists IPs in same order as FMC_SERVER
+    Parameters: DerivedFMC object
+    Returns:    IP or DONTRESOLVE
+    Raises:
+    """
+    reg_ips = utl.get_fmc_server_list(j_var['fmcIpforDeviceReg'])
+    if len(reg_ips) == 1:
+        return reg_ips[0]
+    return reg_ips[fmc_pool.servers.index(fmc.server[len('https://'):])]
+
+
 def fmc_configuration_validation(fmc, aws_grp):
     """
     Purpose:    To validate FMC configuration
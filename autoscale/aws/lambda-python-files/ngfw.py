@@ -26,9 +26,15 @@ import logging
 import paramiko
 import socket
 import json
+import hashlib
+import requests
 import constant as const
 import utility as utl
+import store
+import config
 from aws import CiscoEc2Instance
+from fmc import AsyncFirepowerManagementCenter, TaskTracker, poll_intervals
+from fmc import interface_matches, route_matches, vtep_matches, vni_matches
 
 logger = utl.setup_logging()
 
@@ -38,8 +44,8 @@ class NgfwInstance (CiscoEc2Instance):
     """
         NgfwInstance is a child class of CiscoEc2Instance, giving properties of NGFWv VM
     """
-    def __init__(self, instance_id):
-        super().__init__(instance_id)
+    def __init__(self, instance_id, group=None):
+        super().__init__(instance_id, group)
 
         self.COMMAND_RAN = 'COMMAND_RAN'
         self.SUCCESS = 'SUCCESS'
@@ -74,7 +80,7 @@ class NgfwInstance (CiscoEc2Instance):
             else:
                 logger.error("Found empty string for private_ip of the FTDv instance")
                 return None
-        connect = ParamikoSSH(ip_to_connect, self.port, self.username, self.password)
+        connect = ParamikoSSH(ip_to_connect, self.port, self.username, config.reveal(self.password))
         logger.debug(connect)
 
         return connect
@@ -109,14 +115,14 @@ class NgfwInstance (CiscoEc2Instance):
         Raises:
         """
         cnt_ngfw = self.connect_ngfw()
-        status = cnt_ngfw.connect(self.username, self.password)
+        status = cnt_ngfw.connect(self.username, config.reveal(self.password))
         if status == 'SUCCESS':
             return 'SUCCESS'
         elif status == 'Authentication Exception Occurred':
             status = cnt_ngfw.connect(self.username, self.defaultPassword)
             if status == 'SUCCESS':
                 cnt_ngfw.close()  # As below function triggers interactive shell
-                if self.change_ngfw_password(cnt_ngfw, self.defaultPassword, self.password) == 'SUCCESS':
+                if self.change_ngfw_password(cnt_ngfw, self.defaultPassword, config.reveal(self.password)) == 'SUCCESS':
                     return 'SUCCESS'
             else:
                 logger.error("Unable to authenticate to NGFW instance, please check password!")
@@ -265,8 +271,8 @@ class ManagedDevice(NgfwInstance):
     """
         ManagedDevice is child class of NgfwInstance, giving FMC managed device property to NGFWv instance
     """
-    def __init__(self, instance_id, fmc):
-        super().__init__(instance_id)
+    def __init__(self, instance_id, fmc, group=None):
+        super().__init__(instance_id, group)
         # Will be available from json
         self.l_caps = ''
         self.performance_tier = ''
@@ -282,6 +288,9 @@ class ManagedDevice(NgfwInstance):
 
         # Will be fetched by a method
         self.device_id = ''
+        self.reg_task_id = None
+        # Registration batch window joined without waiting for it to end
+        self.reg_window = None
         self.mgmt_ip = ''
         self.in_nic_id = ''
         self.out_nic_id = ''
@@ -333,8 +342,9 @@ class ManagedDevice(NgfwInstance):
         if self.device_id != '':
             self.reg_sts = 'COMPLETED'
             try:
-                self.in_nic_id = self.fmc.get_nic_id_by_name(self.device_id, self.in_nic)
-                self.out_nic_id = self.fmc.get_nic_id_by_name(self.device_id, self.out_nic)
+                afmc = AsyncFirepowerManagementCenter(self.fmc)
+                self.in_nic_id, self.out_nic_id = afmc.run(afmc.get_nic_id_by_name(self.device_id, self.in_nic),
+                                                           afmc.get_nic_id_by_name(self.device_id, self.out_nic))
                 if self.in_nic_id is None:
                     logger.info("unable to get Nic ID for " + self.in_nic)
                     self.in_nic_id = ''
@@ -353,9 +363,60 @@ class ManagedDevice(NgfwInstance):
         else:
             logger.info("No device_id found in FMC for instance: " + self.vm_name)
 
+    def get_context(self):
+        """
+        Purpose:        To get what is discovered of device from EC2 & FMC, to be cached by workflow
+        Parameters:
+        Returns:        dict
+        Raises:
+        """
+        context = {'asg': self.asg.groupname}
+        # IPs are empty if describe of instance failed
+        if self.private_ip != '':
+            context.update({'public_ip': self.public_ip, 'private_ip': self.private_ip})
+        # Ids are known only after registration
+        if self.device_id != '' and self.in_nic_id != '' and self.out_nic_id != '':
+            context.update({
+                'device_id': self.device_id,
+                'in_nic_id': self.in_nic_id,
+                'out_nic_id': self.out_nic_id,
+                'in_nic_zone': self.in_nic_zone,
+                'in_nic_zone_id': self.in_nic_zone_id,
+                'out_nic_zone': self.out_nic_zone,
+                'out_nic_zone_id': self.out_nic_zone_id
+            })
+        return context
+
+    def restore_context(self, context):
+        """
+        Purpose:        To update ManagedDevice Cls variables from context cached by workflow,
+                        instead of discovering them again
+        Parameters:     dict
+        Returns:        True if device ids are restored, else False
+        Raises:
+        """
+        self.public_ip = context.get('public_ip', self.public_ip)
+        self.private_ip = context.get('private_ip', self.private_ip)
+        if const.USE_PUBLIC_IP_FOR_FMC_CONN and self.public_ip != '':
+            self.mgmt_ip = self.public_ip
+        else:
+            self.mgmt_ip = self.private_ip
+        if context.get('device_id', '') == '':
+            return False
+        self.device_id = context['device_id']
+        self.reg_sts = 'COMPLETED'
+        self.in_nic_id = context['in_nic_id']
+        self.out_nic_id = context['out_nic_id']
+        self.in_nic_zone = context['in_nic_zone']
+        self.in_nic_zone_id = context['in_nic_zone_id']
+        self.out_nic_zone = context['out_nic_zone']
+        self.out_nic_zone_id = context['out_nic_zone_id']
+        return True
+
     def ftdv_reg_polling(self, minutes=2):
         """
         Purpose:    To poll both NGFW & FMCv for registration status
+                    Registration task is tracked first, device records & NGFW(SSH) are checked to confirm completion
         Parameters: FirepowerManagementCenter class object, Minutes
         Returns:    SUCCESS, PARTIAL, FAILED
         Raises:
@@ -363,33 +424,59 @@ class ManagedDevice(NgfwInstance):
         # Polling registration completion for specified 'minutes'
         if minutes <= 1:
             minutes = 2
+        deadline = time.time() + minutes * 60
+        if self.reg_task_id is not None:
+            task_status = TaskTracker(self.fmc).wait([self.reg_task_id], minutes)[self.reg_task_id]
+            logging.debug("Registration task status in FMC: " + task_status)
+            if task_status == 'FAILED':
+                self.reg_sts = 'FAILED'
+                return "FAILED"
         status_in_ftdv = ''
         status_in_fmc = ''
-        for i in range(1, 2*minutes):
-            if i != ((2*minutes)-1):
+        intervals = poll_intervals(max(0, deadline - time.time()))
+        while True:
+            status_in_fmc = self.fmc.check_reg_status_from_fmc(self.vm_name)
+            if status_in_fmc == 'SUCCESS':
+                # SSH to NGFW only once FMC has the device
                 status_in_ftdv = self.check_ftdv_reg_status()
-                status_in_fmc = self.fmc.check_reg_status_from_fmc(self.vm_name)
-                if status_in_ftdv == "COMPLETED" and status_in_fmc == 'SUCCESS':
+                if status_in_ftdv == "COMPLETED":
                     self.reg_sts = 'COMPLETED'
                     return "SUCCESS"
-                else:
-                    logging.debug("Registration status in FTDv: " + status_in_ftdv + " in FMC: " + status_in_fmc)
-                    logging.debug("Sleeping for 30 seconds")
-                    time.sleep(1*30)
+            logging.debug("Registration status in FTDv: " + str(status_in_ftdv) + " in FMC: " + str(status_in_fmc))
+            wait = next(intervals, None)
+            if wait is None:
+                break
+            logging.debug("Sleeping for %.1f seconds" % wait)
+            time.sleep(wait)
+        if status_in_ftdv == '':
+            status_in_ftdv = self.check_ftdv_reg_status()
         if status_in_ftdv == "COMPLETED" or status_in_fmc == "SUCCESS":
             self.reg_sts = 'ON-GOING'
             return "PARTIAL"
         self.reg_sts = 'FAILED'
         return "FAILED"
 
-    def send_registration_request(self):
+    def send_registration_request(self, window=None):
         """
         Purpose:    To send Device Registration request to FMC
-        Parameters: FirepowerManagementCenter class object, Device Group
-        Returns:    SUCCESS, FAIL
+        Parameters: dict of batch window joined by earlier call, {} to join it without waiting for it to end,
+                    None to wait for it here
+        Returns:    SUCCESS, FAIL, PENDING(call again after delay of self.reg_window)
         Raises:
         """
-        reg_task_id = self.fmc.register_ftdv(self.vm_name, self.mgmt_ip, self.reg_id, self.nat_id, self.l_caps, self.performance_tier)
+        if const.REGISTRATION_BATCH_WINDOW > 0 and window is not None:
+            reg_task_id, self.reg_window = self.fmc.register_ftdv_coalesced(self.vm_name, self.mgmt_ip, self.reg_id,
+                                                                            self.nat_id, self.l_caps,
+                                                                            self.performance_tier, window)
+            if self.reg_window['delay'] > 0:
+                return 'PENDING'
+        elif const.REGISTRATION_BATCH_WINDOW > 0:
+            reg_task_id = self.fmc.register_ftdv_batched(self.vm_name, self.mgmt_ip, self.reg_id, self.nat_id,
+                                                         self.l_caps, self.performance_tier)
+        else:
+            reg_task_id = self.fmc.register_ftdv(self.vm_name, self.mgmt_ip, self.reg_id, self.nat_id, self.l_caps,
+                                                 self.performance_tier)
+        self.reg_task_id = reg_task_id
         if reg_task_id is not None:
             self.ftdv_reg_polling(4)  # 4 minutes polling
             if self.reg_sts == 'ONGOING':
@@ -412,26 +499,8 @@ class ManagedDevice(NgfwInstance):
                                                              static_route['network'], static_route['gateway'])
                 logger.debug("Route status: " + check_s_route_)
                 if check_s_route_ == 'UN-CONFIGURED':
-                    # Configure Static Route
-                    logger.info("Configuring Route: " + json.dumps(static_route, separators=(',', ':')))
-                    if self.fmc.get_host_objectid_by_name(static_route['network']) != '':
-                        rt_type = 'Host'
-                    elif self.fmc.get_network_objectid_by_name(static_route['network']) != '':
-                        rt_type = 'Network'
-                    elif self.fmc.get_group_objectid_by_name(static_route['network']) != '':
-                        rt_type = 'Group'
-                    else:
-                        logger.error("trafficRoutes.network value in Configuration json is not correct")
-                        return 'FAIL'
-                    r = self.fmc.conf_static_rt(self.device_id, static_route['interface'],
-                                                rt_type, static_route['network'],
-                                                static_route['gateway'], static_route['metric'])
-                    if r.status_code != 200 and r.status_code != 201:
-                        logger.error("Route configuration failed: " + str(r.status_code))
-                        logger.error("response: " + str(r.json()))
+                    if self.configure_route(static_route) != 'SUCCESS':
                         return 'FAIL'
-                    else:
-                        logger.info("Static Host route configuration REST response {}".format(r.status_code))
         except KeyError as e:
             logger.exception(e)
             logger.error("Looks like Configuration.json file Key")
@@ -441,6 +510,96 @@ class ManagedDevice(NgfwInstance):
             return 'FAIL'
         return 'SUCCESS'
 
+    def configure_route(self, static_route):
+        """
+        Purpose:    To create a static route
+        Parameters: Route from traffic_routes
+        Returns:    SUCCESS, FAIL
+        Raises:
+        """
+        logger.info("Configuring Route: " + json.dumps(static_route, separators=(',', ':')))
+        if self.fmc.get_host_objectid_by_name(static_route['network']) != '':
+            rt_type = 'Host'
+        elif self.fmc.get_network_objectid_by_name(static_route['network']) != '':
+            rt_type = 'Network'
+        elif self.fmc.get_group_objectid_by_name(static_route['network']) != '':
+            rt_type = 'Group'
+        else:
+            logger.error("trafficRoutes.network value in Configuration json is not correct")
+            return 'FAIL'
+        r = self.fmc.conf_static_rt(self.device_id, static_route['interface'],
+                                    rt_type, static_route['network'],
+                                    static_route['gateway'], static_route['metric'])
+        if r is None or (r.status_code != 200 and r.status_code != 201):
+            logger.error("Route configuration failed: " + (str(r.status_code) if r is not None else 'no response'))
+            if r is not None:
+                logger.error("response: " + str(r.text))
+            return 'FAIL'
+        logger.info("Static Host route configuration REST response {}".format(r.status_code))
+        return 'SUCCESS'
+
+    def get_desired_nic(self, interface):
+        """
+        Purpose:    To get desired FMC configuration of an interface of interface_config
+        Parameters: Interface from interface_config
+        Returns:    dict {nic, nic_id, ifname, zone_id, mtu, ip & netmask(None if DHCP)}, None if interface is not known
+        Raises:
+        """
+        if interface['name'] == self.in_nic:
+            nic = {'nic': self.in_nic, 'nic_id': self.in_nic_id, 'ifname': self.in_nic_name,
+                   'zone_id': self.in_nic_zone_id, 'mtu': interface['MTU'], 'ip': None, 'netmask': None}
+            if const.NIC_CONFIGURE == "STATIC":
+                self.in_nic_ip = self.get_private_ip_of_interface(const.ENI_NAME_OF_INTERFACE_2)
+                self.in_nic_subnet_id = self.get_subnet_id_of_interface(const.ENI_NAME_OF_INTERFACE_2)
+                self.in_nic_netmask = self.get_subnet_mask_from_subnet_id(self.in_nic_subnet_id)
+                nic['ip'], nic['netmask'] = self.in_nic_ip, self.in_nic_netmask
+        elif interface['name'] == self.out_nic:
+            nic = {'nic': self.out_nic, 'nic_id': self.out_nic_id, 'ifname': self.out_nic_name,
+                   'zone_id': self.out_nic_zone_id, 'mtu': interface['MTU'], 'ip': None, 'netmask': None}
+            if const.NIC_CONFIGURE == "STATIC":
+                self.out_nic_ip = self.get_private_ip_of_interface(const.ENI_NAME_OF_INTERFACE_3)
+                self.out_nic_subnet_id = self.get_subnet_id_of_interface(const.ENI_NAME_OF_INTERFACE_3)
+                self.out_nic_netmask = self.get_subnet_mask_from_subnet_id(self.out_nic_subnet_id)
+                nic['ip'], nic['netmask'] = self.out_nic_ip, self.out_nic_netmask
+        else:
+            return None
+        return nic
+
+    def reconcile_configuration(self, geneve=False):
+        """
+        Purpose:    To bring interfaces, Geneve & static routes of device to desired state in minimal FMC calls
+        Parameters: Geneve support enabled
+        Returns:    SUCCESS, FAIL
+        Raises:
+        """
+        return ConfigReconciler(self, geneve).reconcile()
+
+    def configure_from_template(self, geneve=False):
+        """
+        Purpose:    To configure device by replaying device template of its group
+        Parameters: Geneve support enabled
+        Returns:    SUCCESS, FAIL
+        Raises:
+        """
+        try:
+            return DeviceTemplate(self, geneve).replay()
+        except Exception as e:
+            logger.exception(e)
+            return 'FAIL'
+
+    def capture_device_template(self, geneve=False):
+        """
+        Purpose:    To capture configuration of this device as device template of its group
+        Parameters: Geneve support enabled
+        Returns:    SUCCESS, FAIL
+        Raises:
+        """
+        try:
+            return DeviceTemplate(self, geneve).capture()
+        except Exception as e:
+            logger.exception(e)
+            return 'FAIL'
+
     def check_interface_config(self, interface):
         """
         Purpose:        To check if an interface configuration exists
@@ -514,36 +673,19 @@ class ManagedDevice(NgfwInstance):
         Returns:    Success or Fail
         Raises:
         """
-        for interface in self.interface_config:
-            if self.check_interface_config(interface) == 'FAIL':
-                try:
-                    logger.info("Configuring Nic %s ..." % (interface['name']))
-                    r = None
-                    if const.NIC_CONFIGURE == "STATIC":
-                        if interface['name'] == self.in_nic:
-                            r = self.fmc.configure_nic_static(self.device_id, self.in_nic_id, self.in_nic,
-                                                              self.in_nic_name, interface['managementOnly'],
-                                                              interface['mode'], self.in_nic_zone_id,
-                                                              interface['MTU'], self.in_nic_ip, self.in_nic_netmask)
-                        elif interface['name'] == self.out_nic:
-                            r = self.fmc.configure_nic_static(self.device_id, self.out_nic_id, self.out_nic,
-                                                              self.out_nic_name, interface['managementOnly'],
-                                                              interface['mode'], self.out_nic_zone_id,
-                                                              interface['MTU'], self.out_nic_ip, self.out_nic_netmask)
-                    elif const.NIC_CONFIGURE == "DHCP":
-                        if interface['name'] == self.in_nic:
-                            r = self.fmc.configure_nic_dhcp(self.device_id, self.in_nic_id, self.in_nic,
-                                                            self.in_nic_name, interface['managementOnly'],
-                                                            interface['mode'], self.in_nic_zone_id, interface['MTU'])
-                        elif interface['name'] == self.out_nic:
-                            r = self.fmc.configure_nic_dhcp(self.device_id, self.out_nic_id, self.out_nic,
-                                                            self.out_nic_name, interface['managementOnly'],
-                                                            interface['mode'], self.out_nic_zone_id, interface['MTU'])
+        pending = [interface for interface in self.interface_config if self.check_interface_config(interface) == 'FAIL']
+        if len(pending) > 0:
+            # Inside & outside Nics are configured concurrently
+            afmc = AsyncFirepowerManagementCenter(self.fmc)
+            responses = afmc.run(*[afmc.call(self.configure_interface, interface) for interface in pending],
+                                 return_exceptions=True)
+            for r in responses:
+                if isinstance(r, Exception):
+                    logger.error(repr(r))
+                    logger.error("Configuring Nic failed!")
+                else:
                     logger.info("Response: ")
                     logger.info(r)
-                except Exception as e:
-                    logger.exception(e)
-                    logger.error("Configuring Nic failed!")
 
         status = 'SUCCESS'
         for interface in self.interface_config:
@@ -552,6 +694,37 @@ class ManagedDevice(NgfwInstance):
                 return status
         return status
 
+    def configure_interface(self, interface):
+        """
+        Purpose:    To configure an interface as per NIC_CONFIGURE
+        Parameters: Interface from interface_config
+        Returns:    REST put response, None
+        Raises:
+        """
+        logger.info("Configuring Nic %s ..." % (interface['name']))
+        r = None
+        if const.NIC_CONFIGURE == "STATIC":
+            if interface['name'] == self.in_nic:
+                r = self.fmc.configure_nic_static(self.device_id, self.in_nic_id, self.in_nic,
+                                                  self.in_nic_name, interface['managementOnly'],
+                                                  interface['mode'], self.in_nic_zone_id,
+                                                  interface['MTU'], self.in_nic_ip, self.in_nic_netmask)
+            elif interface['name'] == self.out_nic:
+                r = self.fmc.configure_nic_static(self.device_id, self.out_nic_id, self.out_nic,
+                                                  self.out_nic_name, interface['managementOnly'],
+                                                  interface['mode'], self.out_nic_zone_id,
+                                                  interface['MTU'], self.out_nic_ip, self.out_nic_netmask)
+        elif const.NIC_CONFIGURE == "DHCP":
+            if interface['name'] == self.in_nic:
+                r = self.fmc.configure_nic_dhcp(self.device_id, self.in_nic_id, self.in_nic,
+                                                self.in_nic_name, interface['managementOnly'],
+                                                interface['mode'], self.in_nic_zone_id, interface['MTU'])
+            elif interface['name'] == self.out_nic:
+                r = self.fmc.configure_nic_dhcp(self.device_id, self.out_nic_id, self.out_nic,
+                                                self.out_nic_name, interface['managementOnly'],
+                                                interface['mode'], self.out_nic_zone_id, interface['MTU'])
+        return r
+
     def configure_geneve(self):
         """
         Purpose:    configure Geneve (Enable VTEP & add VNI )
@@ -585,43 +758,41 @@ class ManagedDevice(NgfwInstance):
         Returns:    SUCCESS, FAILED
         Raises:
         """
-        # Polling registration completion for specified 'minutes'
+        # Polling de-registration completion for specified 'minutes', no task is returned by FMC for it
         if minutes <= 1:
             minutes = 2
-        for i in range(1, 2*minutes):
-            if i != ((2*minutes)-1):
-                status_in_fmc = self.fmc.check_reg_status_from_fmc(self.vm_name)
-                if status_in_fmc == 'FAILED':
-                    return "SUCCESS"
-                else:
-                    logging.debug("De-registration polling, Sleeping for 30 seconds")
-                    time.sleep(1*30)
-            else:
-                return "FAILED"
+        for wait in poll_intervals(minutes * 60):
+            status_in_fmc = self.fmc.check_reg_status_from_fmc(self.vm_name)
+            if status_in_fmc == 'FAILED':
+                return "SUCCESS"
+            logging.debug("De-registration polling, Sleeping for %.1f seconds" % wait)
+            time.sleep(wait)
         return "FAILED"
 
     # Polling for policy deployment completion of FTDv
-    def ftdv_deploy_polling(self, minutes):
+    def ftdv_deploy_polling(self, minutes, task_id=None):
         """
         Purpose:    To Poll for policy deployment completion of NGFW
-        Parameters: FirepowerManagementCenter class object, Minutes
+        Parameters: FirepowerManagementCenter class object, Minutes, Deployment task Id
         Returns:    SUCCESS, FAILED
         Raises:
         """
         if minutes <= 1:
             minutes = 2
-        for i in range(1, 4*minutes):
-            if i != ((4*minutes)-1):
-                status = self.fmc.check_deploy_status(self.vm_name)
-                if status != "DEPLOYED":
-                    logging.debug(str(i) + " Sleeping for 15 seconds")
-                    time.sleep(1*15)
-                else:
-                    return "SUCCESS"
-            else:
-                return "FAILED"
+        if self.fmc.wait_deploy_status(self.vm_name, task_id, minutes) == "DEPLOYED":
+            return "SUCCESS"
         return "FAILED"
 
+    def on_deploy_complete(self, device_name, status):
+        """
+        Purpose:    Completion callback of coalesced policy deployment
+        Parameters: Device name, SUCCESS/FAILED
+        Returns:
+        Raises:
+        """
+        logger.info("Policy deployment on %s: %s" % (device_name, status))
+        self.deploy_sts = 'COMPLETED' if status == 'SUCCESS' else 'FAILED'
+
     def remove_from_fmc(self):
         """
         Purpose:    To de-register device from FMC
@@ -662,6 +833,293 @@ class ManagedDevice(NgfwInstance):
         return
 
 
+class ConfigReconciler:
+    """
+        ConfigReconciler class compares desired configuration of a ManagedDevice (Configuration.json) with its
+        actual FMC configuration, fetched in one pass, & writes only what differs
+        Successful write responses are taken as confirmation, configuration is not fetched again
+    """
+    def __init__(self, device, geneve=False):
+        self.device = device
+        self.fmc = device.fmc
+        self.geneve = geneve
+
+    def diff(self, state):
+        """
+        Purpose:    To get changes needed to reach desired configuration
+        Parameters: Device state from FirepowerManagementCenter.get_device_state
+        Returns:    dict {'interfaces': [interface], 'vtep': bool, 'vni': bool, 'routes': [route]}
+        Raises:     ValueError, if an interface of Configuration.json is not known
+        """
+        changes = {'interfaces': [], 'vtep': False, 'vni': False, 'routes': []}
+        for interface in self.device.interface_config:
+            nic = self.device.get_desired_nic(interface)
+            if nic is None:
+                raise ValueError("Unknown interface in Configuration json: " + interface['name'])
+            actual = [item for item in state['interfaces'] if item.get('id') == nic['nic_id']]
+            if not actual or not interface_matches(actual[0], nic['nic'], nic['ifname'], nic['zone_id'],
+                                                   nic['mtu'], nic['ip']):
+                changes['interfaces'].append(interface)
+        if self.geneve:
+            device = self.device
+            changes['vtep'] = not any(vtep_matches(item, device.out_nic_id) for item in state['vtep'])
+            changes['vni'] = not any(vni_matches(item, device.out_nic_zone_id) for item in state['vni'])
+        self.device.update_gw_stat_route()
+        for static_route in self.device.traffic_routes:
+            if not any(route_matches(route, static_route['interface'], static_route['network'],
+                                     static_route['gateway']) for route in state['routes']):
+                changes['routes'].append(static_route)
+        return changes
+
+    def __apply_all(self, function, items):
+        # Writes of different objects are independent, hence done concurrently
+        if len(items) == 0:
+            return []
+        afmc = AsyncFirepowerManagementCenter(self.fmc)
+        return afmc.run(*[afmc.call(function, item) for item in items], return_exceptions=True)
+
+    def apply(self, changes):
+        """
+        Purpose:    To write changes to FMC, interfaces first as Geneve & routes refer to interface names
+        Parameters: Changes from diff
+        Returns:    SUCCESS, FAIL
+        Raises:
+        """
+        for interface, r in zip(changes['interfaces'], self.__apply_all(self.device.configure_interface,
+                                                                         changes['interfaces'])):
+            if isinstance(r, Exception) or r is None or r.status_code != 200:
+                logger.error("Configuring Nic %s failed: %s" % (interface['name'],
+                                                               repr(r) if isinstance(r, Exception) or r is None
+                                                               else r.text))
+                return 'FAIL'
+            logger.info("Nic %s configured" % interface['name'])
+        if self.apply_geneve(changes['vtep'], changes['vni']) != 'SUCCESS':
+            return 'FAIL'
+        for status in self.__apply_all(self.device.configure_route, changes['routes']):
+            if status != 'SUCCESS':
+                if isinstance(status, Exception):
+                    logger.error(repr(status))
+                return 'FAIL'
+        return 'SUCCESS'
+
+    def apply_geneve(self, vtep, vni):
+        """
+        Purpose:    To enable VTEP & add VNI on outside Nic
+        Parameters: Enable VTEP, Add VNI
+        Returns:    SUCCESS, FAIL
+        Raises:
+        """
+        device = self.device
+        if vtep:
+            logger.info("Configuring vtep for %s ..." % device.out_nic)
+            r = self.fmc.enable_vtep(device.device_id, device.out_nic_id, device.out_nic, device.out_nic_name)
+            if not 200 <= r.status_code <= 201:
+                logger.error("Configuring VTEP failed: " + r.text)
+                return 'FAIL'
+        if vni:
+            logger.info("Adding VNI")
+            r = self.fmc.add_vni(device.device_id, device.out_nic_zone_id)
+            if not 200 <= r.status_code <= 201:
+                logger.error("Adding VNI failed: " + r.text)
+                return 'FAIL'
+        return 'SUCCESS'
+
+    def reconcile(self):
+        """
+        Purpose:    To fetch actual state, diff it with desired state & apply the changes
+        Parameters:
+        Returns:    SUCCESS, FAIL
+        Raises:
+        """
+        try:
+            state = self.fmc.get_device_state(self.device.device_id, self.geneve)
+            changes = self.diff(state)
+        except (ValueError, KeyError, requests.exceptions.RequestException) as e:
+            logger.error("Unable to compute configuration changes: " + repr(e))
+            return 'FAIL'
+        logger.info("Configuration changes for %s: %d interfaces, vtep %s, vni %s, %d routes" %
+                    (self.device.vm_name, len(changes['interfaces']), changes['vtep'], changes['vni'],
+                     len(changes['routes'])))
+        return self.apply(changes)
+
+
+class DeviceTemplate:
+    """
+        DeviceTemplate class captures interface & route configuration of a configured device as a template,
+        per-device values (Nic Id, Ip, Netmask, Gateway) being placeholders, & replays it on other devices of group
+        Template is kept in shared store, keyed by digest of Configuration.json parts it is made from
+    """
+    def __init__(self, device, geneve=False):
+        self.device = device
+        self.fmc = device.fmc
+        self.geneve = geneve
+        self.store = store.get_shared_store()
+        # Write of replay was rejected by FMC, template may not fit anymore
+        self.rejected = False
+        # Generation is changed by audit feed when objects or devices are changed outside this deployment
+        try:
+            generation = self.store.get('device-template-generation:' + self.fmc.server) or 0
+        except Exception as e:
+            # Template of unknown generation may be stale, device is configured without it
+            logger.error("Unable to read device template generation: " + str(e))
+            self.key = None
+            return
+        self.key = 'device-template:' + self.fmc.server + ':' + str(generation) + ':' + self.__digest()
+
+    def __digest(self):
+        # Gateway is per subnet, hence not part of group configuration
+        routes = [{k: v for k, v in route.items() if k != 'gateway'} for route in self.device.traffic_routes]
+        config = [self.device.interface_config, routes, const.NIC_CONFIGURE, self.geneve]
+        return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+    @staticmethod
+    def __strip(item):
+        return {k: v for k, v in item.items() if k not in ['id', 'links', 'metadata']}
+
+    def capture(self):
+        """
+        Purpose:    To capture configuration of device as template of group, if group has none yet
+        Parameters:
+        Returns:    SUCCESS, FAIL
+        Raises:
+        """
+        if self.key is None:
+            return 'FAIL'
+        if self.store.get(self.key) is not None:
+            return 'SUCCESS'
+        device = self.device
+        state = self.fmc.get_device_state(device.device_id)
+        template = {'interfaces': [], 'routes': []}
+        for interface in device.interface_config:
+            nic = device.get_desired_nic(interface)
+            actual = [item for item in state['interfaces'] if nic is not None and item.get('id') == nic['nic_id']]
+            if not actual or not interface_matches(actual[0], nic['nic'], nic['ifname'], nic['zone_id'],
+                                                   nic['mtu'], nic['ip']):
+                logger.info("Interface %s of %s is not as desired, template not captured" %
+                            (interface['name'], device.vm_name))
+                return 'FAIL'
+            payload = self.__strip(actual[0])
+            payload['id'] = '{nic_id}'
+            if nic['ip'] is not None:
+                payload['ipv4'] = {'static': {'address': '{ip}', 'netmask': '{netmask}'}}
+            template['interfaces'].append({'name': interface['name'], 'payload': payload})
+        device.update_gw_stat_route()
+        for static_route in device.traffic_routes:
+            actual = [route for route in state['routes'] if route_matches(route, static_route['interface'],
+                                                                          static_route['network'],
+                                                                          static_route['gateway'])]
+            if not actual:
+                logger.info("Route %s of %s is not as desired, template not captured" %
+                            (static_route['network'], device.vm_name))
+                return 'FAIL'
+            payload = self.__strip(actual[0])
+            # Gateway is per subnet, literal or host object of it is set on replay
+            payload.pop('gateway', None)
+            template['routes'].append({'interface': static_route['interface'], 'payload': payload})
+        if self.store.add(self.key, template, ttl=const.DEVICE_TEMPLATE_TTL):
+            logger.info("Configuration of %s captured as device template" % device.vm_name)
+        return 'SUCCESS'
+
+    def replay(self):
+        """
+        Purpose:    To configure device from template of group, only interfaces, Geneve objects & routes device
+                    lacks are written, payloads are prepared upfront & sent concurrently
+        Parameters:
+        Returns:    SUCCESS, FAIL
+        Raises:
+        """
+        if self.key is None:
+            return 'FAIL'
+        template = self.store.get(self.key)
+        if template is None:
+            logger.info("No device template for configuration of group yet")
+            return 'FAIL'
+        device = self.device
+        # Earlier attempt of this device may have configured part of it, e.g. on retry or re-delivery
+        reconciler = ConfigReconciler(device, self.geneve)
+        changes = self.__fetch_changes(reconciler)
+        if changes is None:
+            return 'FAIL'
+        try:
+            interfaces = []
+            config = {interface['name']: interface for interface in device.interface_config}
+            missing = [interface['name'] for interface in changes['interfaces']]
+            for entry in template['interfaces']:
+                if entry['name'] in missing:
+                    nic = device.get_desired_nic(config[entry['name']])
+                    interfaces.append((nic['nic_id'], utl.fill_template(entry['payload'], nic)))
+            # Template routes are in order of traffic routes, both being part of template key
+            if len(template['routes']) != len(device.traffic_routes):
+                raise ValueError("Template has %d routes" % len(template['routes']))
+            routes = []
+            for entry, static_route in zip(template['routes'], device.traffic_routes):
+                if static_route in changes['routes']:
+                    payload = dict(entry['payload'])
+                    payload['gateway'] = self.fmc.get_gateway(static_route['gateway'])
+                    routes.append(payload)
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error("Device template does not fit %s: %s" % (device.vm_name, repr(e)))
+            self.invalidate()
+            return 'FAIL'
+
+        afmc = AsyncFirepowerManagementCenter(self.fmc)
+        failed = False
+        if len(interfaces) > 0:
+            responses = afmc.run(*[afmc.put_physical_interface(device.device_id, nic_id, payload)
+                                   for nic_id, payload in interfaces], return_exceptions=True)
+            failed = self.__failed(responses, (200,))
+        if not failed and reconciler.apply_geneve(changes['vtep'], changes['vni']) != 'SUCCESS':
+            failed = True
+        if not failed and len(routes) > 0:
+            responses = afmc.run(*[afmc.post_static_route(device.device_id, payload) for payload in routes],
+                                 return_exceptions=True)
+            failed = self.__failed(responses, (200, 201))
+        if failed:
+            return self.__recover(reconciler)
+        logger.info("%s configured from device template" % device.vm_name)
+        return 'SUCCESS'
+
+    def __fetch_changes(self, reconciler):
+        try:
+            return reconciler.diff(self.fmc.get_device_state(self.device.device_id, self.geneve))
+        except (ValueError, KeyError, requests.exceptions.RequestException) as e:
+            logger.error("Unable to compute configuration changes: " + repr(e))
+            return None
+
+    def __failed(self, responses, ok_codes):
+        for r in responses:
+            if isinstance(r, Exception) or r is None or r.status_code not in ok_codes:
+                logger.error("Configuration from device template failed: " +
+                             (repr(r) if isinstance(r, Exception) or r is None else r.text))
+                if r is not None and not isinstance(r, Exception) and r.status_code in (400, 404, 422):
+                    self.rejected = True
+                return True
+        return False
+
+    def __recover(self, reconciler):
+        # Writes may conflict with those of a concurrent attempt of this device, it is configured then
+        changes = self.__fetch_changes(reconciler)
+        if changes is None:
+            return 'FAIL'
+        if not (changes['interfaces'] or changes['vtep'] or changes['vni'] or changes['routes']):
+            logger.info("%s configured from device template by an earlier attempt" % self.device.vm_name)
+            return 'SUCCESS'
+        if self.rejected:
+            # Objects referred by template may be gone, template is captured again later
+            self.invalidate()
+        return 'FAIL'
+
+    def invalidate(self):
+        """
+        Purpose:    To delete template of group
+        Parameters:
+        Returns:
+        Raises:
+        """
+        self.store.delete(self.key)
+        return
+
+
 class ParamikoSSH:
     """
         This Python class supposed to handle interactive SSH session
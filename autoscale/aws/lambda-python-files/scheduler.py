@@ -0,0 +1,198 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       scheduler.py
+Purpose:    This python file has scheduler classes, which deliver AutoScale Manager messages after a delay
+            so that Lambda does not sleep (and get billed) while NGFWv or FMC is busy
+"""
+
+import os
+import json
+import time
+import boto3
+import constant as const
+import utility as utl
+import store
+from aws import SimpleNotificationService
+
+logger = utl.setup_logging()
+
+# Scheduler object kept at module scope, so warm invocations re-use it
+manager_scheduler = None
+
+
+def get_remaining_delay(message):
+    """
+    Purpose:    To get seconds a message has to wait still, delay longer than SQS allows is waited out in hops
+    Parameters: Message dict
+    Returns:    Seconds, 0 if message is due
+    Raises:
+    """
+    try:
+        return max(0, int(message.get('not_before', 0)) - int(time.time()))
+    except (TypeError, ValueError):
+        return 0
+
+
+class SqsDelayScheduler:
+    """
+        SqsDelayScheduler class sends message to AutoScale Manager queue with DelaySeconds,
+        delay over SQS limit is sent with 'not_before' & re-sent for remaining time on delivery
+    """
+    def __init__(self, queue_url):
+        self.queue_url = queue_url
+        self.sqs_client = boto3.client('sqs')
+
+    def schedule(self, subject, message, delay=0):
+        """
+        Purpose:    To deliver message to AutoScale Manager after delay
+        Parameters: Subject, Message dict, Seconds
+        Returns:    True if sent, else False
+        Raises:
+        """
+        delay = max(0, int(delay))
+        if delay > const.SQS_MAX_DELAY or 'not_before' in message:
+            message = dict(message)
+            message['not_before'] = str(int(time.time()) + delay)
+        logger.debug("Scheduling '%s' after %d seconds" % (subject, delay))
+        try:
+            # Queue has raw message delivery, so body is same as SNS message
+            self.sqs_client.send_message(
+                QueueUrl=self.queue_url,
+                MessageBody=json.dumps(message, sort_keys=True),
+                DelaySeconds=min(delay, const.SQS_MAX_DELAY)
+            )
+            return True
+        except Exception as e:
+            logger.critical("Error occurred: {}".format(repr(e)))
+            logger.error("Unable to send message to SQS queue: %s" % self.queue_url)
+            return False
+
+
+class StoreScheduler:
+    """
+        StoreScheduler class keeps delayed message in shared store & publishes it to AutoScale Manager topic
+        from cron run of AutoScale Manager once it is due, used when AutoScale Manager queue is not known
+        A message is kept per instance & function, delivery is as late as cron rate
+    """
+    def __init__(self, topic_arn):
+        self.topic_arn = topic_arn
+        self.store = store.get_shared_store()
+
+    @staticmethod
+    def __key(instance_id, to_function):
+        return 'scheduled-message:' + instance_id + ':' + to_function
+
+    def schedule(self, subject, message, delay=0):
+        """
+        Purpose:    To deliver message to AutoScale Manager after delay
+        Parameters: Subject, Message dict, Seconds
+        Returns:    True if published or kept, else False
+        Raises:
+        """
+        delay = max(0, int(delay))
+        if delay == 0:
+            return SimpleNotificationService().publish_to_topic(self.topic_arn, subject, message) is not None
+        logger.debug("Keeping '%s' for %d seconds, till a cron run after it" % (subject, delay))
+        try:
+            self.store.put(self.__key(message['instance_id'], message['to_function']),
+                           {'due': int(time.time()) + delay, 'subject': subject, 'message': message},
+                           ttl=delay + const.SCHEDULED_MESSAGE_TTL)
+            return True
+        except Exception as e:
+            logger.critical("Error occurred: {}".format(repr(e)))
+            logger.error("Unable to keep message '%s' in shared store" % subject)
+            return False
+
+    def deliver_due_messages(self, instance_ids, functions, now=None):
+        """
+        Purpose:    To publish kept messages whose delay is over
+        Parameters: Instance ids, Function names(to_function of messages), Time(default now)
+        Returns:    Number of published messages
+        Raises:
+        """
+        now = time.time() if now is None else now
+        delivered = 0
+        sns = SimpleNotificationService()
+        for instance_id in instance_ids:
+            for to_function in functions:
+                key = self.__key(instance_id, to_function)
+                try:
+                    scheduled = self.store.get(key)
+                    if scheduled is None or scheduled['due'] > now:
+                        continue
+                    # Deleted before publish, a message is delivered at most once from cron
+                    self.store.delete(key)
+                except Exception as e:
+                    logger.error("Unable to read scheduled %s message of %s: %s" % (to_function, instance_id, str(e)))
+                    continue
+                if sns.publish_to_topic(self.topic_arn, scheduled['subject'], scheduled['message']) is not None:
+                    delivered += 1
+        return delivered
+
+
+class LocalScheduler:
+    """
+        LocalScheduler class keeps scheduled messages in process, stand-in for queue
+        Due messages are taken by caller & handed to AutoScale Manager handler
+    """
+    def __init__(self):
+        self.messages = []
+
+    def schedule(self, subject, message, delay=0):
+        """
+        Purpose:    To keep message till its delay is over
+        Parameters: Subject, Message dict, Seconds
+        Returns:    True
+        Raises:
+        """
+        self.messages.append({'due': time.time() + max(0, delay), 'subject': subject, 'message': dict(message)})
+        return True
+
+    def get_due_messages(self, now=None):
+        """
+        Purpose:    To take messages whose delay is over
+        Parameters: Time(default now)
+        Returns:    list of Message dicts, in order of due time
+        Raises:
+        """
+        now = time.time() if now is None else now
+        due = sorted([m for m in self.messages if m['due'] <= now], key=lambda m: m['due'])
+        self.messages = [m for m in self.messages if m['due'] > now]
+        return [m['message'] for m in due]
+
+
+def get_scheduler(topic_arn):
+    """
+    Purpose:    To get scheduler of AutoScale Manager messages
+                SQS queue is used if its URL is given in environment, else messages are kept in shared store
+    Parameters: AutoScale Manager topic ARN
+    Returns:    SqsDelayScheduler, StoreScheduler or LocalScheduler object
+    Raises:
+    """
+    global manager_scheduler
+    if manager_scheduler is None:
+        queue_url = os.environ.get(const.MANAGER_QUEUE_ENV, '')
+        if queue_url != '':
+            logger.debug("Using SQS queue %s to schedule messages" % queue_url)
+            manager_scheduler = SqsDelayScheduler(queue_url)
+        else:
+            logger.warning("%s is not set, delayed messages are delivered by AutoScale Manager cron run"
+                           % const.MANAGER_QUEUE_ENV)
+            manager_scheduler = StoreScheduler(topic_arn)
+    return manager_scheduler
@@ -0,0 +1,280 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       store.py
+Purpose:    This python file has key-value store classes used to share state
+            between NGFWv AutoScale Lambda functions & their warm invocations
+"""
+
+import os
+import json
+import time
+import fcntl
+import boto3
+from botocore.exceptions import ClientError
+import constant as const
+import utility as utl
+
+logger = utl.setup_logging()
+
+# Store object kept at module scope, so warm invocations re-use it
+shared_store = None
+
+
+class LocalFileStore:
+    """
+        LocalFileStore class is a JSON file based key-value store, stand-in for DynamoDB table
+        File lives in Lambda '/tmp', hence it is shared only by invocations of same container
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = path + '.lock'
+
+    def __read(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def __write(self, data):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def get(self, key):
+        """
+        Purpose:    To get value of a key
+        Parameters: Key
+        Returns:    Value, None if key is absent or expired
+        Raises:
+        """
+        item = self.__read().get(key)
+        if item is None:
+            return None
+        if item['expires_at'] is not None and item['expires_at'] < time.time():
+            return None
+        return item['value']
+
+    def put(self, key, value, ttl=None):
+        """
+        Purpose:    To put value of a key
+        Parameters: Key, Value(json serializable), Time to live in seconds
+        Returns:
+        Raises:
+        """
+        expires_at = time.time() + ttl if ttl is not None else None
+        with open(self.lock_path, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            data = self.__read()
+            data[key] = {'value': value, 'expires_at': expires_at}
+            self.__write(data)
+        return
+
+    def add(self, key, value, ttl=None):
+        """
+        Purpose:    To put value of a key, only if key is absent or expired
+        Parameters: Key, Value(json serializable), Time to live in seconds
+        Returns:    True if added, False if key already exists
+        Raises:
+        """
+        expires_at = time.time() + ttl if ttl is not None else None
+        with open(self.lock_path, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            data = self.__read()
+            item = data.get(key)
+            if item is not None and (item['expires_at'] is None or item['expires_at'] >= time.time()):
+                return False
+            data[key] = {'value': value, 'expires_at': expires_at}
+            self.__write(data)
+        return True
+
+    def incr(self, key, ttl=None):
+        """
+        Purpose:    To increment counter value of a key, counter starts at 0 if key is absent or expired
+        Parameters: Key, Time to live in seconds(set when counter is created)
+        Returns:    Incremented value
+        Raises:
+        """
+        with open(self.lock_path, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            data = self.__read()
+            item = data.get(key)
+            if item is None or (item['expires_at'] is not None and item['expires_at'] < time.time()):
+                item = {'value': 0, 'expires_at': time.time() + ttl if ttl is not None else None}
+            item['value'] += 1
+            data[key] = item
+            self.__write(data)
+        return item['value']
+
+    def delete(self, key):
+        """
+        Purpose:    To delete a key
+        Parameters: Key
+        Returns:
+        Raises:
+        """
+        with open(self.lock_path, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            data = self.__read()
+            if data.pop(key, None) is not None:
+                self.__write(data)
+        return
+
+    def delete_if(self, key, value):
+        """
+        Purpose:    To delete a key, only if it has given value
+        Parameters: Key, Value
+        Returns:    True if deleted, False if key is absent or has other value
+        Raises:
+        """
+        with open(self.lock_path, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            data = self.__read()
+            item = data.get(key)
+            if item is None or item['value'] != value:
+                return False
+            del data[key]
+            self.__write(data)
+        return True
+
+
+class DynamoDbStore:
+    """
+        DynamoDbStore class is a key-value store on a DynamoDB table,
+        Table needs a string partition key named 'key', 'expires_at' can be enabled as table TTL attribute
+    """
+    def __init__(self, table_name):
+        self.table = boto3.resource('dynamodb').Table(table_name)
+
+    def get(self, key):
+        """
+        Purpose:    To get value of a key
+        Parameters: Key
+        Returns:    Value, None if key is absent or expired
+        Raises:
+        """
+        r = self.table.get_item(Key={'key': key}, ConsistentRead=True)
+        item = r.get('Item')
+        if item is None:
+            return None
+        # DynamoDB TTL deletion is lazy, hence expiry is checked here as well
+        if 'expires_at' in item and int(item['expires_at']) < time.time():
+            return None
+        return json.loads(item['value'])
+
+    def put(self, key, value, ttl=None):
+        """
+        Purpose:    To put value of a key
+        Parameters: Key, Value(json serializable), Time to live in seconds
+        Returns:
+        Raises:
+        """
+        item = {'key': key, 'value': json.dumps(value, separators=(',', ':'))}
+        if ttl is not None:
+            item['expires_at'] = int(time.time() + ttl)
+        self.table.put_item(Item=item)
+        return
+
+    def add(self, key, value, ttl=None):
+        """
+        Purpose:    To put value of a key, only if key is absent or expired
+        Parameters: Key, Value(json serializable), Time to live in seconds
+        Returns:    True if added, False if key already exists
+        Raises:
+        """
+        item = {'key': key, 'value': json.dumps(value, separators=(',', ':'))}
+        if ttl is not None:
+            item['expires_at'] = int(time.time() + ttl)
+        try:
+            self.table.put_item(Item=item,
+                                ConditionExpression='attribute_not_exists(#k) OR expires_at < :now',
+                                ExpressionAttributeNames={'#k': 'key'},
+                                ExpressionAttributeValues={':now': int(time.time())})
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+        return True
+
+    def incr(self, key, ttl=None):
+        """
+        Purpose:    To increment counter value of a key atomically, counter starts at 0 if key is absent
+        Parameters: Key, Time to live in seconds(set when counter is created)
+        Returns:    Incremented value
+        Raises:
+        """
+        update_expression = 'ADD #c :one'
+        values = {':one': 1}
+        if ttl is not None:
+            update_expression += ' SET expires_at = if_not_exists(expires_at, :expires_at)'
+            values[':expires_at'] = int(time.time() + ttl)
+        r = self.table.update_item(Key={'key': key}, UpdateExpression=update_expression,
+                                   ExpressionAttributeNames={'#c': 'counter'}, ExpressionAttributeValues=values,
+                                   ReturnValues='UPDATED_NEW')
+        return int(r['Attributes']['counter'])
+
+    def delete(self, key):
+        """
+        Purpose:    To delete a key
+        Parameters: Key
+        Returns:
+        Raises:
+        """
+        self.table.delete_item(Key={'key': key})
+        return
+
+    def delete_if(self, key, value):
+        """
+        Purpose:    To delete a key, only if it has given value
+        Parameters: Key, Value
+        Returns:    True if deleted, False if key is absent or has other value
+        Raises:
+        """
+        try:
+            self.table.delete_item(Key={'key': key}, ConditionExpression='#v = :value',
+                                   ExpressionAttributeNames={'#v': 'value'},
+                                   ExpressionAttributeValues={':value': json.dumps(value, separators=(',', ':'))})
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+        return True
+
+
+def get_shared_store():
+    """
+    Purpose:    To get store shared by Lambda functions of this deployment
+                DynamoDB table is used if its name is given in environment, else a local file in /tmp
+    Parameters:
+    Returns:    DynamoDbStore or LocalFileStore object
+    Raises:
+    """
+    global shared_store
+    if shared_store is None:
+        table_name = os.environ.get(const.SHARED_STORE_TABLE_ENV, '')
+        if table_name != '':
+            logger.debug("Using DynamoDB table %s as shared store" % table_name)
+            shared_store = DynamoDbStore(table_name)
+        else:
+            # Locks, de-duplication & shared state hold only within this container
+            logger.warning("%s is not set, shared store is a local file %s, state is not shared between "
+                           "Lambda containers" % (const.SHARED_STORE_TABLE_ENV, const.LOCAL_STORE_FILE))
+            shared_store = LocalFileStore(const.LOCAL_STORE_FILE)
+    return shared_store
@@ -23,6 +23,7 @@ Purpose:    All static methods without class are written here
 
 import os
 import sys
+import time
 import logging
 import json
 import re
@@ -142,10 +143,10 @@ def get_user_input_lifecycle_ftdv():
     return user_input
 
 
-def get_user_input_custom_metric():
+def get_user_input_custom_metric(decrypt=True):
     """
     Purpose:    To get user input for custom metric publisher
-    Parameters:
+    Parameters: False to leave password encrypted, for lazy decryption
     Returns:
     Raises:
     """
@@ -168,9 +169,10 @@ def get_user_input_custom_metric():
             raise ValueError("Unable to find FMC_DEVICE_GRP in os.env")
 
         user_input['FmcServer'] = os.environ['FMC_SERVER']
-        if re.match(r'^(?:(25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9][0-9]|[0-9])(\.(?!$)|$)){4}$',
-                    user_input['FmcServer']) is None:
-            raise ValueError("Unable to find valid FMC_SERVER in os.env, should be a valid IP")
+        # Pool of FMCs is given as IPs separated by ','
+        for fmc_server in get_fmc_server_list(user_input['FmcServer']) or ['']:
+            if re.match(r'^(?:(25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9][0-9]|[0-9])(\.(?!$)|$)){4}$', fmc_server) is None:
+                raise ValueError("Unable to find valid FMC_SERVER in os.env, should be valid IP(s) separated by ','")
 
         user_input['FmcMetUserName'] = os.environ['FMC_MET_USERNAME']
         if re.match(r'..*', user_input['FmcMetUserName']) is None:
@@ -188,7 +190,8 @@ def get_user_input_custom_metric():
             raise ValueError("Unable to find FMC_MET_PASSWORD in os.env")
         try:
             if os.environ['KMS_ENC'] is not None:
-                user_input['FmcMetPassword'] = get_decrypted_key(user_input['FmcMetPassword'])
+                if decrypt:
+                    user_input['FmcMetPassword'] = get_decrypted_key(user_input['FmcMetPassword'])
             else:
                 logger.critical("Issue with KMS ARN in os.env")
                 pass
@@ -201,10 +204,10 @@ def get_user_input_custom_metric():
     return user_input
 
 
-def get_user_input_manager():
+def get_user_input_manager(decrypt=True, validator=validate):
     """
     Purpose:    This evaluates & takes User inputs from OS env & JSON
-    Parameters:
+    Parameters: False to leave passwords encrypted for lazy decryption, Schema validation function
     Returns:    OS Environment & JSON variables as JSON object
     Raises:
     """
@@ -260,7 +263,7 @@ def get_user_input_manager():
                 },
                 "FmcIp": {
                     "type": "string",
-                    "pattern": "^(?:(25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9][0-9]|[0-9])(\\.(?!$)|$)){4}$"
+                    "pattern": "^(?:(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9][0-9]|[0-9])\\.){3}(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9][0-9]|[0-9])(,(?:(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9][0-9]|[0-9])\\.){3}(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9][0-9]|[0-9]))*$"
                 },
                 "FmcUserName": {
                     "type": "string",
@@ -316,7 +319,7 @@ def get_user_input_manager():
                 },
                 "fmcIpforDeviceReg":{
                     "type":"string",
-                    "pattern":"^((DONTRESOLVE)|((?:(25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9][0-9]|[0-9])(\\.(?!$)|$)){4}))$"
+                    "pattern":"^((DONTRESOLVE)|((?:(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9][0-9]|[0-9])\\.){3}(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9][0-9]|[0-9])(,(?:(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9][0-9]|[0-9])\\.){3}(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9][0-9]|[0-9]))*))$"
                 },
                 "RegistrationId":{
                     "type":"string",
@@ -484,7 +487,7 @@ def get_user_input_manager():
                 },
                 "FmcIp": {
                     "type": "string",
-                    "pattern": "^(?:(25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9][0-9]|[0-9])(\\.(?!$)|$)){4}$"
+                    "pattern": "^(?:(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9][0-9]|[0-9])\\.){3}(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9][0-9]|[0-9])(,(?:(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9][0-9]|[0-9])\\.){3}(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9][0-9]|[0-9]))*$"
                 },
                 "FmcUserName": {
                     "type": "string",
@@ -540,7 +543,7 @@ def get_user_input_manager():
                 },
                 "fmcIpforDeviceReg": {
                     "type": "string",
-                    "pattern": "^((DONTRESOLVE)|((?:(25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9][0-9]|[0-9])(\\.(?!$)|$)){4}))$"
+                    "pattern": "^((DONTRESOLVE)|((?:(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9][0-9]|[0-9])\\.){3}(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9][0-9]|[0-9])(,(?:(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9][0-9]|[0-9])\\.){3}(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9][0-9]|[0-9]))*))$"
                 },
                 "RegistrationId": {
                     "type": "string",
@@ -703,7 +706,8 @@ def get_user_input_manager():
         env_var['FmcPassword'] = os.environ['FMC_PASSWORD']
         try:
             if os.environ['KMS_ENC'] is not None:
-                env_var['FmcPassword'] = get_decrypted_key(env_var['FmcPassword'])
+                if decrypt:
+                    env_var['FmcPassword'] = get_decrypted_key(env_var['FmcPassword'])
             else:
                 logger.critical("Issue with KMS ARN in template")
                 pass
@@ -714,7 +718,8 @@ def get_user_input_manager():
         env_var['NgfwPassword'] = os.environ['FTD_PASSWORD']
         try:
             if os.environ['KMS_ENC'] is not None:
-                env_var['NgfwPassword'] = get_decrypted_key(env_var['NgfwPassword'])
+                if decrypt:
+                    env_var['NgfwPassword'] = get_decrypted_key(env_var['NgfwPassword'])
             else:
                 logger.critical("Issue with KMS ARN in template")
                 pass
@@ -736,7 +741,7 @@ def get_user_input_manager():
         logger.exception(e)
 
     try:
-        validate(env_var, schema=schema1)
+        validator(env_var, schema1)
     except jsonschema.exceptions.ValidationError as e:
         logger.exception(e)
         logger.error("os.env has invalid values for keys")
@@ -747,7 +752,7 @@ def get_user_input_manager():
         with open(const.JSON_LOCAL_FILENAME) as json_file:
             json_var = json.load(json_file)
             logger.debug("User provided JSON Configuration: " + json.dumps(json_var, separators=(',', ':')))
-            validate(json_var, schema=schema2)
+            validator(json_var, schema2)
     except jsonschema.exceptions.ValidationError as e:
         logger.exception(e)
         logger.error("JSON file validation failed against schema")
@@ -857,6 +862,32 @@ def get_gateway_from_cidr(cidr):
         return str(n[1])
 
 
+def fill_template(template, values):
+    """
+    Purpose:    To substitute placeholders in a template, placeholder is a string '{name}' of whole value
+    Parameters: Template (dict/list/str), dict of values by name
+    Returns:    Copy of template with values substituted
+    Raises:     KeyError, if value of a placeholder is not given
+    """
+    if isinstance(template, dict):
+        return {k: fill_template(v, values) for k, v in template.items()}
+    if isinstance(template, list):
+        return [fill_template(v, values) for v in template]
+    if isinstance(template, str) and re.fullmatch(r'\{\w+\}', template):
+        return values[template[1:-1]]
+    return template
+
+
+def get_fmc_server_list(fmc_server):
+    """
+    Purpose:    To get FMCs of pool from FMC_SERVER value, pool of FMCs is given as IPs separated by ','
+    Parameters: FMC_SERVER value
+    Returns:    list of FMC servers
+    Raises:
+    """
+    return [server.strip() for server in fmc_server.split(',') if server.strip() != '']
+
+
 def intersection(lst1, lst2):
     """
     Purpose:    To get intersection of two list
@@ -898,3 +929,73 @@ def find_value_in_list(l_r, value):
 
 # Run for this file too
 logger = setup_logging()
+
+
+def put_emf_metric(metric_name, value, unit, dimensions=None):
+    """
+    Purpose:    To publish a metric by writing CloudWatch Embedded Metric Format record to Lambda log
+                (no API call needed, CloudWatch extracts the metric from log)
+    Parameters: Metric name, Value, Unit, dict of dimensions
+    Returns:
+    Raises:
+    """
+    dimensions = dimensions if dimensions is not None else {}
+    record = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": const.FMC_METRIC_NAME_SPACE,
+                "Dimensions": [list(dimensions.keys())],
+                "Metrics": [{"Name": metric_name, "Unit": unit}]
+            }]
+        },
+        metric_name: value
+    }
+    record.update(dimensions)
+    # Printed as is, log formatter prefix would break EMF parsing
+    print(json.dumps(record, separators=(',', ':')))
+    return
+
+
+def put_emf_call_stats(records):
+    """
+    Purpose:    To publish FMC call stats aggregates as CloudWatch Embedded Metric Format records
+                Latency is published as array of values, so CloudWatch gives p50/p99 per Endpoint & Method
+    Parameters: Aggregates from ftdv_fmc CallStats.drain
+    Returns:
+    Raises:
+    """
+    for stat in records:
+        # EMF takes at most 100 values per metric, histogram counts are scaled down to fit
+        scale = min(1.0, 100.0 / stat['Count'])
+        latencies = []
+        for value, count in zip(stat['Values'], stat['Counts']):
+            latencies.extend([value] * max(1, int(count * scale)))
+        record = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": const.FMC_METRIC_NAME_SPACE,
+                    "Dimensions": [["Endpoint", "Method"]],
+                    "Metrics": [
+                        {"Name": "FmcCallLatency", "Unit": "Milliseconds"},
+                        {"Name": "FmcCalls", "Unit": "Count"},
+                        {"Name": "FmcCallErrors", "Unit": "Count"},
+                        {"Name": "FmcCallBytes", "Unit": "Bytes"},
+                        {"Name": "FmcCallRetries", "Unit": "Count"}
+                    ]
+                }]
+            },
+            "Endpoint": stat['Endpoint'],
+            "Method": stat['Method'],
+            "Status": stat['Status'],
+            "FmcCallLatency": latencies[:100],
+            "FmcCalls": stat['Count'],
+            "FmcCallErrors": stat['Errors'],
+            "FmcCallBytes": stat['Bytes'],
+            "FmcCallRetries": stat['Retries'],
+            "LatencyP50": stat['P50'],
+            "LatencyP99": stat['P99']
+        }
+        print(json.dumps(record, separators=(',', ':')))
+    return
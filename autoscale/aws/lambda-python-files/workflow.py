@@ -0,0 +1,308 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       workflow.py
+Purpose:    This python file has durable workflow of an instance through AutoScale Manager stages
+            State is checkpointed in shared store, so a retry resumes where it left off
+"""
+
+import time
+import uuid
+import constant as const
+import utility as utl
+import store
+
+logger = utl.setup_logging()
+
+# Stages in order, retry count of each is at same index in const.TO_FUN_RETRY_COUNT
+workflow_steps = ['vm_ready', 'vm_register', 'vm_configure', 'vm_deploy', 'vm_delete']
+WORKFLOW_DONE = 'done'
+
+
+class InstanceWorkflow:
+    """
+        InstanceWorkflow class keeps state record of an instance going through manager stages
+        Record has step, attempt, next run time & context cached by earlier stages (device id, Nic ids, zone ids, IPs)
+        Store is pluggable, shared store(DynamoDB or local file) is used by default
+    """
+    def __init__(self, instance_id, state_store=None):
+        self.instance_id = instance_id
+        self.store = state_store if state_store is not None else store.get_shared_store()
+        self.key = 'workflow:' + instance_id
+        self.state = None
+
+    def load(self):
+        """
+        Purpose:    To read state record of instance
+        Parameters:
+        Returns:    State dict or None, if instance has no workflow
+        Raises:
+        """
+        try:
+            self.state = self.store.get(self.key)
+        except Exception as e:
+            logger.error("Unable to read workflow of %s: %s" % (self.instance_id, str(e)))
+            self.state = None
+        return self.state
+
+    def save(self):
+        """
+        Purpose:    To checkpoint state record of instance
+        Parameters:
+        Returns:    True if saved, else False
+        Raises:
+        """
+        self.state['updated'] = int(time.time())
+        try:
+            self.store.put(self.key, self.state, ttl=const.WORKFLOW_TTL)
+        except Exception as e:
+            logger.error("Unable to save workflow of %s: %s" % (self.instance_id, str(e)))
+            return False
+        return True
+
+    def start(self, step, context=None, attempt=0):
+        """
+        Purpose:    To start workflow of instance at a step, earlier state is dropped
+        Parameters: Step, Context, Attempts already made
+        Returns:
+        Raises:
+        """
+        self.state = {
+            'step': step,
+            'attempt': attempt,
+            'next_run': int(time.time()),
+            'context': context or {}
+        }
+        return
+
+    def create(self, step, context=None):
+        """
+        Purpose:    To start workflow of instance at a step, only if instance has no workflow yet
+        Parameters: Step, Context
+        Returns:    True if created(or store is not usable), False if instance already has a workflow
+        Raises:
+        """
+        self.start(step, context)
+        self.state['updated'] = int(time.time())
+        try:
+            if self.store.add(self.key, self.state, ttl=const.WORKFLOW_TTL):
+                return True
+        except Exception as e:
+            logger.error("Unable to create workflow of %s: %s" % (self.instance_id, str(e)))
+            return True
+        self.load()
+        return False
+
+    def get_step(self):
+        """
+        Purpose:    To get current step
+        Parameters:
+        Returns:    Step or None, if instance has no workflow
+        Raises:
+        """
+        return self.state['step'] if self.state is not None else None
+
+    def get_context(self):
+        """
+        Purpose:    To get context cached by earlier stages
+        Parameters:
+        Returns:    dict
+        Raises:
+        """
+        return self.state['context'] if self.state is not None else {}
+
+    def retries_left(self):
+        """
+        Purpose:    To get retries left for current step, same as 'counter' of SNS message
+        Parameters:
+        Returns:    Count
+        Raises:
+        """
+        return const.TO_FUN_RETRY_COUNT[workflow_steps.index(self.state['step'])] - self.state['attempt']
+
+    def update_context(self, context):
+        """
+        Purpose:    To cache what a stage discovered, for later stages
+        Parameters: dict
+        Returns:
+        Raises:
+        """
+        self.state['context'].update(context)
+        return
+
+    def advance(self, step, delay=0):
+        """
+        Purpose:    To move workflow to given step with its retry count reset
+        Parameters: Step, Seconds after which step is due
+        Returns:
+        Raises:
+        """
+        self.state['step'] = step
+        self.state['attempt'] = 0
+        self.state['next_run'] = int(time.time() + delay)
+        return
+
+    def retry(self, delay=0):
+        """
+        Purpose:    To count a failed attempt of current step
+        Parameters: Seconds after which step is due again
+        Returns:
+        Raises:
+        """
+        self.state['attempt'] += 1
+        self.state['next_run'] = int(time.time() + delay)
+        return
+
+    def reschedule(self, delay=0):
+        """
+        Purpose:    To move due time of current step, without counting an attempt
+        Parameters: Seconds after which step is due
+        Returns:
+        Raises:
+        """
+        self.state['next_run'] = int(time.time() + delay)
+        return
+
+    def complete(self):
+        """
+        Purpose:    To mark workflow done, record expires after WORKFLOW_TTL
+        Parameters:
+        Returns:
+        Raises:
+        """
+        self.state['step'] = WORKFLOW_DONE
+        self.state['next_run'] = None
+        return
+
+    def is_stalled(self):
+        """
+        Purpose:    To find if due step has not been checkpointed for WORKFLOW_STALL_TIME,
+                    i.e. its SNS message or Lambda run is lost
+        Parameters:
+        Returns:    True or False
+        Raises:
+        """
+        if self.state is None or self.state['next_run'] is None:
+            return False
+        return self.state['next_run'] + const.WORKFLOW_STALL_TIME < time.time()
+
+    def finish(self):
+        """
+        Purpose:    To drop state record of a deleted instance
+        Parameters:
+        Returns:
+        Raises:
+        """
+        try:
+            self.store.delete(self.key)
+        except Exception as e:
+            logger.error("Unable to drop workflow of %s: %s" % (self.instance_id, str(e)))
+        self.state = None
+        return
+
+
+class InstanceLease:
+    """
+        InstanceLease class serializes manager work on an instance by a leased lock in shared store
+        & claims idempotency keys of messages, so that a message delivered more than once is handled once
+        Conditional writes of shared store(DynamoDB or local file stand-in) make both atomic
+        Lease holds a random owner token, so that a worker whose lease expired can't release lease of next holder
+    """
+    def __init__(self, instance_id, state_store=None):
+        self.instance_id = instance_id
+        self.store = state_store if state_store is not None else store.get_shared_store()
+        self.key = 'instance-lease:' + instance_id
+        self.token = None
+        self.held = False
+
+    def acquire(self, wait=0):
+        """
+        Purpose:    To take lease on instance, waiting for current holder to release it
+        Parameters: Seconds to wait
+        Returns:    True if lease is taken(or store is not usable), False if instance stays leased
+        Raises:
+        """
+        wait_until = time.time() + wait
+        self.token = uuid.uuid4().hex
+        while True:
+            try:
+                self.held = self.store.add(self.key, self.token, ttl=const.INSTANCE_LEASE_TTL)
+            except Exception as e:
+                # Work is not blocked when store is not usable
+                logger.error("Unable to lease instance %s: %s" % (self.instance_id, str(e)))
+                return True
+            if self.held or time.time() >= wait_until:
+                return self.held
+            time.sleep(const.INSTANCE_LEASE_POLL)
+
+    def release(self):
+        """
+        Purpose:    To release own lease on instance, lease taken by another worker after own one expired is kept
+        Parameters:
+        Returns:
+        Raises:
+        """
+        if not self.held:
+            return
+        try:
+            if not self.store.delete_if(self.key, self.token):
+                logger.warning("Lease on instance %s expired before release" % self.instance_id)
+        except Exception as e:
+            logger.error("Unable to release lease on instance %s: %s" % (self.instance_id, str(e)))
+        self.held = False
+        return
+
+    def is_held(self):
+        """
+        Purpose:    To find if some worker is working on instance
+        Parameters:
+        Returns:    True or False
+        Raises:
+        """
+        try:
+            return self.store.get(self.key) is not None
+        except Exception as e:
+            logger.error("Unable to read lease on instance %s: %s" % (self.instance_id, str(e)))
+            return False
+
+    def claim(self, message_key):
+        """
+        Purpose:    To claim idempotency key of a message, only first delivery of a message gets it
+        Parameters: Key of message (stage, counter & re-publish counts)
+        Returns:    True if claimed, False if message is already claimed
+        Raises:
+        """
+        try:
+            return self.store.add('message-claim:' + self.instance_id + ':' + message_key, int(time.time()),
+                                  ttl=const.MESSAGE_CLAIM_TTL)
+        except Exception as e:
+            logger.error("Unable to claim message of instance %s: %s" % (self.instance_id, str(e)))
+            return True
+
+    def unclaim(self, message_key):
+        """
+        Purpose:    To drop claim of a message which failed, so that its re-delivery is handled
+        Parameters: Key of message
+        Returns:
+        Raises:
+        """
+        try:
+            self.store.delete('message-claim:' + self.instance_id + ':' + message_key)
+        except Exception as e:
+            logger.error("Unable to drop claim of message of instance %s: %s" % (self.instance_id, str(e)))
+        return
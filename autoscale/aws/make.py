@@ -33,6 +33,8 @@ lambda_layer_zip = 'autoscale_layer.zip'
 custom_metric_publisher_zip = 'custom_metric_fmc.zip'
 full_dir_path = os.path.dirname(os.path.realpath(__file__)) + '/'
 target_path = full_dir_path + "target/"
+# Shared FMC client package, vendored into zips which have fmc.py
+ftdv_fmc_root_path = full_dir_path + '../../'
 
 
 def print_function_name(function):
@@ -118,21 +120,26 @@ def clean():
 def zip_():
     print("zip_ creates lambda zip files with only required python files")
 
-    list_of_files = ['aws.py', 'manager.py', 'constant.py', 'ngfw.py', 'fmc.py', 'utility.py', 'Configuration.json']
+    list_of_files = ['aws.py', 'manager.py', 'constant.py', 'ngfw.py', 'fmc.py', 'store.py', 'utility.py',
+                     'workflow.py', 'scheduler.py', 'config.py', 'Configuration.json']
     cmd = 'zip -jr ' + target_path + autoscale_manager_zip + ' '
     for file in list_of_files:
         file = full_dir_path + 'lambda-python-files/' + file
         cmd = cmd + file + ' '
     execute_cmd(cmd)
+    zip_ftdv_fmc(autoscale_manager_zip)
 
-    list_of_files = ['aws.py', 'custom_metric_fmc.py', 'constant.py', 'ngfw.py', 'fmc.py', 'utility.py']
+    list_of_files = ['aws.py', 'custom_metric_fmc.py', 'constant.py', 'ngfw.py', 'fmc.py', 'store.py', 'utility.py',
+                     'config.py']
     cmd = 'zip -jr ' + target_path + custom_metric_publisher_zip + ' '
     for file in list_of_files:
         file = full_dir_path + 'lambda-python-files/' + file
         cmd = cmd + file + ' '
     execute_cmd(cmd)
+    zip_ftdv_fmc(custom_metric_publisher_zip)
 
-    list_of_files = ['aws.py', 'lifecycle_ftdv.py', 'constant.py', 'utility.py']
+    list_of_files = ['aws.py', 'lifecycle_ftdv.py', 'constant.py', 'utility.py', 'scheduler.py', 'config.py',
+                     'store.py']
     cmd = 'zip -jr ' + target_path + lifecycle_ftdv_zip + ' '
     for file in list_of_files:
         file = full_dir_path + 'lambda-python-files/' + file
@@ -142,6 +149,12 @@ def zip_():
     return
 
 
+def zip_ftdv_fmc(zip_file):
+    # Package is added with its directory, not with junked paths like other files
+    cmd = 'cd ' + ftdv_fmc_root_path + ' && zip -r ' + target_path + zip_file + ' ftdv_fmc -x "*__pycache__*"'
+    execute_cmd(cmd)
+
+
 @print_function_name
 def copy():
     print("copies contents to target directory")
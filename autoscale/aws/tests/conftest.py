@@ -0,0 +1,65 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       conftest.py
+Purpose:    pytest fixtures of NGFWv AutoScale Lambda unit tests
+            Lambda modules are flat, hence their folder & repository root(ftdv_fmc) are put on sys.path
+"""
+
+import os
+import sys
+import time
+import pytest
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(tests_dir, '..', 'lambda-python-files'))
+sys.path.insert(0, os.path.join(tests_dir, '..', '..', '..'))
+os.environ.setdefault('DEBUG_LOGS', 'disable')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import store
+
+
+class Clock:
+    """
+        Clock class is a settable time.time() stand-in, so expiry & window tests don't sleep
+        time.sleep() advances it instead of sleeping
+    """
+    def __init__(self, now):
+        self.now = float(now)
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock(1700000000)
+    monkeypatch.setattr(time, 'time', clock)
+    monkeypatch.setattr(time, 'sleep', clock.advance)
+    return clock
+
+
+@pytest.fixture
+def local_store(tmp_path, monkeypatch):
+    shared_store = store.LocalFileStore(str(tmp_path / 'store.json'))
+    monkeypatch.setattr(store, 'shared_store', shared_store)
+    return shared_store
@@ -0,0 +1,158 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       test_catalog.py
+Purpose:    Unit tests of ObjectCatalog indexes shared through store
+"""
+
+import pytest
+import constant as const
+import store
+from fmc import ObjectCatalog
+
+SERVER = 'https://fmc.example.com'
+
+
+class FakeFmc:
+    # Lists a collection as FMC does, counting bulk fetches
+    def __init__(self, items):
+        self.items = items
+        self.fetches = 0
+
+    def get_collection_items(self, collection, filter=None):
+        if filter is None:
+            self.fetches += 1
+            return list(self.items)
+        name = filter.split(':', 1)[1]
+        return [item for item in self.items if name in item['name']]
+
+
+class CountingStore(store.LocalFileStore):
+    def __init__(self, path):
+        store.LocalFileStore.__init__(self, path)
+        self.gets = 0
+
+    def get(self, key):
+        self.gets += 1
+        return store.LocalFileStore.get(self, key)
+
+
+@pytest.fixture
+def shared(tmp_path, monkeypatch):
+    shared = CountingStore(str(tmp_path / 'store.json'))
+    monkeypatch.setattr(store, 'shared_store', shared)
+    return shared
+
+
+@pytest.fixture
+def fmc():
+    return FakeFmc([{'name': 'inside-zone', 'type': 'SecurityZone', 'id': 'z-1'},
+                    {'name': 'outside-zone', 'type': 'SecurityZone', 'id': 'z-2'}])
+
+
+def test_memory_hit_does_no_store_read(shared, clock, fmc):
+    catalog = ObjectCatalog(SERVER)
+    assert catalog.lookup(fmc, 'securityzones', 'inside-zone') == 'z-1'
+    reads = shared.gets
+    for _ in range(10):
+        assert catalog.lookup(fmc, 'securityzones', 'outside-zone') == 'z-2'
+    assert shared.gets == reads
+    # Generation is checked again after a while
+    clock.advance(const.FMC_CATALOG_GENERATION_CHECK + 1)
+    catalog.lookup(fmc, 'securityzones', 'inside-zone')
+    assert shared.gets == reads + 1
+    assert fmc.fetches == 1
+
+
+def test_index_is_shared_between_containers(shared, clock, fmc):
+    ObjectCatalog(SERVER).get_index(fmc, 'securityzones')
+    assert ObjectCatalog(SERVER).lookup(fmc, 'securityzones', 'outside-zone') == 'z-2'
+    assert fmc.fetches == 1
+
+
+def test_invalidation_is_seen_by_other_containers(shared, clock, fmc):
+    catalog, other = ObjectCatalog(SERVER), ObjectCatalog(SERVER)
+    catalog.get_index(fmc, 'securityzones')
+    other.get_index(fmc, 'securityzones')
+    catalog.invalidate('securityzones')
+    # Own invalidation is seen at once
+    catalog.get_index(fmc, 'securityzones')
+    assert fmc.fetches == 2
+    # Other container trusts its memory copy till next generation check
+    other.get_index(fmc, 'securityzones')
+    assert fmc.fetches == 2
+    clock.advance(const.FMC_CATALOG_GENERATION_CHECK + 1)
+    other.invalidate('securityzones')
+    clock.advance(const.FMC_CATALOG_GENERATION_CHECK + 1)
+    catalog.get_index(fmc, 'securityzones')
+    assert fmc.fetches == 3
+
+
+def test_index_expires(shared, clock, fmc):
+    catalog = ObjectCatalog(SERVER)
+    catalog.get_index(fmc, 'devicerecords')
+    clock.advance(const.FMC_CATALOG_DEVICE_TTL + 1)
+    catalog.get_index(fmc, 'devicerecords')
+    assert fmc.fetches == 2
+
+
+def test_index_in_chunks(shared, clock, monkeypatch):
+    monkeypatch.setattr(const, 'FMC_CATALOG_CHUNK_SIZE', 200)
+    fmc = FakeFmc([{'name': 'host-%d' % i, 'type': 'Host', 'id': 'h-%d' % i} for i in range(50)])
+    items = ObjectCatalog(SERVER).get_index(fmc, 'networkaddresses')
+    header = shared.get('catalog:' + SERVER + ':networkaddresses')
+    assert header['chunks'] > 1
+    assert ObjectCatalog(SERVER).get_index(fmc, 'networkaddresses') == items
+    assert fmc.fetches == 1
+
+
+def test_missing_chunk_refetches(shared, clock, monkeypatch):
+    monkeypatch.setattr(const, 'FMC_CATALOG_CHUNK_SIZE', 200)
+    fmc = FakeFmc([{'name': 'host-%d' % i, 'type': 'Host', 'id': 'h-%d' % i} for i in range(50)])
+    ObjectCatalog(SERVER).get_index(fmc, 'networkaddresses')
+    header = shared.get('catalog:' + SERVER + ':networkaddresses')
+    shared.delete('catalog:' + SERVER + ':networkaddresses:' + header['part'] + ':1')
+    assert len(ObjectCatalog(SERVER).get_index(fmc, 'networkaddresses')) == 50
+    assert fmc.fetches == 2
+
+
+def test_miss_looks_up_name_again(shared, clock, fmc):
+    catalog = ObjectCatalog(SERVER)
+    catalog.get_index(fmc, 'securityzones')
+    fmc.items.append({'name': 'new-zone', 'type': 'SecurityZone', 'id': 'z-3'})
+    # Fresh index is trusted
+    assert catalog.lookup(fmc, 'securityzones', 'new-zone') is None
+    clock.advance(const.FMC_CATALOG_MISS_REFRESH + 1)
+    assert catalog.lookup(fmc, 'securityzones', 'new-zone') == 'z-3'
+    # Found through server side filter, without fetching whole collection
+    assert fmc.fetches == 1
+
+
+def test_store_not_usable(clock, fmc, monkeypatch):
+    class BrokenStore:
+        def __getattr__(self, name):
+            def fail(*args, **kwargs):
+                raise IOError("store is down")
+            return fail
+    monkeypatch.setattr(store, 'shared_store', BrokenStore())
+    catalog = ObjectCatalog(SERVER)
+    assert catalog.lookup(fmc, 'securityzones', 'inside-zone') == 'z-1'
+    clock.advance(const.FMC_CATALOG_GENERATION_CHECK + 1)
+    # Memory copy is trusted within its time to live
+    assert catalog.lookup(fmc, 'securityzones', 'outside-zone') == 'z-2'
+    assert fmc.fetches == 1
@@ -0,0 +1,159 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       test_coalescing_window.py
+Purpose:    Unit tests of CoalescingWindow membership
+"""
+
+import pytest
+import constant as const
+from fmc import CoalescingWindow
+
+WINDOW = 30
+TIMEOUT = 60
+SERVER = 'https://fmc.example.com'
+
+
+class Flush:
+    # Flush function of leader, takes all members except the rejected ones
+    def __init__(self, rejected=()):
+        self.rejected = rejected
+        self.calls = []
+
+    def __call__(self, members):
+        self.calls.append([m['name'] for m in members])
+        return {'members': [m['name'] for m in members if m['name'] not in self.rejected]}
+
+
+def open_window(slot=None):
+    # Each invocation opens window afresh, by slot of its first call
+    return CoalescingWindow('test', SERVER, WINDOW, TIMEOUT, slot)
+
+
+@pytest.fixture
+def window_start(clock):
+    # Clock is set 1 second into a window
+    clock.now = (int(clock.now // WINDOW) + 1) * WINDOW + 1
+    return clock.now - 1
+
+
+def test_first_member_leads(local_store, clock, window_start):
+    flush = Flush()
+    result, leader = open_window().submit_async('ftd-1', None, flush)
+    assert result is None
+    assert leader['member'] == 0
+    flush_at = window_start + WINDOW + const.COALESCING_WINDOW_GRACE
+    assert leader['delay'] == int(flush_at - clock.now) + 1
+    result, member = open_window().submit_async('ftd-2', {'n': 2}, flush)
+    assert result is None
+    assert member['slot'] == leader['slot']
+    assert member['member'] == 1
+    # Members poll after leader flush
+    assert member['delay'] == leader['delay'] + const.COALESCING_WINDOW_POLL
+    assert flush.calls == []
+
+
+def test_leader_flushes_members(local_store, clock, window_start):
+    flush = Flush(rejected=('ftd-3',))
+    _, leader = open_window().submit_async('ftd-1', None, flush)
+    members = {name: open_window().submit_async(name, None, flush)[1] for name in ('ftd-2', 'ftd-3')}
+
+    clock.advance(leader['delay'])
+    result, _ = open_window(leader['slot']).submit_async('ftd-1', None, flush, leader['member'])
+    assert result == {'members': ['ftd-1', 'ftd-2']}
+    assert flush.calls == [['ftd-1', 'ftd-2', 'ftd-3']]
+
+    clock.advance(const.COALESCING_WINDOW_POLL)
+    window = members['ftd-2']
+    result, _ = open_window(window['slot']).submit_async('ftd-2', None, flush, window['member'])
+    assert result == {'members': ['ftd-1', 'ftd-2']}
+    # Member left out by flush gets no result, it goes on individually
+    window = members['ftd-3']
+    result, window = open_window(window['slot']).submit_async('ftd-3', None, flush, window['member'])
+    assert result is None
+    assert window['delay'] == 0
+    assert len(flush.calls) == 1
+
+
+def test_redelivered_leader_call_does_not_flush_again(local_store, clock, window_start):
+    flush = Flush()
+    _, leader = open_window().submit_async('ftd-1', None, flush)
+    clock.advance(leader['delay'])
+    first, _ = open_window(leader['slot']).submit_async('ftd-1', None, flush, 0)
+    again, window = open_window(leader['slot']).submit_async('ftd-1', None, flush, 0)
+    assert first == again
+    assert window['delay'] == 0
+    assert len(flush.calls) == 1
+
+
+def test_late_member_is_not_part_of_flush(local_store, clock, window_start):
+    flush = Flush()
+    _, leader = open_window().submit_async('ftd-1', None, flush)
+    clock.advance(WINDOW - 2)
+    # Joins just before window ends, but its first call is after leader has flushed
+    window = CoalescingWindow('test', SERVER, WINDOW, TIMEOUT)
+    clock.advance(leader['delay'] - (WINDOW - 2))
+    open_window(leader['slot']).submit_async('ftd-1', None, flush, 0)
+    result, window = window.submit_async('ftd-2', None, flush)
+    assert window['member'] == 1
+    assert result is None
+    assert window['delay'] == 0
+
+
+def test_member_gives_up_without_leader(local_store, clock, window_start):
+    flush = Flush()
+    open_window().submit_async('ftd-1', None, flush)
+    _, window = open_window().submit_async('ftd-2', None, flush)
+    clock.now = window_start + WINDOW + TIMEOUT
+    result, window = open_window(window['slot']).submit_async('ftd-2', None, flush, window['member'])
+    assert result is None
+    assert window['delay'] == 0
+    assert flush.calls == []
+
+
+def test_full_window(local_store, clock, window_start, monkeypatch):
+    monkeypatch.setattr(const, 'COALESCING_WINDOW_MAX', 2)
+    flush = Flush()
+    open_window().submit_async('ftd-1', None, flush)
+    open_window().submit_async('ftd-2', None, flush)
+    result, window = open_window().submit_async('ftd-3', None, flush)
+    assert result is None
+    assert window['member'] is None
+    assert window['delay'] == 0
+
+
+def test_windows_are_separate(local_store, clock, window_start):
+    flush = Flush()
+    _, first = open_window().submit_async('ftd-1', None, flush)
+    clock.advance(WINDOW)
+    _, second = open_window().submit_async('ftd-2', None, flush)
+    assert second['slot'] == first['slot'] + 1
+    assert second['member'] == 0
+
+
+def test_failed_flush_releases_members(local_store, clock, window_start):
+    def flush(members):
+        raise IOError("FMC is down")
+    _, leader = open_window().submit_async('ftd-1', None, flush)
+    _, member = open_window().submit_async('ftd-2', None, flush)
+    clock.advance(leader['delay'])
+    assert open_window(leader['slot']).submit_async('ftd-1', None, flush, 0)[0] is None
+    clock.advance(const.COALESCING_WINDOW_POLL)
+    result, window = open_window(member['slot']).submit_async('ftd-2', None, flush, member['member'])
+    assert result is None
+    assert window['delay'] == 0
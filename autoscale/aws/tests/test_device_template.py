@@ -0,0 +1,195 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       test_device_template.py
+Purpose:    Unit tests of DeviceTemplate capture & idempotent replay
+"""
+
+import pytest
+from ftdv_fmc import ReadCache
+from ngfw import DeviceTemplate
+
+
+class FakeResponse:
+    def __init__(self, status_code, text='{}'):
+        self.status_code = status_code
+        self.text = text
+
+
+class FakeFmc:
+    # Keeps configuration of devices as FMC lists it, counting writes
+    def __init__(self):
+        self.server = 'https://fmc.example.com'
+        self.authTokenTimestamp = 0
+        self.authTokenMaxAge = 10 ** 12
+        self.read_cache = ReadCache()
+        self.devices = {}
+        self.writes = []
+        # Status of next route post, & whether route is created all the same, as by a concurrent attempt
+        self.route_status = None
+        self.route_created = True
+
+    def device(self, device_id):
+        return self.devices.setdefault(device_id, {'interfaces': [], 'routes': [], 'vtep': [], 'vni': []})
+
+    def get_device_state(self, device_id, geneve=False):
+        state = self.device(device_id)
+        return {key: list(items) for key, items in state.items()}
+
+    def put_physical_interface(self, device_id, nic_id, payload):
+        self.writes.append(('interface', nic_id))
+        interfaces = self.device(device_id)['interfaces']
+        interfaces[:] = [item for item in interfaces if item['id'] != nic_id] + [payload]
+        return FakeResponse(200)
+
+    def post_static_route(self, device_id, payload):
+        self.writes.append(('route', payload['selectedNetworks'][0]['name']))
+        routes = self.device(device_id)['routes']
+        if any(route['selectedNetworks'] == payload['selectedNetworks'] for route in routes):
+            return FakeResponse(400, '{"error": "Duplicate route"}')
+        if self.route_created:
+            routes.append(dict(payload, id='r-%d' % len(self.writes)))
+        if self.route_status is not None:
+            return FakeResponse(self.route_status, '{"error": "Invalid"}')
+        return FakeResponse(201)
+
+    def enable_vtep(self, device_id, nic_id, nic, ifname):
+        self.writes.append(('vtep', nic_id))
+        entries = [{'sourceInterface': {'id': nic_id}}]
+        self.device(device_id)['vtep'].append({'nveEnable': True, 'vtepEntries': entries})
+        return FakeResponse(201)
+
+    def add_vni(self, device_id, zone_id):
+        self.writes.append(('vni', zone_id))
+        self.device(device_id)['vni'].append({'vniId': 1, 'securityZone': {'id': zone_id}})
+        return FakeResponse(201)
+
+    @staticmethod
+    def get_gateway(gateway):
+        return {'literal': {'type': 'Host', 'value': gateway}}
+
+
+class FakeDevice:
+    # Device of group, its Nic Ids & Gateways are its own
+    def __init__(self, fmc, device_id, subnet):
+        self.fmc = fmc
+        self.device_id = device_id
+        self.vm_name = 'ftd-' + device_id
+        self.subnet = subnet
+        self.in_nic, self.in_nic_name, self.in_nic_id = 'GigabitEthernet0/0', 'inside', device_id + '-nic0'
+        self.out_nic, self.out_nic_name, self.out_nic_id = 'GigabitEthernet0/1', 'outside', device_id + '-nic1'
+        self.out_nic_zone_id = 'z-outside'
+        self.interface_config = [{'name': self.in_nic, 'ifname': 'inside', 'MTU': '1500'},
+                                 {'name': self.out_nic, 'ifname': 'outside', 'MTU': '1500'}]
+        self.traffic_routes = [{'interface': 'inside', 'network': 'any-ipv4'},
+                               {'interface': 'outside', 'network': 'app-net'}]
+
+    def get_desired_nic(self, interface):
+        if interface['name'] == self.in_nic:
+            return {'nic': self.in_nic, 'nic_id': self.in_nic_id, 'ifname': self.in_nic_name,
+                    'zone_id': 'z-inside', 'mtu': interface['MTU'], 'ip': None, 'netmask': None}
+        if interface['name'] == self.out_nic:
+            return {'nic': self.out_nic, 'nic_id': self.out_nic_id, 'ifname': self.out_nic_name,
+                    'zone_id': self.out_nic_zone_id, 'mtu': interface['MTU'], 'ip': None, 'netmask': None}
+        return None
+
+    def update_gw_stat_route(self):
+        for static_route in self.traffic_routes:
+            static_route['gateway'] = self.subnet + ('.1' if static_route['interface'] == 'inside' else '.129')
+
+    def configure(self):
+        # Configuration of first device of group, done by ConfigReconciler
+        state = self.fmc.device(self.device_id)
+        for interface in self.interface_config:
+            nic = self.get_desired_nic(interface)
+            state['interfaces'].append({'id': nic['nic_id'], 'name': nic['nic'], 'ifname': nic['ifname'],
+                                        'securityZone': {'id': nic['zone_id']}, 'MTU': nic['mtu'],
+                                        'ipv4': {'dhcp': {'enableDefaultRouteDHCP': False}},
+                                        'links': {'self': 'url'}})
+        self.update_gw_stat_route()
+        for static_route in self.traffic_routes:
+            state['routes'].append({'id': 'r-' + static_route['network'], 'interfaceName': static_route['interface'],
+                                    'selectedNetworks': [{'type': 'Network', 'name': static_route['network']}],
+                                    'gateway': {'literal': {'type': 'Host', 'value': static_route['gateway']}}})
+        self.fmc.enable_vtep(self.device_id, self.out_nic_id, self.out_nic, self.out_nic_name)
+        self.fmc.add_vni(self.device_id, self.out_nic_zone_id)
+
+
+@pytest.fixture
+def fmc(local_store):
+    fmc = FakeFmc()
+    first = FakeDevice(fmc, 'd-1', '10.0.1')
+    first.configure()
+    assert DeviceTemplate(first, geneve=True).capture() == 'SUCCESS'
+    fmc.writes = []
+    return fmc
+
+
+@pytest.fixture
+def device(fmc):
+    return FakeDevice(fmc, 'd-2', '10.0.2')
+
+
+def test_replay_configures_device(fmc, device):
+    assert DeviceTemplate(device, geneve=True).replay() == 'SUCCESS'
+    assert sorted(fmc.writes) == [('interface', 'd-2-nic0'), ('interface', 'd-2-nic1'), ('route', 'any-ipv4'),
+                                  ('route', 'app-net'), ('vni', 'z-outside'), ('vtep', 'd-2-nic1')]
+    gateways = [route['gateway']['literal']['value'] for route in fmc.device('d-2')['routes']]
+    assert gateways == ['10.0.2.1', '10.0.2.129']
+
+
+def test_replay_again_writes_nothing(fmc, device):
+    DeviceTemplate(device, geneve=True).replay()
+    fmc.writes = []
+    # Retry or re-delivery of configure step
+    template = DeviceTemplate(device, geneve=True)
+    assert template.replay() == 'SUCCESS'
+    assert fmc.writes == []
+    assert template.store.get(template.key) is not None
+
+
+def test_replay_writes_only_what_device_lacks(fmc, device):
+    DeviceTemplate(device, geneve=True).replay()
+    # Earlier attempt got as far as VTEP & first route
+    state = fmc.device('d-2')
+    state['vni'] = []
+    state['routes'] = state['routes'][:1]
+    fmc.writes = []
+    assert DeviceTemplate(device, geneve=True).replay() == 'SUCCESS'
+    assert fmc.writes == [('vni', 'z-outside'), ('route', 'app-net')]
+
+
+def test_conflict_with_own_write_keeps_template(fmc, device):
+    # Route is created by a concurrent attempt of same device, post of this one is rejected
+    fmc.route_status = 422
+    template = DeviceTemplate(device, geneve=True)
+    assert template.replay() == 'SUCCESS'
+    assert template.store.get(template.key) is not None
+
+
+def test_rejected_template_is_invalidated(fmc, device):
+    fmc.route_status, fmc.route_created = 422, False
+    template = DeviceTemplate(device, geneve=True)
+    assert template.replay() == 'FAIL'
+    assert template.store.get(template.key) is None
+
+
+def test_template_of_other_configuration_is_not_used(fmc, device):
+    device.traffic_routes.append({'interface': 'inside', 'network': 'db-net'})
+    assert DeviceTemplate(device, geneve=True).replay() == 'FAIL'
+    assert fmc.writes == []
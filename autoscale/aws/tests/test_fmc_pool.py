@@ -0,0 +1,105 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       test_fmc_pool.py
+Purpose:    Unit tests of FmcPool placement of devices on FMCs of a pool
+"""
+
+import time
+import pytest
+import ftdv_fmc
+import fmc
+import store
+from fmc import FmcPool
+
+SERVERS = ['10.0.0.1', '10.0.0.2']
+
+
+class FakeCatalog:
+    def __init__(self, devices):
+        self.devices = devices
+
+    def get_index(self, client, collection):
+        return [{'name': 'ftd-%d' % i} for i in range(self.devices)]
+
+
+class FakeClient:
+    # FirepowerManagementCenter of an FMC with given number of devices, counting clients & token leases
+    devices = {}
+    created = []
+
+    def __init__(self, server, username, password):
+        self.server = server
+        self.headers = {}
+        self.authTokenTimestamp = 0
+        self.authTokenMaxAge = 15*60
+        self.leases = 0
+        self.catalog = FakeCatalog(FakeClient.devices[server])
+        FakeClient.created.append(self)
+
+    def get_auth_token(self):
+        self.leases += 1
+        self.headers = {'X-auth-access-token': 'token'}
+        self.authTokenTimestamp = int(time.time())
+        self.authTokenMaxAge = 600
+
+
+@pytest.fixture
+def clients(local_store, clock, monkeypatch):
+    monkeypatch.setattr(ftdv_fmc.circuit, 'circuit_breaker_pool', {})
+    monkeypatch.setattr(fmc, 'FirepowerManagementCenter', FakeClient)
+    monkeypatch.setattr(FakeClient, 'devices', {'10.0.0.1': 3, '10.0.0.2': 1})
+    monkeypatch.setattr(FakeClient, 'created', [])
+    return FakeClient
+
+
+def test_least_loaded_fmc_is_picked(clients):
+    pool = FmcPool(SERVERS, 'user', 'password')
+    assert pool.place('i-1') == '10.0.0.2'
+    assert pool.owner_of('i-1') == '10.0.0.2'
+    # Pending placement counts in load till FMC lists the device
+    assert pool.place('i-2') == '10.0.0.2'
+    assert pool.place('i-3') == '10.0.0.1'
+
+
+def test_clients_are_kept_across_placements(clients, clock):
+    pool = FmcPool(SERVERS, 'user', 'password')
+    for instance_id in ['i-1', 'i-2', 'i-3']:
+        pool.place(instance_id)
+    assert [client.server for client in clients.created] == SERVERS
+    assert [client.leases for client in clients.created] == [1, 1]
+    clock.advance(601)
+    pool.place('i-4')
+    assert len(clients.created) == 2
+    assert [client.leases for client in clients.created] == [2, 2]
+
+
+def test_store_failure_while_waiting_for_lock(clients, clock, monkeypatch):
+    class FailingStore(store.LocalFileStore):
+        # Lock is held by another worker, store fails on retry
+        adds = 0
+
+        def add(self, key, value, ttl=None):
+            FailingStore.adds += 1
+            if FailingStore.adds > 1:
+                raise IOError("store is down")
+            return False
+    monkeypatch.setattr(store, 'shared_store', FailingStore(store.shared_store.path))
+    pool = FmcPool(SERVERS, 'user', 'password')
+    assert pool.place('i-1') == pool.hash_owner('i-1')
+    assert clients.created == []
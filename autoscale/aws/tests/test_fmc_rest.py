@@ -0,0 +1,93 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       test_fmc_rest.py
+Purpose:    Unit tests of FirepowerManagementCenter REST methods failing fast while FMC is unavailable
+"""
+
+import time
+import pytest
+import requests
+import ftdv_fmc
+from fmc import FirepowerManagementCenter, get_fmc_circuit
+
+FMC_SERVER = 'fmc.example.com'
+URL = 'https://' + FMC_SERVER + '/api/fmc_config/v1/domain/d/object/hosts'
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.text = '{}'
+        self.content = b'{}'
+        self.headers = {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError("%d Client Error" % self.status_code, response=self)
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, status_code=200, error=None):
+        self.status_code = status_code
+        self.error = error
+        self.requests = 0
+
+    def request(self, method, url, **kwargs):
+        self.requests += 1
+        if self.error is not None:
+            raise self.error
+        return FakeResponse(self.status_code)
+
+
+@pytest.fixture
+def fmc(local_store, monkeypatch):
+    monkeypatch.setattr(ftdv_fmc.circuit, 'circuit_breaker_pool', {})
+    fmc = FirepowerManagementCenter(FMC_SERVER, 'user', 'password')
+    # Token is not needed for these calls
+    fmc.authTokenTimestamp = time.time()
+    fmc.authTokenMaxAge = 3600
+    return fmc
+
+
+@pytest.mark.parametrize('call', ['get', 'post', 'put', 'delete'])
+def test_open_circuit_is_raised(fmc, call):
+    circuit = get_fmc_circuit(FMC_SERVER)
+    for _ in range(circuit.threshold):
+        circuit.on_failure()
+    fmc.session = FakeSession()
+    args = (URL,) if call in ('get', 'delete') else (URL, {})
+    with pytest.raises(ftdv_fmc.CircuitOpenError):
+        getattr(fmc, 'rest_' + call)(*args)
+    assert fmc.session.requests == 0
+
+
+@pytest.mark.parametrize('call', ['get', 'post', 'put', 'delete'])
+def test_connection_error_is_raised(fmc, call):
+    fmc.session = FakeSession(error=requests.exceptions.ConnectionError("connection refused"))
+    args = (URL,) if call in ('get', 'delete') else (URL, {})
+    with pytest.raises(requests.exceptions.ConnectionError):
+        getattr(fmc, 'rest_' + call)(*args)
+
+
+def test_error_response_is_returned(fmc):
+    fmc.session = FakeSession(status_code=404)
+    assert fmc.rest_get(URL).status_code == 404
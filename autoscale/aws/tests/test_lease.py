@@ -0,0 +1,104 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       test_lease.py
+Purpose:    Unit tests of InstanceLease
+"""
+
+import constant as const
+from workflow import InstanceLease
+
+
+class BrokenStore:
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise IOError("store is down")
+        return fail
+
+
+def test_lease_is_exclusive(local_store, clock):
+    holder = InstanceLease('i-1')
+    other = InstanceLease('i-1')
+    assert holder.acquire()
+    assert not other.acquire(wait=10)
+    assert other.is_held()
+    # Release of a lease not held is a no-op
+    other.release()
+    assert holder.is_held()
+    holder.release()
+    assert not holder.is_held()
+    assert other.acquire()
+
+
+def test_lease_expires(local_store, clock):
+    assert InstanceLease('i-1').acquire()
+    other = InstanceLease('i-1')
+    # Waiting polls the lease, which expires meanwhile
+    assert other.acquire(wait=const.INSTANCE_LEASE_TTL + const.INSTANCE_LEASE_POLL)
+
+
+def test_claim_once(local_store, clock):
+    lease = InstanceLease('i-1')
+    assert lease.claim('vm_ready:3:0')
+    assert not InstanceLease('i-1').claim('vm_ready:3:0')
+    # Keys are per instance & per message
+    assert InstanceLease('i-2').claim('vm_ready:3:0')
+    assert lease.claim('vm_ready:2:0')
+
+
+def test_unclaim_allows_redelivery(local_store, clock):
+    lease = InstanceLease('i-1')
+    assert lease.claim('vm_ready:3:0')
+    lease.unclaim('vm_ready:3:0')
+    assert lease.claim('vm_ready:3:0')
+
+
+def test_claim_expires(local_store, clock):
+    assert InstanceLease('i-1').claim('vm_ready:3:0')
+    clock.advance(const.MESSAGE_CLAIM_TTL + 1)
+    assert InstanceLease('i-1').claim('vm_ready:3:0')
+
+
+def test_lease_without_store(clock):
+    lease = InstanceLease('i-1', BrokenStore())
+    assert lease.acquire()
+    assert lease.claim('vm_ready:3:0')
+    assert not lease.is_held()
+
+
+def test_expired_lease_is_not_released_by_old_holder(local_store, clock):
+    first = InstanceLease('i-1')
+    assert first.acquire()
+    clock.advance(const.INSTANCE_LEASE_TTL + 1)
+    second = InstanceLease('i-1')
+    assert second.acquire()
+    # First run outlived its lease, its release keeps lease of second holder
+    first.release()
+    assert second.is_held()
+    assert not InstanceLease('i-1').acquire()
+    second.release()
+    assert not second.is_held()
+
+
+def test_each_acquire_has_own_token(local_store, clock):
+    lease = InstanceLease('i-1')
+    assert lease.acquire()
+    token = lease.token
+    lease.release()
+    assert lease.acquire()
+    assert lease.token != token
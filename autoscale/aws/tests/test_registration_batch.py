@@ -0,0 +1,84 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       test_registration_batch.py
+Purpose:    Unit tests of RegistrationBatch bulk device registration
+"""
+
+import pytest
+import constant as const
+from fmc import RegistrationBatch
+
+
+class FakeFmc:
+    # Accepts bulk devicerecords requests, counting them
+    def __init__(self, task_id='task-1'):
+        self.server = 'https://fmc.example.com'
+        self.task_id = task_id
+        self.bulk = []
+
+    def register_devices_bulk(self, payloads):
+        self.bulk.append(payloads)
+        return self.task_id
+
+
+@pytest.fixture
+def window_start(clock):
+    # Clock is set 1 second into a registration window
+    clock.now = (int(clock.now // const.REGISTRATION_BATCH_WINDOW) + 1) * const.REGISTRATION_BATCH_WINDOW + 1
+
+
+def test_devices_of_window_are_registered_in_one_request(local_store, clock, window_start):
+    fmc = FakeFmc()
+    task_id, leader = RegistrationBatch(fmc).submit_async('ftd-1', {'name': 'ftd-1'})
+    assert task_id is None
+    _, member = RegistrationBatch(fmc).submit_async('ftd-2', {'name': 'ftd-2'})
+
+    clock.advance(leader['delay'])
+    task_id, leader = RegistrationBatch(fmc, leader['slot']).submit_async('ftd-1', None, leader['member'])
+    assert task_id == 'task-1'
+    assert fmc.bulk == [[{'name': 'ftd-1'}, {'name': 'ftd-2'}]]
+
+    clock.advance(const.COALESCING_WINDOW_POLL)
+    task_id, member = RegistrationBatch(fmc, member['slot']).submit_async('ftd-2', None, member['member'])
+    assert task_id == 'task-1'
+    assert member['delay'] == 0
+    assert len(fmc.bulk) == 1
+
+
+def test_single_device_is_registered_individually(local_store, clock, window_start):
+    fmc = FakeFmc()
+    _, leader = RegistrationBatch(fmc).submit_async('ftd-1', {'name': 'ftd-1'})
+    clock.advance(leader['delay'])
+    task_id, leader = RegistrationBatch(fmc, leader['slot']).submit_async('ftd-1', None, leader['member'])
+    assert task_id is None
+    assert leader['delay'] == 0
+    assert fmc.bulk == []
+
+
+def test_rejected_bulk_request_releases_devices(local_store, clock, window_start):
+    # FMC without bulk API gives no task, devices go on individually
+    fmc = FakeFmc(task_id=None)
+    _, leader = RegistrationBatch(fmc).submit_async('ftd-1', {'name': 'ftd-1'})
+    _, member = RegistrationBatch(fmc).submit_async('ftd-2', {'name': 'ftd-2'})
+    clock.advance(leader['delay'])
+    assert RegistrationBatch(fmc, leader['slot']).submit_async('ftd-1', None, leader['member'])[0] is None
+    clock.advance(const.COALESCING_WINDOW_POLL)
+    task_id, member = RegistrationBatch(fmc, member['slot']).submit_async('ftd-2', None, member['member'])
+    assert task_id is None
+    assert member['delay'] == 0
@@ -0,0 +1,139 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       test_scheduler.py
+Purpose:    Unit tests of SqsDelayScheduler delay hops & StoreScheduler delivery
+"""
+
+import json
+import pytest
+import constant as const
+import scheduler
+
+
+class FakeSqsClient:
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, QueueUrl, MessageBody, DelaySeconds):
+        self.sent.append({'body': json.loads(MessageBody), 'delay': DelaySeconds})
+
+
+class FakeSns:
+    published = []
+
+    def publish_to_topic(self, topic_arn, subject, message):
+        FakeSns.published.append((topic_arn, subject, message))
+        return {'MessageId': str(len(FakeSns.published))}
+
+
+@pytest.fixture
+def sns(monkeypatch):
+    monkeypatch.setattr(scheduler, 'SimpleNotificationService', FakeSns)
+    monkeypatch.setattr(FakeSns, 'published', [])
+    return FakeSns
+
+
+@pytest.fixture
+def sqs_scheduler():
+    sqs_scheduler = scheduler.SqsDelayScheduler('https://sqs.us-east-1.amazonaws.com/1/manager')
+    sqs_scheduler.sqs_client = FakeSqsClient()
+    return sqs_scheduler
+
+
+def deliver(sqs_scheduler, clock):
+    # Waits out delay of last sent message & hands its body over, as queue does
+    sent = sqs_scheduler.sqs_client.sent[-1]
+    clock.advance(sent['delay'])
+    return sent['body']
+
+
+def test_short_delay_is_sent_as_is(sqs_scheduler, clock):
+    message = {'instance_id': 'i-1', 'to_function': 'vm_ready'}
+    assert sqs_scheduler.schedule('s', message, 60)
+    assert sqs_scheduler.sqs_client.sent == [{'body': message, 'delay': 60}]
+    assert scheduler.get_remaining_delay(deliver(sqs_scheduler, clock)) == 0
+
+
+def test_long_delay_hops(sqs_scheduler, clock):
+    delay = 2 * const.SQS_MAX_DELAY + 100
+    due = int(clock.now) + delay
+    message = {'instance_id': 'i-1', 'to_function': 'vm_deploy'}
+    sqs_scheduler.schedule('s', message, delay)
+    assert 'not_before' not in message
+    hops = 0
+    while True:
+        body = deliver(sqs_scheduler, clock)
+        assert body['not_before'] == str(due)
+        remaining = scheduler.get_remaining_delay(body)
+        if remaining == 0:
+            break
+        # Manager re-sends message for remaining time on delivery
+        sqs_scheduler.schedule('s', body, remaining)
+        hops += 1
+    assert hops == 2
+    assert int(clock.now) == due
+    assert [sent['delay'] for sent in sqs_scheduler.sqs_client.sent] == \
+        [const.SQS_MAX_DELAY, const.SQS_MAX_DELAY, 100]
+
+
+def test_remaining_delay_of_plain_message(clock):
+    assert scheduler.get_remaining_delay({}) == 0
+    assert scheduler.get_remaining_delay({'not_before': 'bad'}) == 0
+    assert scheduler.get_remaining_delay({'not_before': str(int(clock.now) - 5)}) == 0
+
+
+def test_send_failure(sqs_scheduler, clock):
+    def fail(**kwargs):
+        raise IOError("queue is down")
+    sqs_scheduler.sqs_client.send_message = fail
+    assert not sqs_scheduler.schedule('s', {'instance_id': 'i-1'}, 10)
+
+
+def test_store_scheduler_publishes_due_messages(local_store, clock, sns):
+    store_scheduler = scheduler.StoreScheduler('topic')
+    ready = {'instance_id': 'i-1', 'to_function': 'vm_ready'}
+    deploy = {'instance_id': 'i-2', 'to_function': 'vm_deploy'}
+    assert store_scheduler.schedule('ready', ready, 60)
+    assert store_scheduler.schedule('deploy', deploy, 300)
+    assert sns.published == []
+    functions = ['vm_ready', 'vm_deploy']
+    assert store_scheduler.deliver_due_messages(['i-1', 'i-2'], functions) == 0
+    clock.advance(60)
+    assert store_scheduler.deliver_due_messages(['i-1', 'i-2'], functions) == 1
+    assert sns.published == [('topic', 'ready', ready)]
+    # Delivered message is not delivered again
+    clock.advance(240)
+    assert store_scheduler.deliver_due_messages(['i-1', 'i-2'], functions) == 1
+    assert sns.published[-1] == ('topic', 'deploy', deploy)
+    assert store_scheduler.deliver_due_messages(['i-1', 'i-2'], functions) == 0
+
+
+def test_store_scheduler_publishes_at_once_without_delay(local_store, clock, sns):
+    message = {'instance_id': 'i-1', 'to_function': 'vm_ready'}
+    assert scheduler.StoreScheduler('topic').schedule('ready', message, 0)
+    assert sns.published == [('topic', 'ready', message)]
+
+
+def test_store_scheduler_keeps_latest_message_of_stage(local_store, clock, sns):
+    store_scheduler = scheduler.StoreScheduler('topic')
+    store_scheduler.schedule('first', {'instance_id': 'i-1', 'to_function': 'vm_ready', 'deferred': '1'}, 60)
+    store_scheduler.schedule('second', {'instance_id': 'i-1', 'to_function': 'vm_ready', 'deferred': '2'}, 60)
+    clock.advance(60)
+    assert store_scheduler.deliver_due_messages(['i-1'], ['vm_ready']) == 1
+    assert sns.published[0][1] == 'second'
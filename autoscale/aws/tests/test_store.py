@@ -0,0 +1,89 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       test_store.py
+Purpose:    Unit tests of LocalFileStore
+"""
+
+
+def test_put_expires(local_store, clock):
+    local_store.put('k', {'a': 1}, ttl=10)
+    assert local_store.get('k') == {'a': 1}
+    clock.advance(11)
+    assert local_store.get('k') is None
+
+
+def test_put_without_ttl_does_not_expire(local_store, clock):
+    local_store.put('k', 1)
+    clock.advance(10 ** 6)
+    assert local_store.get('k') == 1
+
+
+def test_add_only_if_absent(local_store, clock):
+    assert local_store.add('k', 'first', ttl=10)
+    assert not local_store.add('k', 'second', ttl=10)
+    assert local_store.get('k') == 'first'
+
+
+def test_add_over_expired_key(local_store, clock):
+    assert local_store.add('k', 'first', ttl=10)
+    clock.advance(10)
+    # Key is live till its expiry time itself
+    assert not local_store.add('k', 'second', ttl=10)
+    clock.advance(1)
+    assert local_store.add('k', 'second', ttl=10)
+    assert local_store.get('k') == 'second'
+
+
+def test_add_after_delete(local_store):
+    assert local_store.add('k', 1)
+    local_store.delete('k')
+    assert local_store.get('k') is None
+    assert local_store.add('k', 2)
+
+
+def test_incr_counts(local_store, clock):
+    assert [local_store.incr('c', ttl=60) for _ in range(3)] == [1, 2, 3]
+
+
+def test_incr_keeps_expiry_of_counter(local_store, clock):
+    local_store.incr('c', ttl=60)
+    clock.advance(50)
+    # ttl is set only when counter is created, later increments don't extend it
+    assert local_store.incr('c', ttl=60) == 2
+    clock.advance(11)
+    assert local_store.get('c') is None
+    assert local_store.incr('c', ttl=60) == 1
+
+
+def test_state_is_shared_through_file(local_store, clock):
+    other = type(local_store)(local_store.path)
+    local_store.put('k', 'v', ttl=10)
+    assert other.get('k') == 'v'
+    assert not other.add('k', 'w')
+    assert other.incr('c') == 1
+    assert local_store.incr('c') == 2
+
+
+def test_delete_if_value_matches(local_store, clock):
+    local_store.put('k', 'token-1', ttl=10)
+    assert not local_store.delete_if('k', 'token-2')
+    assert local_store.get('k') == 'token-1'
+    assert local_store.delete_if('k', 'token-1')
+    assert local_store.get('k') is None
+    assert not local_store.delete_if('k', 'token-1')
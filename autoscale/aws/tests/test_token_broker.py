@@ -0,0 +1,109 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       test_token_broker.py
+Purpose:    Unit tests of TokenBroker sharing one FMC auth token among workers
+"""
+
+import pytest
+import ftdv_fmc
+import constant as const
+from fmc import TokenBroker
+
+SERVER = 'https://fmc.example.com'
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers):
+        self.status_code = status_code
+        self.headers = headers
+
+    def close(self):
+        pass
+
+
+class FakeAuthApi:
+    # generatetoken & refreshtoken of FMC, each call gives a new token
+    def __init__(self):
+        self.calls = []
+        self.refresh_fails = False
+
+    def __call__(self, session, method, url, headers=None, timeout=None, **kwargs):
+        api = url.rsplit('/', 1)[1]
+        self.calls.append(api)
+        if api == 'refreshtoken' and self.refresh_fails:
+            return FakeResponse(401, {})
+        return FakeResponse(204, {'X-auth-access-token': 'access-%d' % len(self.calls),
+                                  'X-auth-refresh-token': 'refresh-%d' % len(self.calls),
+                                  'domain_uuid': 'd-1'})
+
+
+@pytest.fixture
+def auth_api(monkeypatch):
+    auth_api = FakeAuthApi()
+    monkeypatch.setattr(ftdv_fmc, 'send_request', auth_api)
+    return auth_api
+
+
+def worker():
+    return TokenBroker(SERVER, 'user', 'password', None, None)
+
+
+def test_token_is_shared_by_workers(local_store, clock, auth_api):
+    lease = worker().acquire_lease()
+    assert lease['access_token'] == 'access-1'
+    assert lease['domain_uuid'] == 'd-1'
+    # Lease ends before token, so that it is not used while being refreshed
+    assert lease['expires_at'] == clock.now + const.FMC_TOKEN_MAX_AGE - const.FMC_TOKEN_REFRESH_MARGIN
+    assert worker().acquire_lease()['access_token'] == 'access-1'
+    assert auth_api.calls == ['generatetoken']
+
+
+def test_token_is_refreshed_before_expiry(local_store, clock, auth_api):
+    broker = worker()
+    broker.acquire_lease()
+    clock.advance(const.FMC_TOKEN_MAX_AGE - const.FMC_TOKEN_REFRESH_MARGIN)
+    assert broker.acquire_lease()['access_token'] == 'access-2'
+    assert auth_api.calls == ['generatetoken', 'refreshtoken']
+
+
+def test_token_is_generated_after_max_refresh(local_store, clock, auth_api):
+    broker = worker()
+    for _ in range(const.FMC_TOKEN_MAX_REFRESH + 1):
+        broker.acquire_lease()
+        clock.advance(const.FMC_TOKEN_MAX_AGE - const.FMC_TOKEN_REFRESH_MARGIN)
+    broker.acquire_lease()
+    assert auth_api.calls == ['generatetoken'] + ['refreshtoken'] * const.FMC_TOKEN_MAX_REFRESH + ['generatetoken']
+
+
+def test_failed_refresh_generates_token(local_store, clock, auth_api):
+    broker = worker()
+    broker.acquire_lease()
+    clock.advance(const.FMC_TOKEN_MAX_AGE - const.FMC_TOKEN_REFRESH_MARGIN)
+    auth_api.refresh_fails = True
+    assert broker.acquire_lease()['access_token'] == 'access-3'
+    assert auth_api.calls == ['generatetoken', 'refreshtoken', 'generatetoken']
+
+
+def test_private_token_when_renewal_is_not_done_in_time(local_store, clock, auth_api):
+    # Another worker holds the lock & does not renew the token
+    start = clock.now
+    local_store.add(worker().lock_key, int(clock.now), ttl=const.FMC_TOKEN_LOCK_TTL)
+    assert worker().acquire_lease()['access_token'] == 'access-1'
+    assert local_store.get(worker().key) is None
+    assert clock.now >= start + const.FMC_TOKEN_WAIT_TIME
@@ -0,0 +1,94 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       test_workflow.py
+Purpose:    Unit tests of InstanceWorkflow
+"""
+
+import constant as const
+from workflow import InstanceWorkflow, WORKFLOW_DONE
+
+
+class BrokenStore:
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise IOError("store is down")
+        return fail
+
+
+def test_create_only_once(local_store, clock):
+    first = InstanceWorkflow('i-1')
+    assert first.create('vm_ready', {'zone': 'a'})
+    second = InstanceWorkflow('i-1')
+    assert not second.create('vm_register')
+    # Loser of create sees workflow of winner
+    assert second.get_step() == 'vm_ready'
+    assert second.get_context() == {'zone': 'a'}
+
+
+def test_transitions_are_checkpointed(local_store, clock):
+    wf = InstanceWorkflow('i-1')
+    wf.create('vm_ready')
+    wf.retry(delay=30)
+    assert wf.retries_left() == const.TO_FUN_RETRY_COUNT[0] - 1
+    assert wf.state['next_run'] == int(clock.now) + 30
+    wf.update_context({'device_id': 'd-1'})
+    wf.advance('vm_register', delay=10)
+    assert wf.save()
+
+    wf = InstanceWorkflow('i-1')
+    assert wf.load()['step'] == 'vm_register'
+    assert wf.state['attempt'] == 0
+    assert wf.retries_left() == const.TO_FUN_RETRY_COUNT[1]
+    assert wf.get_context() == {'device_id': 'd-1'}
+    wf.reschedule(delay=60)
+    assert wf.state['attempt'] == 0
+    assert wf.state['next_run'] == int(clock.now) + 60
+
+
+def test_stalled_step(local_store, clock):
+    wf = InstanceWorkflow('i-1')
+    wf.create('vm_ready')
+    assert not wf.is_stalled()
+    clock.advance(const.WORKFLOW_STALL_TIME + 1)
+    assert wf.is_stalled()
+    wf.complete()
+    assert wf.get_step() == WORKFLOW_DONE
+    assert not wf.is_stalled()
+
+
+def test_finish_drops_record(local_store, clock):
+    wf = InstanceWorkflow('i-1')
+    wf.create('vm_ready')
+    wf.finish()
+    assert wf.get_step() is None
+    assert InstanceWorkflow('i-1').load() is None
+
+
+def test_record_expires(local_store, clock):
+    InstanceWorkflow('i-1').create('vm_ready')
+    clock.advance(const.WORKFLOW_TTL + 1)
+    assert InstanceWorkflow('i-1').load() is None
+
+
+def test_workflow_without_store(clock):
+    wf = InstanceWorkflow('i-1', BrokenStore())
+    # Work is not blocked when store is not usable
+    assert wf.create('vm_ready')
+    assert not wf.save()
+    assert wf.load() is None
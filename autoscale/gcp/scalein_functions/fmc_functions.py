@@ -20,6 +20,9 @@ import time
 import requests
 import json
 import os
+import ftdv_fmc
+from ftdv_fmc import get_session as get_fmc_session, send_request
+
 
 class FirepowerManagementCenter:
      def __init__(self):
@@ -30,6 +33,8 @@ class FirepowerManagementCenter:
           self.domain_uuid = ""
           self.authTokenTimestamp = 0
           self.authTokenMaxAge = 15*60  # seconds - 30 minutes is the max without using refresh
+          self.session = get_fmc_session(self.server)
+          self.timeout = (ftdv_fmc.settings.CONNECT_TIMEOUT, ftdv_fmc.settings.READ_TIMEOUT)
 
      def get_auth_token(self):
           """
@@ -50,7 +55,7 @@ class FirepowerManagementCenter:
                # The one with "SSL verification turned off" is commented out. If you like to use that then
                # uncomment the line where verify=False and comment the line with =verify='/path/to/ssl_certificate'
                # REST call with SSL verification turned off:
-               r = requests.post(auth_url, headers=self.headers, auth=requests.auth.HTTPBasicAuth(self.username, self.password), verify=False)
+               r = send_request(self.session, 'POST', auth_url, self.headers, self.timeout, auth=requests.auth.HTTPBasicAuth(self.username, self.password))
                print("R in get_auth_token: "+ str(r))
                # REST call with SSL verification turned on: Download SSL certificates
                # from your FMC first and provide its path for verification.
@@ -82,7 +87,7 @@ class FirepowerManagementCenter:
                self.get_auth_token()
           try:
                print("Requesting(rest_get):" + str(url))
-               r = requests.get(url, headers=self.headers, verify=False)
+               r = send_request(self.session, 'GET', url, self.headers, self.timeout)
                status_code = r.status_code
                resp = r.text
                print("Response Status Code(rest_get): " + str(status_code))
@@ -115,7 +120,7 @@ class FirepowerManagementCenter:
 
           try:
                print("Requesting(rest_delete):" + str(url))
-               r = requests.delete(url, headers=self.headers, verify=False)
+               r = send_request(self.session, 'DELETE', url, self.headers, self.timeout)
                status_code = r.status_code
                resp = r.text
                print("Response Status Code(rest_delete): " + str(status_code))
@@ -20,10 +20,12 @@ import base64
 import json
 import time
 from fmc_functions import FirepowerManagementCenter
+from ftdv_fmc import with_call_stats
 import urllib3
 import os
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+@with_call_stats
 def scale_in(event, context):
      """Triggered from a message on a Cloud Pub/Sub topic.
      Args:
@@ -20,6 +20,8 @@ import time
 import requests
 import json
 import os
+import ftdv_fmc
+from ftdv_fmc import get_session as get_fmc_session, send_request
 
 
 class FirepowerManagementCenter:
@@ -32,6 +34,8 @@ class FirepowerManagementCenter:
           self.domain_uuid = ""
           self.authTokenTimestamp = 0
           self.authTokenMaxAge = 15*60  # seconds - 30 minutes is the max without using refresh
+          self.session = get_fmc_session(self.server)
+          self.timeout = (ftdv_fmc.settings.CONNECT_TIMEOUT, ftdv_fmc.settings.READ_TIMEOUT)
 
      def get_auth_token(self):
           """
@@ -52,7 +56,7 @@ class FirepowerManagementCenter:
                # The one with "SSL verification turned off" is commented out. If you like to use that then
                # uncomment the line where verify=False and comment the line with =verify='/path/to/ssl_certificate'
                # REST call with SSL verification turned off:
-               r = requests.post(auth_url, headers=self.headers, auth=requests.auth.HTTPBasicAuth(self.username, self.password), verify=False)
+               r = send_request(self.session, 'POST', auth_url, self.headers, self.timeout, auth=requests.auth.HTTPBasicAuth(self.username, self.password))
                print("R in get_auth_token:"+ str(r))
                # REST call with SSL verification turned on: Download SSL certificates
                # from your FMC first and provide its path for verification.
@@ -85,7 +89,7 @@ class FirepowerManagementCenter:
                self.get_auth_token()
           try:
                print("Requesting(rest_get):" + url)
-               r = requests.get(url, headers=self.headers, verify=False)
+               r = send_request(self.session, 'GET', url, self.headers, self.timeout)
                status_code = r.status_code
                resp = r.text
                print("Response Status Code(rest_get): " + str(status_code))
@@ -117,7 +121,7 @@ class FirepowerManagementCenter:
                self.get_auth_token()
           try:
                print("Requesting(rest_post): " + url)
-               r = requests.post(url, data=json.dumps(post_data), headers=self.headers, verify=False)
+               r = send_request(self.session, 'POST', url, self.headers, self.timeout, data=json.dumps(post_data))
                status_code = r.status_code
                resp = r.text
                print("Response Status Code(rest_post): "+ str(status_code))
@@ -149,7 +153,7 @@ class FirepowerManagementCenter:
                self.get_auth_token()
           try:
                print("Requesting(rest_put): " + url)
-               r = requests.put(url, data=json.dumps(put_data), headers=self.headers, verify=False)
+               r = send_request(self.session, 'PUT', url, self.headers, self.timeout, data=json.dumps(put_data))
                # REST call with SSL verification turned on:
                # r = requests.put(url, data=json.dumps(put_data), headers=headers, verify='/path/to/ssl_certificate')
                status_code = r.status_code
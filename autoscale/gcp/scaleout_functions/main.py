@@ -25,6 +25,7 @@ from googleapiclient import discovery
 import basic_functions as bf
 import time
 from fmc_functions import FirepowerManagementCenter
+from ftdv_fmc import with_call_stats
 import urllib3
 import os
 import warnings
@@ -34,6 +35,7 @@ with warnings.catch_warnings():
      import paramiko
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+@with_call_stats
 def scale_out(event, context):
      """Triggered from a message on a Cloud Pub/Sub topic.
      Args:
@@ -25,8 +25,10 @@ import requests
 import logging
 import json
 import ast
-from utility import TokenCaller
+from utility import TokenCaller, TOKEN_MAX_AGE, TOKEN_LEASE_MARGIN
 import utility as utl
+import ftdv_fmc
+from ftdv_fmc import get_session as get_fmc_session, send_request
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
@@ -34,6 +36,7 @@ logging.basicConfig(force=True, level="INFO")
 logging.getLogger("paramiko").setLevel(logging.WARNING)
 logger = logging.getLogger()
 
+
 class FirepowerManagementCenter:
     """
         FirepowerManagementCenter class has REST methods for FMC connections
@@ -45,8 +48,10 @@ class FirepowerManagementCenter:
         self.headers = []
         self.domain_uuid = ""
         self.authTokenTimestamp = 0
-        self.authTokenMaxAge = 30*60  # seconds - 30 minutes is the max without using refresh
+        self.authTokenMaxAge = TOKEN_MAX_AGE - TOKEN_LEASE_MARGIN  # seconds - token manager refreshes it after this
         self.accessPolicyName = accesspolicy
+        self.session = get_fmc_session(self.server)
+        self.timeout = (ftdv_fmc.settings.CONNECT_TIMEOUT, ftdv_fmc.settings.READ_TIMEOUT)
         
         #Input for calling TOKEN MANAGER FUNCTION
         self.compartmentId = ""
@@ -70,7 +75,7 @@ class FirepowerManagementCenter:
         try:
             # REST call with SSL verification turned off:
             logging.debug("FMC: Request: " + url)
-            r = requests.get(url, headers=self.headers, verify=False)
+            r = send_request(self.session, 'GET', url, self.headers, self.timeout)
             # REST call with SSL verification turned on:
             # r = requests.get(url, headers=headers, verify='/path/to/ssl_certificate')
             status_code = r.status_code
@@ -109,7 +114,7 @@ class FirepowerManagementCenter:
             # REST call with SSL verification turned off:
             logging.debug("FMC: Request: " + url)
             logging.debug("FMC: Post_data " + str(post_data))
-            r = requests.post(url, data=json.dumps(post_data), headers=self.headers, verify=False)
+            r = send_request(self.session, 'POST', url, self.headers, self.timeout, data=json.dumps(post_data))
             # REST call with SSL verification turned on:
             # r = requests.post(url,data=json.dumps(post_data), headers=self.headers, verify='/path/to/ssl_certificate')
             status_code = r.status_code
@@ -148,7 +153,7 @@ class FirepowerManagementCenter:
             # REST call with SSL verification turned off:
             logging.debug("FMC: Request: " + url)
             logging.debug("FMC: Put_data: " + str(put_data))
-            r = requests.put(url, data=json.dumps(put_data), headers=self.headers, verify=False)
+            r = send_request(self.session, 'PUT', url, self.headers, self.timeout, data=json.dumps(put_data))
             # REST call with SSL verification turned on:
             # r = requests.put(url, data=json.dumps(put_data), headers=headers, verify='/path/to/ssl_certificate')
             status_code = r.status_code
@@ -184,7 +189,7 @@ class FirepowerManagementCenter:
         try:
             # REST call with SSL verification turned off:
             logging.debug("FMC: Request: " + url)
-            r = requests.delete(url, headers=self.headers, verify=False)
+            r = send_request(self.session, 'DELETE', url, self.headers, self.timeout)
             # REST call with SSL verification turned on:
             # r = requests.delete(url, headers=headers, verify='/path/to/ssl_certificate')
             status_code = r.status_code
@@ -223,8 +228,8 @@ class FirepowerManagementCenter:
             # The one with "SSL verification turned off" is commented out. If you like to use that then
             # uncomment the line where verify=False and comment the line with =verify='/path/to/ssl_certificate'
             # REST call with SSL verification turned off:
-            r = requests.post(auth_url, headers=self.headers,
-                              auth=requests.auth.HTTPBasicAuth(self.username, self.password), verify=False)
+            r = send_request(self.session, 'POST', auth_url, self.headers, self.timeout,
+                             auth=requests.auth.HTTPBasicAuth(self.username, self.password))
             # REST call with SSL verification turned on: Download SSL certificates
             # from your FMC first and provide its path for verification.
             # r = requests.post(auth_url, headers=self.headers,
@@ -248,6 +253,46 @@ class FirepowerManagementCenter:
         finally:
             if r: r.close()
 
+    def refresh_auth_token(self, token):
+        """
+        Purpose:    refresh an existing REST authentication token via refreshtoken API
+                    update the 'headers' variable
+                    set a timestamp & refresh count for the header
+        Parameters: Existing token (auth headers)
+        Returns:    auth headers, None
+        Raises:
+        """
+        self.headers = {'Content-Type': 'application/json'}
+        api_auth_path = "/api/fmc_platform/v1/auth/refreshtoken"
+        auth_url = self.server + api_auth_path
+        r = None
+        try:
+            # Token is saved from response headers, hence header names are matched case-insensitively
+            token = requests.structures.CaseInsensitiveDict(token)
+            headers = {
+                'Content-Type': 'application/json',
+                'X-auth-access-token': token['X-auth-access-token'],
+                'X-auth-refresh-token': token['X-auth-refresh-token']
+            }
+            r = send_request(self.session, 'POST', auth_url, headers, self.timeout)
+            auth_headers = dict(r.headers)
+            auth_token = auth_headers.get('X-auth-access-token', None)
+            if auth_token is None:
+                logging.debug("auth_token not found in refresh response, status code: " + str(r.status_code))
+                return None
+            self.domain_uuid = auth_headers.get('domain_uuid', token.get('domain_uuid'))
+            auth_headers['domain_uuid'] = self.domain_uuid
+            self.headers['X-auth-access-token'] = auth_token
+            self.authTokenTimestamp = int(time.time())
+            auth_headers["authTokenTimestamp"] = self.authTokenTimestamp
+            auth_headers["refreshCount"] = int(token.get('refreshCount', 0)) + 1
+            return auth_headers
+        except Exception as err:
+            logger.error("FMC: Error in refreshing auth token --> " + str(err))
+            return None
+        finally:
+            if r: r.close()
+
     def write_existing_token(self, token_str):
         try:
             #token = json.loads(token_str) token = ast.literal_eval(token_str)
@@ -269,7 +314,7 @@ class FirepowerManagementCenter:
             url = self.server + api_path
             #r = self.rest_get(url)
             for i in range(0,3):
-                r = requests.get(url, headers=self.headers, verify=False)
+                r = send_request(self.session, 'GET', url, self.headers, self.timeout)
                 status_code = r.status_code
                 if 200 <= status_code <=202:
                     #return r.json()['items'][0]['time']*1000
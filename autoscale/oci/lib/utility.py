@@ -40,6 +40,12 @@ from dateutil.tz import tzutc
 logging.basicConfig(force=True, level="INFO")
 logger = logging.getLogger()
 
+# FMC auth token is valid for 30 minutes & can be refreshed 3 times,
+# callers stop using a token 5 minutes before expiry so that token manager can refresh it meanwhile
+TOKEN_MAX_AGE = 30*60
+TOKEN_MAX_REFRESH = 3
+TOKEN_LEASE_MARGIN = 5*60
+
 class TokenCaller:
     def __init__(self, compartmentId, appName):
         self.compartmentId = compartmentId
@@ -47,7 +53,7 @@ class TokenCaller:
         self.signer = oci.auth.signers.get_resource_principals_signer()
         self.functions_client = oci.functions.FunctionsManagementClient(config={}, signer = self.signer)
         self.funcName = "ftdv_token_manager"
-        self.authTokenMaxAge = 30*60  # seconds - 30 minutes is the max without using refresh
+        self.authTokenMaxAge = TOKEN_MAX_AGE - TOKEN_LEASE_MARGIN  # seconds - token is handed out till this age
         #self.functionId = self.get_function_id(self.funcName)
         
     def get_token(self, endpoint):
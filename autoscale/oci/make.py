@@ -42,6 +42,8 @@ fmc_lib_file = full_dir_path + 'lib/fmc.py'
 manager_lib_file = full_dir_path + 'lib/manager.py'
 ngfw_lib_file = full_dir_path + 'lib/ngfw.py'
 utility_lib_file = full_dir_path + 'lib/utility.py'
+# Shared FMC client package, needed wherever fmc.py is copied
+ftdv_fmc_lib_dir = full_dir_path + '../../ftdv_fmc'
 # ftdv_scale_out_path = full_dir_path + 'oracle_functions/ftdv_scale_out/'
 
 ftdv_configure_path = full_dir_path + 'oracle_functions/ftdv_configure/'
@@ -51,6 +53,8 @@ ftdv_remove_unhealthy_vm_path = full_dir_path + 'oracle_functions/ftdv_remove_un
 ftdv_scale_in_path = full_dir_path + 'oracle_functions/ftdv_scale_in/'
 ftdv_token_manager_path = full_dir_path + 'oracle_functions/ftdv_token_manager/'
 ftdv_teardown_operations_path = full_dir_path + 'oracle_functions/ftdv_teardown_operations/'
+fmc_lib_function_paths = [ftdv_configure_path, ftdv_publish_metrics_path, ftdv_remove_unhealthy_vm_path,
+                          ftdv_scale_in_path, ftdv_token_manager_path, ftdv_teardown_operations_path]
 
 def print_function_name(function):
     def echo_func(*func_args, **func_kwargs):
@@ -205,6 +209,9 @@ def copy_lib_files():
 
     ftdv_teardown_operations_copy_cmd = "cp " + fmc_lib_file + " " + utility_lib_file + " " + ftdv_teardown_operations_path
     execute_cmd(ftdv_teardown_operations_copy_cmd)
+
+    for path in fmc_lib_function_paths:
+        execute_cmd("cp -r " + ftdv_fmc_lib_dir + " " + path)
     
     return True
 
@@ -241,6 +248,9 @@ def remove_lib_files():
     ftdv_teardown_operations_rm_cmd = "rm " +  ftdv_teardown_operations_path + "utility.py" + " " + \
                                   ftdv_teardown_operations_path +  "fmc.py"
     execute_cmd(ftdv_teardown_operations_rm_cmd)
+
+    for path in fmc_lib_function_paths:
+        execute_cmd("rm -rf " + path + "ftdv_fmc")
     return True
 
 @print_function_name
@@ -34,6 +34,7 @@ from utility import TokenCaller
 import utility as utl
 from cisco_oci import OCIInstance
 from manager import *
+from ftdv_fmc import with_call_stats
 
 logging.basicConfig(force=True, level="INFO")
 logging.getLogger("paramiko").setLevel(logging.WARNING)
@@ -108,6 +109,7 @@ class CustomQueue:
         except Exception as e:
             raise Exception(f"FTDv CONFIGURE {self.identifier}: ERROR IN RE-ORDERING QUEUE DATA "+repr(e))
 
+@with_call_stats
 def handler(ctx, data: io.BytesIO = None):
     try:
         begin_time = int(time.time())         # To Track time throughout the execution
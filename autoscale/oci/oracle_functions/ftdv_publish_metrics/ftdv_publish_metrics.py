@@ -37,6 +37,8 @@ import base64
 from fdk import response
 
 from fmc import FirepowerManagementCenter
+import ftdv_fmc
+from ftdv_fmc import with_call_stats
 import utility as utl
 
 # Logger Initialization
@@ -333,6 +335,36 @@ class publishMetrics:
         except Exception as err:
             logger.error("Unable to construct post metric data. Error Message : {}".format(err))
 
+    def publish_fmc_call_stats(self, records):
+        """
+        Purpose:    To post FMC call stats aggregates as OCI Monitoring datapoints, per endpoint & method
+        Parameters: Aggregates from ftdv_fmc CallStats.drain
+        Returns:
+        Raises:
+        """
+        timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time()))
+        metric_data = []
+        for stat in records:
+            dimensions = {'instancePoolId': self.instance_pool_id, 'endpoint': stat['Endpoint'],
+                          'method': stat['Method'], 'status': stat['Status']}
+            for name, value, unit in [('FmcCallLatencyP50', stat['P50'], 'Milliseconds'),
+                                      ('FmcCallLatencyP99', stat['P99'], 'Milliseconds'),
+                                      ('FmcCalls', stat['Count'], 'count'),
+                                      ('FmcCallErrors', stat['Errors'], 'count'),
+                                      ('FmcCallRetries', stat['Retries'], 'count')]:
+                metric_data.append(oci.monitoring.models.MetricDataDetails(
+                    namespace=self.namespace, compartment_id=self.compartment_id, name=name,
+                    dimensions=dimensions,
+                    datapoints=[oci.monitoring.models.Datapoint(timestamp=timestamp, value=value)],
+                    resource_group=self.resourceGroup, metadata={'unit': unit}))
+        # PostMetricData takes at most 50 metric streams per call
+        for i in range(0, len(metric_data), 50):
+            post_metric_data_response = self.monitoring_client.post_metric_data(
+                oci.monitoring.models.PostMetricDataDetails(metric_data=metric_data[i:i + 50]))
+            if post_metric_data_response.data.failed_metrics_count != 0:
+                logger.error("PUBLISH FMC CALL STATS : Unable to post metrics. Reason : {}".format(
+                    post_metric_data_response.data))
+
     def publish_cpu_metrics(self):
         try:
             cpu_value = self.fetch_cpu_usage_from_ftdv()
@@ -484,6 +516,7 @@ def decrypt_password(signer, crypto_endpoint, cipher, master_key_id):
         logger.error("PUBLISH METRICS: ERROR IN DECRYPTING FTDv PASSWORD ERROR: {}".format(e))
         return None
 
+@with_call_stats
 def handler(ctx, data: io.BytesIO = None):
 
     try:
@@ -524,6 +557,8 @@ def handler(ctx, data: io.BytesIO = None):
         obj = publishMetrics(signer, compartmentId, region, instancePoolId, metricNamespaceName,
                                 resourceGroupName, cpuMetricName, ftdv_password, healthcheckMetricName,
                                 elbId, elbBackendSetName, ilbId, ilbBackendSetName)
+        # FMC call stats of this invocation are posted along with custom metrics
+        ftdv_fmc.settings.CALL_STATS_PUBLISHER = obj.publish_fmc_call_stats
         obj.publish_cpu_metrics()
         obj.publish_health_check_data()
         if publish_memory_metric == "true":
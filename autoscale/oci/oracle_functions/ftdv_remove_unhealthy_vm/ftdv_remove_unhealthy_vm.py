@@ -38,6 +38,7 @@ import utility as utl
 from cisco_oci import OCIInstance
 from ngfw import ManagedDevice
 from manager import *
+from ftdv_fmc import with_call_stats
 
 logging.basicConfig(force=True, level="INFO")
 logging.getLogger("paramiko").setLevel(logging.WARNING)
@@ -150,6 +151,7 @@ class RemoveBackend:
             logger.error("REMOVE UNHEALTHY VM FUNCTION: ERROR IN REMOVING {0} VM FROM LOAD BALANCER FOR LISTENER PORT NO: {1} ERROR: {2}".format(lbName, portNo, repr(e)))
             return None
 
+@with_call_stats
 def handler(ctx, data: io.BytesIO = None):
     try:
         body = json.loads(data.getvalue())
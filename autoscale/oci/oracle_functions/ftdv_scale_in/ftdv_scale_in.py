@@ -34,6 +34,7 @@ import utility as utl
 from cisco_oci import OCIInstance
 from ngfw import ManagedDevice
 from manager import *
+from ftdv_fmc import with_call_stats
 
 logging.basicConfig(force=True, level="INFO")
 logging.getLogger("paramiko").setLevel(logging.WARNING)
@@ -289,6 +290,7 @@ def get_alarm_status(monitoring_client, compartment_id, alarm_name):
         logger.error("FTDv SCALE-IN: Unable to get the alarm status")
 
 
+@with_call_stats
 def handler(ctx, data: io.BytesIO = None):
 
     try:
@@ -8,6 +8,7 @@ import oci
 from fdk import response
 
 from fmc import DerivedFMC
+from ftdv_fmc import with_call_stats
 from utility import TokenCaller
 import utility as utl
 from fdk import response
@@ -49,6 +50,7 @@ class Teardown:
         return None
 
 
+@with_call_stats
 def handler(ctx, data: io.BytesIO = None):
     logger.info("----FTDv Teardown Operation called----")
     try:
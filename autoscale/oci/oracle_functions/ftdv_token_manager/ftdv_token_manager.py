@@ -7,6 +7,7 @@ import time
 import oci
 import utility as utl
 from fmc import FirepowerManagementCenter
+from ftdv_fmc import with_call_stats
 logger = logging.getLogger()
 
 class Token:
@@ -32,6 +33,32 @@ class Token:
             logger.error("FTDv TOKEN MANAGER: ERROR IN RETRIEVING TOKEN "+repr(e))
             return None    
 
+    def get_existing_token(self):
+        try:
+            config = self.functions_client.get_function(function_id = self.functionId).data.config
+            if "TOKEN" in config:
+                return json.loads(config['TOKEN'])
+            return None
+        except Exception as e:
+            logger.info("FTDv TOKEN MANAGER: UNABLE TO READ EXISTING TOKEN "+repr(e))
+            return None
+
+    def renew_token(self):
+        # Token is refreshed instead of generating a new one, so that concurrent callers share one token
+        token = self.get_existing_token()
+        if token is not None:
+            token_age = time.time() - int(token.get('authTokenTimestamp', 0))
+            if token_age < utl.TOKEN_MAX_AGE - utl.TOKEN_LEASE_MARGIN:
+                logger.info("FTDv TOKEN MANAGER: EXISTING TOKEN ALREADY RENEWED")
+                return token
+            if token_age < utl.TOKEN_MAX_AGE and int(token.get('refreshCount', 0)) < utl.TOKEN_MAX_REFRESH:
+                token_reponse = self.fmc.refresh_auth_token(token)
+                if token_reponse != None:
+                    logger.info("FTDv TOKEN MANAGER: TOKEN REFRESHED")
+                    self.write_token(json.dumps(token_reponse))
+                    return token_reponse
+        return self.create_new_token()
+
     def write_token(self, token_response):
         try:
             update_function_response = self.functions_client.update_function(
@@ -64,6 +91,7 @@ class Token:
         except Exception as e:
             raise Exception("ERROR IN RETRIEVING FUNCTION ID  "+repr(e))
 
+@with_call_stats
 def handler(ctx, data: io.BytesIO = None):
     try:
         #body = json.loads(data.getvalue())
@@ -92,7 +120,7 @@ def handler(ctx, data: io.BytesIO = None):
         tokenManager = Token(fmc_ip, fmc_username, fmc_password, compartmentId, application_name)
 
         for i in range(0,3):
-            token = tokenManager.create_new_token()
+            token = tokenManager.renew_token()
             if token != None:
                 break
                 
@@ -24,7 +24,10 @@ import time
 import requests
 import logging
 import json
+import constant as const
 import utility as utl
+import ftdv_fmc
+from ftdv_fmc import get_session as get_fmc_session, send_request
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
@@ -45,6 +48,8 @@ class FirepowerManagementCenter:
         self.authTokenTimestamp = 0
         self.authTokenMaxAge = 15*60  # seconds - 30 minutes is the max without using refresh
         self.accessPolicyName = accesspolicy
+        self.session = get_fmc_session(self.server)
+        self.timeout = (ftdv_fmc.settings.CONNECT_TIMEOUT, ftdv_fmc.settings.READ_TIMEOUT)
 
     def rest_get(self, url):
         """
@@ -61,7 +66,7 @@ class FirepowerManagementCenter:
         try:
             # REST call with SSL verification turned off:
             logging.debug("Request: " + url)
-            r = requests.get(url, headers=self.headers, verify=False)
+            r = send_request(self.session, 'GET', url, self.headers, self.timeout)
             # REST call with SSL verification turned on:
             # r = requests.get(url, headers=headers, verify='/path/to/ssl_certificate')
             status_code = r.status_code
@@ -98,7 +103,7 @@ class FirepowerManagementCenter:
             # REST call with SSL verification turned off:
             logging.debug("Request: " + url)
             logging.debug("Post_data " + str(post_data))
-            r = requests.post(url, data=json.dumps(post_data), headers=self.headers, verify=False)
+            r = send_request(self.session, 'POST', url, self.headers, self.timeout, data=json.dumps(post_data))
             # REST call with SSL verification turned on:
             # r = requests.post(url,data=json.dumps(post_data), headers=self.headers, verify='/path/to/ssl_certificate')
             status_code = r.status_code
@@ -135,7 +140,7 @@ class FirepowerManagementCenter:
             # REST call with SSL verification turned off:
             logging.info("Request: " + url)
             logging.info("Put_data: " + str(put_data))
-            r = requests.put(url, data=json.dumps(put_data), headers=self.headers, verify=False)
+            r = send_request(self.session, 'PUT', url, self.headers, self.timeout, data=json.dumps(put_data))
             # REST call with SSL verification turned on:
             # r = requests.put(url, data=json.dumps(put_data), headers=headers, verify='/path/to/ssl_certificate')
             status_code = r.status_code
@@ -169,7 +174,7 @@ class FirepowerManagementCenter:
         try:
             # REST call with SSL verification turned off:
             logging.debug("Request: " + url)
-            r = requests.delete(url, headers=self.headers, verify=False)
+            r = send_request(self.session, 'DELETE', url, self.headers, self.timeout)
             # REST call with SSL verification turned on:
             # r = requests.delete(url, headers=headers, verify='/path/to/ssl_certificate')
             status_code = r.status_code
@@ -208,8 +213,8 @@ class FirepowerManagementCenter:
             # The one with "SSL verification turned off" is commented out. If you like to use that then
             # uncomment the line where verify=False and comment the line with =verify='/path/to/ssl_certificate'
             # REST call with SSL verification turned off:
-            r = requests.post(auth_url, headers=self.headers,
-                              auth=requests.auth.HTTPBasicAuth(self.username, self.password), verify=False)
+            r = send_request(self.session, 'POST', auth_url, self.headers, self.timeout,
+                             auth=requests.auth.HTTPBasicAuth(self.username, self.password))
             # REST call with SSL verification turned on: Download SSL certificates
             # from your FMC first and provide its path for verification.
             # r = requests.post(auth_url, headers=self.headers,
@@ -32,6 +32,8 @@ cluster_lifecycle_zip = 'cluster_lifecycle.zip'
 lambda_layer_zip = 'cluster_layer.zip'
 full_dir_path = os.path.dirname(os.path.realpath(__file__)) + '/'
 target_path = full_dir_path + "target/"
+# Shared FMC client package, vendored into zips which have fmc.py
+ftdv_fmc_root_path = full_dir_path + '../../'
 
 
 def print_function_name(function):
@@ -123,6 +125,7 @@ def zip_():
         file = full_dir_path + 'lambda-python-files/' + file
         cmd = cmd + file + ' '
     execute_cmd(cmd)
+    zip_ftdv_fmc(cluster_manager_zip)
 
     list_of_files = ['aws.py', 'lifecycle_ftdv.py', 'constant.py', 'utility.py']
     cmd = 'zip -jr ' + target_path + cluster_lifecycle_zip + ' '
@@ -134,6 +137,12 @@ def zip_():
     return
 
 
+def zip_ftdv_fmc(zip_file):
+    # Package is added with its directory, not with junked paths like other files
+    cmd = 'cd ' + ftdv_fmc_root_path + ' && zip -r ' + target_path + zip_file + ' ftdv_fmc -x "*__pycache__*"'
+    execute_cmd(cmd)
+
+
 @print_function_name
 def copy():
     print("copies contents to target directory")
@@ -27,6 +27,7 @@ from googleapiclient import discovery
 import basic_functions as bf
 import time
 from fmc_functions import FirepowerManagementCenter
+from ftdv_fmc import with_call_stats
 import urllib3
 import os
 import paramiko
@@ -38,6 +39,7 @@ except ImportError:
     from io import StringIO
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+@with_call_stats
 def cluster_handler(event, context):
      """Triggered from a message on a Cloud Pub/Sub topic.
      Args:
@@ -0,0 +1,39 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       ftdv_fmc
+Purpose:    FMC REST client building blocks shared by AWS, OCI, GCP, cluster & GuardDuty functions
+            Each bundle vendors this package at build time, cloud specific FMC classes use it as below,
+              transport:    pooled keep-alive sessions, rate limited requests with 429/503 retries
+              circuit:      circuit breaker failing calls fast while FMC is unreachable or overloaded
+              instrumentation:  per-call latency/error aggregates, flushed once per invocation
+              paging:       paginated collection listing
+              readcache:    singleflight & scoped memoization of GET requests
+              tasks:        FMC task tracking at adaptive polling cadence
+              metrics:      Health Monitoring API response parsing
+            Defaults are in settings, cloud adapters override them at import
+"""
+
+from ftdv_fmc import settings
+from ftdv_fmc.circuit import get_circuit_breaker, CircuitBreaker, CircuitOpenError
+from ftdv_fmc.instrumentation import call_stats, flush_call_stats, with_call_stats, get_endpoint_template
+from ftdv_fmc.transport import get_session, get_rate_limiter, get_retry_after, send_request, RateLimiter
+from ftdv_fmc.paging import iter_collection
+from ftdv_fmc.readcache import ReadCache
+from ftdv_fmc.tasks import poll_intervals, get_task_state, TaskTracker
+from ftdv_fmc.metrics import parse_health_metrics
@@ -0,0 +1,225 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       circuit.py
+Purpose:    Circuit breaker for an unreachable or overloaded FMC
+            CLOSED: calls pass, consecutive failures are counted
+            OPEN: calls fail fast till cool-down is over
+            HALF-OPEN: one worker probes FMC, success closes the circuit & failure opens it again
+"""
+
+import time
+import logging
+import threading
+import requests
+from ftdv_fmc import settings
+
+logger = logging.getLogger(__name__)
+
+# Circuit breakers per FMC server, kept at module scope for warm function invocations
+circuit_breaker_pool = {}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+        Raised instead of sending a REST call while circuit of FMC is open
+    """
+    pass
+
+
+class _ProcessStore:
+    """
+        In-process stand-in for shared key-value store, used when settings.CIRCUIT_STORE is not given
+    """
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        item = self.data.get(key)
+        if item is None or (item[1] is not None and item[1] < time.time()):
+            return None
+        return item[0]
+
+    def put(self, key, value, ttl=None):
+        self.data[key] = (value, time.time() + ttl if ttl is not None else None)
+
+    def add(self, key, value, ttl=None):
+        with self.lock:
+            if self.get(key) is not None:
+                return False
+            self.put(key, value, ttl)
+            return True
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class CircuitBreaker:
+    """
+        CircuitBreaker class tracks health of an FMC, open state is kept in a store shared by workers
+        so that all of them fail fast once any of them finds FMC down
+        Closed state read from store is trusted for settings.CIRCUIT_STATE_TTL, so healthy calls do not read the store
+    """
+    def __init__(self, server, threshold, cool_down, state_store=None):
+        self.server = server
+        self.threshold = threshold
+        self.cool_down = cool_down
+        self.store = state_store if state_store is not None else _ProcessStore()
+        self.key = 'fmc-circuit:' + server
+        self.probe_key = 'fmc-circuit-probe:' + server
+        self.failures = 0
+        self.probing = False
+        self.lock = threading.Lock()
+        # Last open record read from store & when it was read
+        self.view = (None, None)
+
+    def __get_opened(self):
+        opened, read_at = self.view
+        # Store is read again only if circuit is not closed, last call failed or closed view is old
+        if opened is None and read_at is not None and self.failures == 0 and \
+                time.monotonic() < read_at + settings.CIRCUIT_STATE_TTL:
+            return None
+        opened = self.store.get(self.key)
+        self.view = (opened, time.monotonic())
+        return opened
+
+    def state(self):
+        """
+        Purpose:    To get state of circuit
+        Parameters:
+        Returns:    'CLOSED', 'OPEN', 'HALF-OPEN'
+        Raises:
+        """
+        try:
+            opened = self.__get_opened()
+        except Exception as e:
+            logger.debug("Circuit state unavailable: %s" % str(e))
+            return 'CLOSED'
+        if opened is None:
+            return 'CLOSED'
+        if time.time() < opened['opened_at'] + self.cool_down:
+            return 'OPEN'
+        return 'HALF-OPEN'
+
+    def retry_in(self):
+        """
+        Purpose:    To get seconds till cool-down of open circuit is over
+        Parameters:
+        Returns:    Seconds, 0 if circuit is not open
+        Raises:
+        """
+        try:
+            opened = self.__get_opened()
+        except Exception:
+            return 0
+        if opened is None:
+            return 0
+        return max(0, opened['opened_at'] + self.cool_down - time.time())
+
+    def healthy(self):
+        """
+        Purpose:    To check if circuit is closed & last call of this worker did not fail
+        Parameters:
+        Returns:    True if healthy
+        Raises:
+        """
+        return self.failures == 0 and self.state() == 'CLOSED'
+
+    def allow(self):
+        """
+        Purpose:    To check if a call may be sent, in HALF-OPEN only the worker holding the probe is allowed
+        Parameters:
+        Returns:    True if allowed
+        Raises:
+        """
+        state = self.state()
+        if state == 'CLOSED' or self.probing:
+            return True
+        if state == 'OPEN':
+            return False
+        try:
+            self.probing = self.store.add(self.probe_key, int(time.time()), ttl=self.cool_down)
+        except Exception as e:
+            logger.debug("Circuit probe unavailable: %s" % str(e))
+            self.probing = True
+        if self.probing:
+            logger.info("Circuit of %s is half-open, probing FMC" % self.server)
+        return self.probing
+
+    def on_success(self):
+        """
+        Purpose:    To reset failures, closes the circuit if it was probed
+        Parameters:
+        Returns:
+        Raises:
+        """
+        with self.lock:
+            self.failures = 0
+            if not self.probing:
+                return
+            self.probing = False
+        self.view = (None, time.monotonic())
+        try:
+            self.store.delete(self.key)
+            self.store.delete(self.probe_key)
+        except Exception as e:
+            logger.debug("Circuit state unavailable: %s" % str(e))
+        logger.info("Circuit of %s closed, FMC is reachable" % self.server)
+        return
+
+    def on_failure(self):
+        """
+        Purpose:    To count a failure, opens the circuit at threshold or on failed probe
+        Parameters:
+        Returns:
+        Raises:
+        """
+        with self.lock:
+            self.failures += 1
+            if self.failures < self.threshold and not self.probing:
+                return
+            self.failures = 0
+            self.probing = False
+        opened = {'opened_at': time.time()}
+        self.view = (opened, time.monotonic())
+        try:
+            # Open record outlives cool-down to let one worker probe in HALF-OPEN, it expires if none does
+            self.store.put(self.key, opened, ttl=2 * self.cool_down)
+            self.store.delete(self.probe_key)
+        except Exception as e:
+            logger.debug("Circuit state unavailable: %s" % str(e))
+        logger.error("Circuit of %s opened, FMC calls fail fast for %d seconds" % (self.server, self.cool_down))
+        if settings.METRIC_PUBLISHER is not None:
+            settings.METRIC_PUBLISHER('FmcCircuitOpened', 1, 'Count', None)
+        return
+
+
+def get_circuit_breaker(server):
+    """
+    Purpose:    To get circuit breaker for given FMC
+    Parameters: FMC server url
+    Returns:    CircuitBreaker object
+    Raises:
+    """
+    breaker = circuit_breaker_pool.get(server)
+    if breaker is None:
+        state_store = settings.CIRCUIT_STORE() if settings.CIRCUIT_STORE is not None else None
+        breaker = CircuitBreaker(server, settings.CIRCUIT_FAILURE_THRESHOLD, settings.CIRCUIT_COOL_DOWN, state_store)
+        circuit_breaker_pool[server] = breaker
+    return breaker
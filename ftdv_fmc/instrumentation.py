@@ -0,0 +1,176 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       instrumentation.py
+Purpose:    Per-call instrumentation of FMC REST calls
+            Calls are aggregated in-process per endpoint template, method & status into latency histograms
+            & flushed once per function invocation through settings.CALL_STATS_PUBLISHER
+"""
+
+import re
+import json
+import logging
+import threading
+from functools import wraps
+from urllib.parse import urlsplit
+from ftdv_fmc import settings
+
+logger = logging.getLogger(__name__)
+
+# Path segments which are object ids, UUID (FMC object & domain ids) or plain number
+id_segment = re.compile(r'^([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|\d+)$')
+
+
+def get_endpoint_template(url):
+    """
+    Purpose:    To get endpoint template of a REST url, ids in path are replaced with {id}
+    Parameters: url
+    Returns:    Path template, e.g. /api/fmc_config/v1/domain/{id}/devices/devicerecords/{id}/physicalinterfaces
+    Raises:
+    """
+    path = urlsplit(url).path.rstrip('/')
+    return '/'.join('{id}' if id_segment.match(segment) else segment for segment in path.split('/'))
+
+
+def get_percentile(buckets, counts, q):
+    """
+    Purpose:    To get percentile from a histogram
+    Parameters: Bucket upper bounds, Counts per bucket, Quantile (0-1)
+    Returns:    Upper bound of bucket holding the quantile
+    Raises:
+    """
+    total = sum(counts)
+    cumulative = 0
+    for bound, count in zip(buckets, counts):
+        cumulative += count
+        if cumulative >= q * total:
+            return bound
+    return buckets[-1]
+
+
+class CallStats:
+    """
+        CallStats class aggregates FMC REST calls per (endpoint template, method, status)
+        Latency is kept as histogram over settings.LATENCY_BUCKETS (milliseconds), last bucket is overflow
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    def record(self, method, url, status, latency, size=0, retries=0):
+        """
+        Purpose:    To add a call to its aggregate
+        Parameters: HTTP method, url, Status code or error name, Latency in seconds, Response bytes, Retries
+        Returns:
+        Raises:
+        """
+        key = (get_endpoint_template(url), method, str(status))
+        latency_ms = latency * 1000
+        with self.lock:
+            stat = self.stats.get(key)
+            if stat is None:
+                stat = {'count': 0, 'counts': [0] * (len(settings.LATENCY_BUCKETS) + 1), 'sum': 0.0, 'max': 0.0,
+                        'bytes': 0, 'retries': 0}
+                self.stats[key] = stat
+            index = next((i for i, bound in enumerate(settings.LATENCY_BUCKETS) if latency_ms <= bound),
+                         len(settings.LATENCY_BUCKETS))
+            stat['counts'][index] += 1
+            stat['count'] += 1
+            stat['sum'] += latency_ms
+            stat['max'] = max(stat['max'], latency_ms)
+            stat['bytes'] += size
+            stat['retries'] += retries
+
+    def drain(self):
+        """
+        Purpose:    To take aggregates recorded so far & reset them
+        Parameters:
+        Returns:    list of dict {Endpoint, Method, Status, Count, Errors, P50, P99, Avg, Max, Bytes, Retries,
+                    Values, Counts}, latencies in milliseconds, Values/Counts is the non empty part of histogram
+        Raises:
+        """
+        with self.lock:
+            stats, self.stats = self.stats, {}
+        records = []
+        for (endpoint, method, status), stat in stats.items():
+            buckets = list(settings.LATENCY_BUCKETS) + [max(stat['max'], settings.LATENCY_BUCKETS[-1])]
+            histogram = [(bound, count) for bound, count in zip(buckets, stat['counts']) if count > 0]
+            records.append({
+                'Endpoint': endpoint,
+                'Method': method,
+                'Status': status,
+                'Count': stat['count'],
+                'Errors': stat['count'] if not status.startswith(('1', '2', '3')) else 0,
+                'P50': get_percentile(buckets, stat['counts'], 0.5),
+                'P99': get_percentile(buckets, stat['counts'], 0.99),
+                'Avg': round(stat['sum'] / stat['count'], 3),
+                'Max': round(stat['max'], 3),
+                'Bytes': stat['bytes'],
+                'Retries': stat['retries'],
+                'Values': [bound for bound, count in histogram],
+                'Counts': [count for bound, count in histogram]
+            })
+        return records
+
+
+# Aggregates kept at module scope, flushed by each invocation
+call_stats = CallStats()
+
+
+def log_call_stats(records):
+    """
+    Purpose:    Default publisher, writes one JSON line per aggregate (structured log on GCP Cloud Logging)
+    Parameters: Aggregates from CallStats.drain
+    Returns:
+    Raises:
+    """
+    for record in records:
+        print(json.dumps(dict(record, message='FMC call stats'), separators=(',', ':')))
+
+
+def flush_call_stats():
+    """
+    Purpose:    To publish & reset aggregates of FMC calls, called once at end of an invocation
+    Parameters:
+    Returns:
+    Raises:
+    """
+    records = call_stats.drain()
+    if len(records) == 0:
+        return
+    publisher = settings.CALL_STATS_PUBLISHER if settings.CALL_STATS_PUBLISHER is not None else log_call_stats
+    try:
+        publisher(records)
+    except Exception as e:
+        logger.error("Unable to publish FMC call stats: " + str(e))
+
+
+def with_call_stats(handler):
+    """
+    Purpose:    Decorator of function entry points, flushes FMC call stats when handler returns or raises
+    Parameters: Handler function
+    Returns:    Wrapped handler
+    Raises:
+    """
+    @wraps(handler)
+    def wrapper(*args, **kwargs):
+        try:
+            return handler(*args, **kwargs)
+        finally:
+            flush_call_stats()
+    return wrapper
@@ -0,0 +1,52 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       metrics.py
+Purpose:    Parsing of FMC Health Monitoring API responses
+"""
+
+import json
+from ftdv_fmc import settings
+
+
+def parse_health_metrics(response, device_ids):
+    """
+    Purpose:    To split Health Monitoring API (Prometheus style) response of many devices per device
+    Parameters: Response json, List of queried device ids
+    Returns:    dict {device id: {'timestamps': [], 'values': []}}
+    Raises:
+    """
+    metrics = {}
+    for item in response.get('items', []):
+        data = item.get('response')
+        if isinstance(data, str):
+            data = json.loads(data)
+        for series in data.get('data', {}).get('result', []):
+            labels = series.get('metric', {})
+            device_id = next((labels[label] for label in settings.METRIC_DEVICE_LABELS if label in labels), None)
+            if device_id is None and len(device_ids) == 1:
+                # Single device query, series need not carry device label
+                device_id = device_ids[0]
+            if device_id not in device_ids or device_id in metrics:
+                continue
+            values = series.get('values', [])
+            metrics[device_id] = {
+                'timestamps': [float(value[0]) for value in values],
+                'values': [float(value[1]) for value in values]
+            }
+    return metrics
@@ -0,0 +1,57 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       paging.py
+Purpose:    Paginated listing of FMC collections
+"""
+
+from urllib.parse import urlencode, urlsplit
+import requests
+from ftdv_fmc import settings
+
+
+def iter_collection(fmc, path, page_size=None, expanded=False, filter=None):
+    """
+    Purpose:    Generator over items of a FMC collection, fetched page by page following paging.next links
+                Only one page is held in memory, caller can stop iterating at first match
+    Parameters: FMC client (with server & rest_get), API path of collection, Items per page, Expanded items,
+                FMC filter expression
+    Returns:    Items of collection
+    Raises:     requests.exceptions.HTTPError, on failed page fetch
+    """
+    query = {'offset': 0, 'limit': page_size if page_size is not None else settings.PAGE_SIZE}
+    if expanded:
+        query['expanded'] = 'true'
+    if filter is not None:
+        query['filter'] = filter
+    url = fmc.server + path + '?' + urlencode(query)
+    while url is not None:
+        r = fmc.rest_get(url)
+        # A failed page must not look like end of collection
+        if not 200 <= r.status_code <= 300:
+            raise requests.exceptions.HTTPError("Error occurred in Get --> " + r.text, response=r)
+        page = r.json()
+        for item in page.get('items', []):
+            yield item
+        next_links = page.get('paging', {}).get('next', [])
+        if next_links:
+            # FMC may advertise its own hostname in links, hence only path & query are taken from it
+            link = urlsplit(next_links[0])
+            url = fmc.server + link.path + '?' + link.query
+        else:
+            url = None
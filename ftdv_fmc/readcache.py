@@ -0,0 +1,162 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       readcache.py
+Purpose:    Read-through layer for FMC GET requests,
+            identical in-flight GETs share one request (singleflight) & successful responses are
+            memoized within an open read scope of the calling thread, writes drop memoized responses
+            of the changed collection
+"""
+
+import logging
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self, generation):
+        self.generation = generation
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class ReadCache:
+    """
+        ReadCache class deduplicates & memoizes GET responses of one FMC client
+        Memoization is active only within read scopes & scopes are per thread, so polling outside a scope
+        always sees fresh data, even while another thread sharing the client has a scope open
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.generation = 0
+        # Memoized responses of each thread having an open scope, by thread id
+        self.responses = {}
+        self.in_flight = {}
+
+    @contextmanager
+    def scope(self):
+        """
+        Purpose:    Context manager of an operation scope of calling thread,
+                    responses are memoized till its outermost scope exits
+        Parameters:
+        Returns:
+        Raises:
+        """
+        thread_id = threading.get_ident()
+        depth = getattr(self.local, 'depth', 0)
+        if depth == 0:
+            self.local.hits = 0
+            with self.lock:
+                self.responses[thread_id] = {}
+        self.local.depth = depth + 1
+        try:
+            yield self
+        finally:
+            self.local.depth -= 1
+            if self.local.depth == 0:
+                if self.local.hits:
+                    logger.debug("%d GET requests served from read cache" % self.local.hits)
+                with self.lock:
+                    self.responses.pop(thread_id, None)
+
+    @contextmanager
+    def join(self, thread_id):
+        """
+        Purpose:    Context manager to let calling thread use open read scope of another thread,
+                    i.e. worker threads of a fan-out started within a scope
+        Parameters: Thread id of scope owner
+        Returns:
+        Raises:
+        """
+        own_thread_id = threading.get_ident()
+        with self.lock:
+            responses = self.responses.get(thread_id)
+            joined = responses is not None and own_thread_id not in self.responses
+            if joined:
+                self.responses[own_thread_id] = responses
+        if joined:
+            self.local.hits = 0
+        try:
+            yield self
+        finally:
+            if joined:
+                with self.lock:
+                    self.responses.pop(own_thread_id, None)
+
+    def get(self, url, fetch):
+        """
+        Purpose:    To get response of a GET, from memo, from identical in-flight request or by fetching it
+        Parameters: url, function sending the request
+        Returns:    Response
+        Raises:     Exception of fetch
+        """
+        with self.lock:
+            responses = self.responses.get(threading.get_ident())
+            if responses is not None and url in responses:
+                self.local.hits += 1
+                return responses[url]
+            call = self.in_flight.get(url)
+            leader = call is None
+            if leader:
+                call = _Call(self.generation)
+                self.in_flight[url] = call
+        if not leader:
+            if responses is not None:
+                self.local.hits += 1
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.response
+        try:
+            call.response = fetch()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                if self.in_flight.get(url) is call:
+                    del self.in_flight[url]
+                # Response fetched across a write may be stale, hence it is not memoized
+                if call.error is None and responses is not None and call.generation == self.generation and \
+                        call.response is not None and call.response.status_code == 200:
+                    responses[url] = call.response
+            call.done.set()
+        return call.response
+
+    def invalidate(self, url):
+        """
+        Purpose:    To drop memoized responses affected by a write to url
+                    parent collection of url is dropped, e.g. item PUT drops listing of its collection
+        Parameters: url of POST/PUT/DELETE
+        Returns:
+        Raises:
+        """
+        link = urlsplit(url)
+        prefix = link.scheme + '://' + link.netloc + link.path.rstrip('/').rsplit('/', 1)[0]
+        with self.lock:
+            self.generation += 1
+            for responses in self.responses.values():
+                for key in [key for key in responses if key.startswith(prefix)]:
+                    del responses[key]
+            for key in [key for key in self.in_flight if key.startswith(prefix)]:
+                del self.in_flight[key]
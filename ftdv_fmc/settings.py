@@ -0,0 +1,69 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       settings.py
+Purpose:    Defaults of ftdv_fmc package, cloud adapters may override them at import
+            (values are read at call time)
+"""
+
+# FMC REST connection pool & timeouts (seconds)
+CONNECTION_POOL_SIZE = 10
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 120
+
+# FMC REST rate limit per user is 120 requests/minute, client side limit is kept a little lower
+RATE_LIMIT = 110
+RATE_LIMIT_BURST = 10
+# Optional function(key, ttl) returning count after increment, to share the limit among workers
+RATE_COUNTER = None
+
+# Retries of throttled(429/503) REST calls, with jittered exponential backoff unless Retry-After is given
+THROTTLE_RETRIES = 5
+BACKOFF_BASE = 2
+BACKOFF_MAX = 60
+
+# Circuit breaker, consecutive failed calls (connection error, timeout, 5xx, throttled beyond retries)
+# which open the circuit & seconds it stays open before one probe call is let through
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_COOL_DOWN = 300
+# Seconds a worker trusts closed state read from store, open state set by other workers is seen this late
+CIRCUIT_STATE_TTL = 5
+# Optional function returning key-value store (get/put/add/delete with ttl) to share circuit state among workers
+CIRCUIT_STORE = None
+
+# Optional function(metric name, value, unit, dimensions) to publish client metrics
+METRIC_PUBLISHER = None
+
+# Latency histogram bucket upper bounds (milliseconds) of per-call instrumentation
+LATENCY_BUCKETS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000]
+# Optional function(list of aggregates) to publish FMC call stats, structured log lines are written if not given
+CALL_STATS_PUBLISHER = None
+
+# Items per page for collection listing, FMC caps limit at 1000
+PAGE_SIZE = 1000
+
+# FMC task polling (seconds), interval starts at TASK_POLL_MIN & grows by TASK_POLL_BACKOFF times
+TASK_POLL_MIN = 5
+TASK_POLL_MAX = 30
+TASK_POLL_BACKOFF = 1.5
+# Task status / message values of job/taskstatuses denoting completion
+TASK_SUCCESS_STATES = ['SUCCESS', 'SUCCEEDED', 'COMPLETED', 'DEPLOYED', 'DEVICE_SUCCESSFULLY_REGISTERED']
+TASK_FAILURE_STATES = ['FAILED', 'FAILURE', 'ERROR', 'DEPLOYMENT_FAILED', 'DISCOVERY_FAILED', 'REGISTRATION_FAILED']
+
+# Labels which carry device id in Health Monitoring API result series
+METRIC_DEVICE_LABELS = ['deviceUUID', 'uuid', 'device_uuid']
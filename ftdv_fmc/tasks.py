@@ -0,0 +1,117 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       tasks.py
+Purpose:    Tracking of FMC tasks (job/taskstatuses) at adaptive polling cadence
+"""
+
+import time
+import logging
+from ftdv_fmc import settings
+
+logger = logging.getLogger(__name__)
+
+
+def poll_intervals(timeout):
+    """
+    Purpose:    Generator of adaptive polling intervals, short at first & growing till TASK_POLL_MAX
+    Parameters: Seconds to poll for
+    Returns:    Seconds to sleep before next poll, stops when timeout is reached
+    Raises:
+    """
+    deadline = time.time() + timeout
+    interval = settings.TASK_POLL_MIN
+    while time.time() < deadline:
+        yield min(interval, max(0, deadline - time.time()))
+        interval = min(settings.TASK_POLL_MAX, interval * settings.TASK_POLL_BACKOFF)
+
+
+def get_task_state(task):
+    """
+    Purpose:    To classify job/taskstatuses response
+    Parameters: Task status json
+    Returns:    SUCCESS, FAILED, PENDING
+    Raises:
+    """
+    states = {str(task.get('status', '')).upper(), str(task.get('message', '')).upper()}
+    if states & set(settings.TASK_FAILURE_STATES):
+        return 'FAILED'
+    if states & set(settings.TASK_SUCCESS_STATES):
+        return 'SUCCESS'
+    return 'PENDING'
+
+
+class TaskTracker:
+    """
+        TaskTracker class tracks FMC tasks at adaptive cadence, status of all outstanding tasks is queried together
+        FMC client needs get_task_status(task id), get_task_statuses(task ids) is used for many tasks if present
+    """
+    def __init__(self, fmc):
+        self.fmc = fmc
+        self.states = {}
+
+    def add(self, task_ids):
+        """
+        Purpose:    To add tasks to be tracked
+        Parameters: List of task Ids
+        Returns:
+        Raises:
+        """
+        for task_id in task_ids:
+            self.states.setdefault(task_id, 'PENDING')
+        return
+
+    def poll(self):
+        """
+        Purpose:    To query status of all pending tasks once
+        Parameters:
+        Returns:    List of pending task Ids
+        Raises:
+        """
+        pending = [task_id for task_id, state in self.states.items() if state == 'PENDING']
+        if len(pending) > 1 and hasattr(self.fmc, 'get_task_statuses'):
+            statuses = self.fmc.get_task_statuses(pending)
+        else:
+            statuses = []
+            for task_id in pending:
+                try:
+                    statuses.append(self.fmc.get_task_status(task_id))
+                except Exception as e:
+                    statuses.append(e)
+        for task_id, status in zip(pending, statuses):
+            if isinstance(status, Exception):
+                logger.debug("Status of task %s not available: %s" % (task_id, str(status)))
+                continue
+            self.states[task_id] = status
+        return [task_id for task_id in pending if self.states[task_id] == 'PENDING']
+
+    def wait(self, task_ids, minutes):
+        """
+        Purpose:    To wait till tasks complete
+        Parameters: List of task Ids, Minutes
+        Returns:    dict {task Id: SUCCESS/FAILED/PENDING}
+        Raises:
+        """
+        self.add(task_ids)
+        intervals = poll_intervals(minutes * 60)
+        while self.poll():
+            wait = next(intervals, None)
+            if wait is None:
+                break
+            time.sleep(wait)
+        return {task_id: self.states[task_id] for task_id in task_ids}
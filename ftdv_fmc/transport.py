@@ -0,0 +1,237 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       transport.py
+Purpose:    Pooled keep-alive sessions & rate limited REST requests to FMC
+"""
+
+import time
+import random
+import logging
+import threading
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.exceptions import InsecureRequestWarning
+from ftdv_fmc import settings
+from ftdv_fmc.circuit import get_circuit_breaker, CircuitOpenError
+from ftdv_fmc.instrumentation import call_stats
+requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+
+logger = logging.getLogger(__name__)
+
+# Connection pools & rate limiters per FMC server, kept at module scope so that warm function invocations
+# re-use already established keep-alive TCP/TLS connections & continue same rate bucket
+session_pool = {}
+rate_limiter_pool = {}
+
+
+def get_session(server):
+    """
+    Purpose:    To get a pooled keep-alive requests.Session for given FMC
+    Parameters: FMC server url
+    Returns:    requests.Session object
+    Raises:
+    """
+    session = session_pool.get(server)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.CONNECTION_POOL_SIZE, max_retries=0)
+        session.mount('https://', adapter)
+        session.headers.update({'Connection': 'keep-alive', 'Accept-Encoding': 'gzip'})
+        # SSL verification turned off, same as all other REST calls to FMC
+        session.verify = False
+        session_pool[server] = session
+    return session
+
+
+class RateLimiter:
+    """
+        RateLimiter class is a thread safe token bucket for REST calls to an FMC
+        Rate is adaptive, it is cut down on every throttled(429) response & recovers slowly on success
+        If a counter is given, calls per minute are also counted through it for all workers
+    """
+    def __init__(self, server, rate_per_minute, burst, counter=None):
+        self.server = server
+        self.limit = rate_per_minute
+        self.max_rate = rate_per_minute / 60.0
+        self.min_rate = self.max_rate / 10
+        self.rate = self.max_rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+        self.counter = counter
+
+    def __refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def __wait_shared(self):
+        # Counter of current minute, FMC too counts requests per minute
+        minute = int(time.time() // 60)
+        key = 'fmc-rate:%s:%d' % (self.server, minute)
+        try:
+            count = self.counter(key, 120)
+        except Exception as e:
+            logger.debug("Shared rate counter unavailable: %s" % str(e))
+            return 0
+        if count <= self.limit:
+            return 0
+        wait = (minute + 1) * 60 - time.time() + random.uniform(0, 1)
+        time.sleep(wait)
+        return wait
+
+    def acquire(self):
+        """
+        Purpose:    To wait till a REST call is allowed
+        Parameters:
+        Returns:    Seconds waited
+        Raises:
+        """
+        waited = 0
+        with self.lock:
+            self.__refill()
+            if self.tokens < 1:
+                wait = (1 - self.tokens) / self.rate
+                time.sleep(wait)
+                waited += wait
+                self.__refill()
+            self.tokens -= 1
+        if self.counter is not None:
+            waited += self.__wait_shared()
+        return waited
+
+    def on_throttled(self):
+        """
+        Purpose:    To halve the rate & empty the bucket on throttled response
+        Parameters:
+        Returns:
+        Raises:
+        """
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0
+            self.last = time.monotonic()
+        logger.info("FMC throttled the client, rate lowered to %.2f calls/minute" % (self.rate * 60))
+        return
+
+    def on_success(self):
+        """
+        Purpose:    To recover the rate gradually after a successful response
+        Parameters:
+        Returns:
+        Raises:
+        """
+        if self.rate < self.max_rate:
+            with self.lock:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+        return
+
+
+def get_rate_limiter(server):
+    """
+    Purpose:    To get rate limiter for given FMC
+    Parameters: FMC server url
+    Returns:    RateLimiter object
+    Raises:
+    """
+    limiter = rate_limiter_pool.get(server)
+    if limiter is None:
+        limiter = RateLimiter(server, settings.RATE_LIMIT, settings.RATE_LIMIT_BURST, settings.RATE_COUNTER)
+        rate_limiter_pool[server] = limiter
+    return limiter
+
+
+def get_retry_after(r):
+    """
+    Purpose:    To get wait time from Retry-After header of a response
+    Parameters: Response
+    Returns:    Seconds, None if header is absent or is not in seconds
+    Raises:
+    """
+    try:
+        return max(0, int(r.headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        return None
+
+
+def publish_metric(metric_name, value, unit, dimensions):
+    if settings.METRIC_PUBLISHER is not None:
+        settings.METRIC_PUBLISHER(metric_name, value, unit, dimensions)
+
+
+def send_request(session, method, url, headers=None, timeout=None, **kwargs):
+    """
+    Purpose:    To send a REST request within client side rate limit of its FMC
+                throttled(429/503) requests are retried after Retry-After or jittered exponential backoff
+    Parameters: requests.Session, HTTP method, url, headers, timeout, keyword arguments of requests.Session.request
+    Returns:    Response of last attempt
+    Raises:     requests exceptions of connection errors, CircuitOpenError if circuit of FMC is open
+    """
+    link = urlsplit(url)
+    server = link.scheme + '://' + link.netloc
+    breaker = get_circuit_breaker(server)
+    if not breaker.allow():
+        call_stats.record(method, url, 'CIRCUIT_OPEN', 0)
+        raise CircuitOpenError("Circuit of %s is open, %s %s not sent" % (server, method, url))
+    limiter = get_rate_limiter(server)
+    if timeout is None:
+        timeout = (settings.CONNECT_TIMEOUT, settings.READ_TIMEOUT)
+    waited = 0
+    throttled = 0
+    attempt = 0
+    # Time spent in requests, rate limit & backoff waits are accounted separately
+    latency = 0
+    while True:
+        waited += limiter.acquire()
+        started = time.monotonic()
+        try:
+            r = session.request(method, url, headers=headers, verify=False, timeout=timeout, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            call_stats.record(method, url, type(e).__name__, latency + time.monotonic() - started, 0, attempt)
+            breaker.on_failure()
+            raise
+        latency += time.monotonic() - started
+        if r.status_code not in (429, 503):
+            limiter.on_success()
+            break
+        throttled += 1
+        limiter.on_throttled()
+        if attempt >= settings.THROTTLE_RETRIES:
+            logger.error("%s %s throttled, retries exhausted" % (method, url))
+            break
+        wait = get_retry_after(r)
+        if wait is None:
+            wait = min(settings.BACKOFF_MAX, settings.BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1)
+        logger.info("%s %s throttled with %d, retrying in %.1f seconds" % (method, url, r.status_code, wait))
+        r.close()
+        time.sleep(wait)
+        waited += wait
+        attempt += 1
+    call_stats.record(method, url, r.status_code, latency, len(r.content or b''), attempt)
+    if r.status_code >= 500 or r.status_code == 429:
+        breaker.on_failure()
+    else:
+        breaker.on_success()
+    if throttled:
+        publish_metric('FmcThrottledCalls', throttled, 'Count', {'Method': method})
+    if waited >= 1:
+        publish_metric('FmcRateLimitWait', round(waited, 3), 'Seconds', {'Method': method})
+    return r
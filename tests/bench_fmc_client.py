@@ -0,0 +1,153 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       bench_fmc_client.py
+Purpose:    Micro-benchmark of shared FMC client(ftdv_fmc) hot path, i.e. GET of a paginated collection
+            through read cache, circuit breaker, rate limiter & call stats, as rest_get of cloud FMC classes does
+            FMC is a canned in-process session, so only client side overhead is measured
+Usage:      python tests/bench_fmc_client.py [--pages N] [--page-size N] [--repeat N]
+"""
+
+import os
+import sys
+import json
+import timeit
+import argparse
+from functools import partial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ftdv_fmc
+from ftdv_fmc import settings, send_request, iter_collection, ReadCache, call_stats
+
+SERVER = 'https://fmc.example.com'
+PATH = '/api/fmc_config/v1/domain/e276abec-e0f2-11e3-8169-6d9ed49b625f/object/hosts'
+
+
+class CannedResponse:
+    def __init__(self, body):
+        self.status_code = 200
+        self.headers = {'Content-Type': 'application/json'}
+        self.content = json.dumps(body).encode()
+        self.text = self.content.decode()
+
+    def json(self):
+        return json.loads(self.content)
+
+    def close(self):
+        pass
+
+
+class CannedSession:
+    """
+        CannedSession class answers GETs of one collection page by page, like FMC does with paging.next links
+    """
+    def __init__(self, pages, page_size):
+        self.requests = 0
+        self.responses = {}
+        for page in range(pages):
+            body = {'items': [{'id': '%08d' % (page * page_size + i), 'type': 'Host', 'value': '10.0.0.1'}
+                              for i in range(page_size)],
+                    'paging': {'offset': page * page_size, 'limit': page_size, 'count': pages * page_size}}
+            if page + 1 < pages:
+                body['paging']['next'] = ['https://fmc.internal' + PATH + '?offset=%d&limit=%d' %
+                                          ((page + 1) * page_size, page_size)]
+            self.responses['offset=%d&limit=%d' % (page * page_size, page_size)] = CannedResponse(body)
+
+    def request(self, method, url, **kwargs):
+        self.requests += 1
+        return self.responses[url.split('?', 1)[1]]
+
+
+class BenchClient:
+    # Same GET path as rest_get of cloud FMC classes, without token handling & logging
+    def __init__(self, session):
+        self.server = SERVER
+        self.session = session
+        self.headers = {'Content-Type': 'application/json'}
+        self.read_cache = ReadCache()
+
+    def rest_get(self, url):
+        return self.read_cache.get(url, partial(send_request, self.session, 'GET', url, self.headers))
+
+
+def measure(function, repeat, number):
+    # Best of repeat runs, in seconds per call
+    return min(timeit.Timer(function).repeat(repeat, number)) / number
+
+
+def run(pages, page_size, repeat):
+    """
+    Purpose:    To time hot path cases
+    Parameters: Pages of collection, Items per page, Repeats of each case
+    Returns:    list of (case, seconds per run, requests sent per run)
+    Raises:
+    """
+    # Client side rate limit would make the benchmark measure sleeps, it is lifted as a cloud adapter would
+    settings.RATE_LIMIT = 10 ** 9
+    settings.RATE_LIMIT_BURST = 10 ** 9
+    ftdv_fmc.transport.rate_limiter_pool.pop(SERVER, None)
+    session = CannedSession(pages, page_size)
+    fmc = BenchClient(session)
+    url = SERVER + PATH + '?offset=0&limit=%d' % page_size
+
+    def listing():
+        assert sum(1 for _ in iter_collection(fmc, PATH, page_size)) == pages * page_size
+
+    def scoped_listings():
+        # An operation listing same collection thrice, e.g. lookup by name of three objects
+        with fmc.read_cache.scope():
+            for _ in range(3):
+                listing()
+
+    # (case, function, calls per run), single request cases are timed over many calls
+    cases = [
+        ('send_request GET', lambda: send_request(session, 'GET', url, fmc.headers), 1000),
+        ('rest_get, no scope', lambda: fmc.rest_get(url), 1000),
+        ('rest_get, memoized', lambda: fmc.read_cache.get(url, None), 1000),
+        ('iter_collection %dx%d' % (pages, page_size), listing, 1),
+        ('iter_collection x3 in scope', scoped_listings, 1),
+    ]
+    results = []
+    for name, function, number in cases:
+        sent = session.requests
+        if name == 'rest_get, memoized':
+            with fmc.read_cache.scope():
+                fmc.rest_get(url)
+                sent = session.requests
+                seconds = measure(function, repeat, number)
+        else:
+            seconds = measure(function, repeat, number)
+        results.append((name, seconds, (session.requests - sent) / float(repeat * number)))
+    call_stats.drain()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark of shared FMC client hot path")
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    print("%-32s %12s %10s" % ('case', 'usec/run', 'requests'))
+    for name, seconds, sent in run(args.pages, args.page_size, args.repeat):
+        print("%-32s %12.1f %10.1f" % (name, seconds * 10 ** 6, sent))
+
+
+if __name__ == '__main__':
+    main()
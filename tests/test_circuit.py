@@ -0,0 +1,160 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       test_circuit.py
+Purpose:    Unit tests of CircuitBreaker states & its reads of shared store
+"""
+
+import pytest
+from ftdv_fmc import settings
+from ftdv_fmc.circuit import CircuitBreaker, _ProcessStore
+
+SERVER = 'https://fmc.example.com'
+THRESHOLD = 3
+COOL_DOWN = 60
+
+
+class CountingStore(_ProcessStore):
+    # Shared store of workers, counting reads
+    def __init__(self):
+        _ProcessStore.__init__(self)
+        self.gets = 0
+
+    def get(self, key):
+        self.gets += 1
+        return _ProcessStore.get(self, key)
+
+
+class BrokenStore:
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise IOError("store is down")
+        return fail
+
+
+@pytest.fixture
+def shared():
+    return CountingStore()
+
+
+def breaker(state_store):
+    # A worker's breaker of the FMC
+    return CircuitBreaker(SERVER, THRESHOLD, COOL_DOWN, state_store)
+
+
+def open_circuit(worker):
+    for _ in range(THRESHOLD):
+        worker.on_failure()
+
+
+def test_closed_state_is_read_once_per_ttl(shared, clock):
+    worker = breaker(shared)
+    for _ in range(100):
+        assert worker.allow()
+        worker.on_success()
+    assert shared.gets == 1
+    clock.advance(settings.CIRCUIT_STATE_TTL)
+    assert worker.allow()
+    assert shared.gets == 2
+
+
+def test_store_is_read_after_local_failure(shared, clock):
+    worker = breaker(shared)
+    worker.allow()
+    worker.on_failure()
+    assert not worker.healthy()
+    worker.allow()
+    worker.allow()
+    assert shared.gets == 3
+    worker.on_success()
+    worker.allow()
+    assert shared.gets == 3
+
+
+def test_opened_by_other_worker(shared, clock):
+    worker, other = breaker(shared), breaker(shared)
+    assert worker.allow()
+    open_circuit(other)
+    # Closed view of worker is trusted till its TTL is over
+    assert worker.allow()
+    clock.advance(settings.CIRCUIT_STATE_TTL)
+    assert worker.state() == 'OPEN'
+    assert not worker.allow()
+    assert worker.retry_in() == COOL_DOWN - settings.CIRCUIT_STATE_TTL
+
+
+def test_opens_at_threshold(shared, clock):
+    worker = breaker(shared)
+    for _ in range(THRESHOLD - 1):
+        worker.on_failure()
+    assert worker.state() == 'CLOSED'
+    worker.on_failure()
+    assert worker.state() == 'OPEN'
+    assert not worker.allow()
+    # Open state is seen without waiting for TTL of closed view
+    assert breaker(shared).state() == 'OPEN'
+
+
+def test_open_record_expires(shared, clock):
+    open_circuit(breaker(shared))
+    value, expires_at = shared.data['fmc-circuit:' + SERVER]
+    assert expires_at == clock.now + 2 * COOL_DOWN
+    clock.advance(2 * COOL_DOWN + 1)
+    assert breaker(shared).state() == 'CLOSED'
+
+
+def test_one_probe_in_half_open(shared, clock):
+    worker, other = breaker(shared), breaker(shared)
+    open_circuit(worker)
+    clock.advance(COOL_DOWN)
+    assert worker.state() == 'HALF-OPEN'
+    assert worker.allow()
+    assert not other.allow()
+    # Probing worker keeps going till probe completes
+    assert worker.allow()
+
+
+def test_probe_success_closes(shared, clock):
+    worker, other = breaker(shared), breaker(shared)
+    open_circuit(worker)
+    clock.advance(COOL_DOWN)
+    assert worker.allow()
+    worker.on_success()
+    assert worker.healthy()
+    assert other.allow()
+    assert other.state() == 'CLOSED'
+
+
+def test_probe_failure_opens_again(shared, clock):
+    worker, other = breaker(shared), breaker(shared)
+    open_circuit(worker)
+    clock.advance(COOL_DOWN)
+    assert worker.allow()
+    worker.on_failure()
+    assert worker.state() == 'OPEN'
+    assert not other.allow()
+    assert other.retry_in() == COOL_DOWN
+
+
+def test_store_not_usable(clock):
+    worker = breaker(BrokenStore())
+    open_circuit(worker)
+    # Calls are not blocked by a store which is down
+    assert worker.state() == 'CLOSED'
+    assert worker.allow()
+    assert worker.retry_in() == 0
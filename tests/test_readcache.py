@@ -0,0 +1,244 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       test_readcache.py
+Purpose:    Unit tests of ReadCache scopes, singleflight & invalidation across threads
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from ftdv_fmc.readcache import ReadCache
+
+BASE = 'https://fmc/api/fmc_config/v1/domain/d'
+URL = BASE + '/object/hosts?offset=0&limit=1000'
+
+
+class Response:
+    def __init__(self, status_code=200, body=None):
+        self.status_code = status_code
+        self.body = body
+
+
+class Fetch:
+    """
+        Fetch class counts requests, a gate makes fetches block till test opens it
+    """
+    def __init__(self, status_code=200, gate=None):
+        self.status_code = status_code
+        self.gate = gate
+        self.started = threading.Event()
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            self.count += 1
+            count = self.count
+        self.started.set()
+        if self.gate is not None:
+            assert self.gate.wait(5)
+        return Response(self.status_code, count)
+
+
+def run_in_thread(target):
+    result = {}
+
+    def run():
+        try:
+            result['value'] = target()
+        except Exception as e:
+            result['error'] = e
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive()
+    if 'error' in result:
+        raise result['error']
+    return result['value']
+
+
+def test_memoized_only_within_scope():
+    cache = ReadCache()
+    fetch = Fetch()
+    with cache.scope():
+        assert cache.get(URL, fetch) is cache.get(URL, fetch)
+        # Nested scope shares memo of outermost one
+        with cache.scope():
+            cache.get(URL, fetch)
+    assert fetch.count == 1
+    cache.get(URL, fetch)
+    cache.get(URL, fetch)
+    assert fetch.count == 3
+    assert cache.responses == {}
+
+
+def test_failed_response_is_not_memoized():
+    cache = ReadCache()
+    fetch = Fetch(status_code=404)
+    with cache.scope():
+        cache.get(URL, fetch)
+        cache.get(URL, fetch)
+    assert fetch.count == 2
+
+
+def test_scope_is_per_thread():
+    cache = ReadCache()
+    fetch = Fetch()
+    with cache.scope():
+        own = cache.get(URL, fetch)
+        # Polling thread without a scope sees fresh data, thread with own scope has own memo
+        other = run_in_thread(lambda: cache.get(URL, fetch))
+        assert other.body != own.body
+
+        def read_twice():
+            with cache.scope():
+                return cache.get(URL, fetch), cache.get(URL, fetch)
+        first, second = run_in_thread(read_twice)
+        assert first is second
+        assert first.body != own.body
+        assert cache.get(URL, fetch) is own
+    assert fetch.count == 3
+
+
+def test_join_shares_scope_of_owner():
+    cache = ReadCache()
+    fetch = Fetch()
+    with cache.scope():
+        owner = threading.get_ident()
+        own = cache.get(URL, fetch)
+
+        def worker():
+            with cache.join(owner):
+                return cache.get(URL, fetch)
+        with ThreadPoolExecutor(4) as executor:
+            responses = list(executor.map(lambda _: worker(), range(8)))
+        assert all(r is own for r in responses)
+    assert fetch.count == 1
+    # Worker's join ends with owner's scope, nothing is left behind
+    assert cache.responses == {}
+
+
+class CountingEvent(threading.Event):
+    def __init__(self):
+        threading.Event.__init__(self)
+        self.waiters = threading.Semaphore(0)
+
+    def wait(self, timeout=None):
+        self.waiters.release()
+        return threading.Event.wait(self, timeout)
+
+
+def test_singleflight_shares_one_request():
+    cache = ReadCache()
+    gate = threading.Event()
+    fetch = Fetch(gate=gate)
+    leader = threading.Thread(target=cache.get, args=(URL, fetch))
+    leader.start()
+    assert fetch.started.wait(5)
+    call = cache.in_flight[URL]
+    call.done = CountingEvent()
+    with ThreadPoolExecutor(4) as executor:
+        futures = [executor.submit(cache.get, URL, fetch) for _ in range(4)]
+        # Followers wait on in-flight call of leader
+        for _ in range(4):
+            assert call.done.waiters.acquire(timeout=5)
+        gate.set()
+        responses = [f.result(5) for f in futures]
+    leader.join(5)
+    assert fetch.count == 1
+    assert all(r.body == 1 for r in responses)
+
+
+def test_error_is_shared_by_followers():
+    cache = ReadCache()
+    gate = threading.Event()
+
+    def fetch():
+        gate.wait(5)
+        raise IOError("connection reset")
+    errors = []
+
+    def get():
+        try:
+            cache.get(URL, fetch)
+        except IOError as e:
+            errors.append(e)
+    threads = [threading.Thread(target=get) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    gate.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(errors) == 4
+    assert cache.in_flight == {}
+    with pytest.raises(IOError):
+        cache.get(URL, fetch)
+
+
+def test_write_drops_memo_of_collection():
+    cache = ReadCache()
+    fetch = Fetch()
+    item = BASE + '/object/hosts/1234'
+    other = BASE + '/object/networks?offset=0'
+    with cache.scope():
+        cache.get(URL, fetch)
+        cache.get(other, fetch)
+        cache.invalidate(item)
+        cache.get(URL, fetch)
+        cache.get(other, fetch)
+    assert fetch.count == 3
+
+
+def test_write_drops_memo_of_other_threads():
+    cache = ReadCache()
+    fetch = Fetch()
+    read = threading.Event()
+    written = threading.Event()
+
+    def reader():
+        with cache.scope():
+            first = cache.get(URL, fetch)
+            read.set()
+            written.wait(5)
+            second = cache.get(URL, fetch)
+            return first.body, second.body
+    with ThreadPoolExecutor(1) as executor:
+        future = executor.submit(reader)
+        assert read.wait(5)
+        cache.invalidate(BASE + '/object/hosts')
+        written.set()
+        assert future.result(5) == (1, 2)
+
+
+def test_response_fetched_across_write_is_not_memoized():
+    cache = ReadCache()
+    gate = threading.Event()
+    fetch = Fetch(gate=gate)
+
+    def read_twice():
+        with cache.scope():
+            cache.get(URL, fetch)
+            fetch.gate = None
+            return cache.get(URL, fetch).body
+    with ThreadPoolExecutor(1) as executor:
+        future = executor.submit(read_twice)
+        assert fetch.started.wait(5)
+        cache.invalidate(URL)
+        gate.set()
+        assert future.result(5) == 2
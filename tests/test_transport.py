@@ -0,0 +1,133 @@
+"""
+Copyright (c) 2020 Cisco Systems Inc or its affiliates.
+
+All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+--------------------------------------------------------------------------------
+
+Name:       test_transport.py
+Purpose:    Unit tests of RateLimiter token bucket & throttle retries of send_request
+"""
+
+import random
+import pytest
+from ftdv_fmc import settings, transport, circuit
+from ftdv_fmc.transport import RateLimiter, send_request
+
+SERVER = 'https://fmc.example.com'
+URL = SERVER + '/api/fmc_config/v1/domain/d/object/hosts'
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = b'{}'
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    # Gives the queued responses in order, then 200
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = 0
+
+    def request(self, method, url, **kwargs):
+        self.requests += 1
+        if self.responses:
+            return self.responses.pop(0)
+        return FakeResponse(200)
+
+
+@pytest.fixture
+def pools(monkeypatch):
+    monkeypatch.setattr(transport, 'rate_limiter_pool', {})
+    monkeypatch.setattr(circuit, 'circuit_breaker_pool', {})
+    monkeypatch.setattr(settings, 'CIRCUIT_STORE', None)
+    monkeypatch.setattr(settings, 'RATE_COUNTER', None)
+    monkeypatch.setattr(random, 'uniform', lambda a, b: b)
+
+
+def test_burst_then_rate(clock):
+    limiter = RateLimiter(SERVER, 60, 3)
+    assert [limiter.acquire() for _ in range(3)] == [0, 0, 0]
+    assert clock.sleeps == []
+    # One call per second once burst is used
+    assert limiter.acquire() == pytest.approx(1)
+    clock.advance(2)
+    assert limiter.acquire() == 0
+    assert limiter.acquire() == 0
+    assert limiter.acquire() == pytest.approx(1)
+
+
+def test_throttled_halves_rate(clock):
+    limiter = RateLimiter(SERVER, 60, 3)
+    limiter.on_throttled()
+    assert limiter.rate == pytest.approx(0.5)
+    # Bucket is emptied, next call waits at halved rate
+    assert limiter.acquire() == pytest.approx(2)
+    for _ in range(10):
+        limiter.on_throttled()
+    assert limiter.rate == pytest.approx(limiter.min_rate)
+
+
+def test_success_recovers_rate(clock):
+    limiter = RateLimiter(SERVER, 60, 3)
+    limiter.on_throttled()
+    for _ in range(10):
+        limiter.on_success()
+    assert limiter.rate == pytest.approx(1)
+    limiter.on_success()
+    assert limiter.rate == pytest.approx(1)
+
+
+def test_shared_counter_waits_for_next_minute(clock):
+    clock.now = 1700000000 // 60 * 60 + 50
+    counts = {}
+
+    def counter(key, ttl):
+        counts[key] = counts.get(key, 0) + 1
+        return counts[key]
+    limiter = RateLimiter(SERVER, 2, 10, counter)
+    assert limiter.acquire() == 0
+    assert limiter.acquire() == 0
+    # Third call of the minute across workers waits for next minute
+    assert 10 <= limiter.acquire() <= 11
+
+
+def test_shared_counter_failure_does_not_block(clock):
+    def counter(key, ttl):
+        raise IOError("store is down")
+    limiter = RateLimiter(SERVER, 1, 10, counter)
+    assert [limiter.acquire() for _ in range(3)] == [0, 0, 0]
+
+
+def test_throttled_request_is_retried_after_retry_after(clock, pools):
+    session = FakeSession(FakeResponse(429, {'Retry-After': '7'}), FakeResponse(503))
+    r = send_request(session, 'GET', URL)
+    assert r.status_code == 200
+    assert session.requests == 3
+    # Retry-After is honoured, else exponential backoff of attempt
+    assert 7 in clock.sleeps
+    assert settings.BACKOFF_BASE * 2 in clock.sleeps
+
+
+def test_retries_are_bounded(clock, pools, monkeypatch):
+    monkeypatch.setattr(settings, 'THROTTLE_RETRIES', 2)
+    session = FakeSession(*[FakeResponse(429, {'Retry-After': '1'}) for _ in range(5)])
+    r = send_request(session, 'GET', URL)
+    assert r.status_code == 429
+    assert session.requests == 3